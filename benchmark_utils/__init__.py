@@ -5,7 +5,7 @@
 
 from pathlib import Path
 
-import numpy as np
+from benchmark_utils.overlap import overlap_mean
 
 
 def mean_overlaping_pred(predictions, stride):
@@ -19,31 +19,11 @@ def mean_overlaping_pred(predictions, stride):
             The stride size.
 
     Returns:
-    np.ndarray: Averaged predictions for each feature.
+    np.ndarray: Averaged predictions for each feature, of shape
+                ((n_windows - 1) * stride + H, n_features).
     """
-    n_windows, H, n_features = predictions.shape
-    # The last window starts at (n_windows-1)*stride and covers H samples, so
-    # the reconstructed signal spans (n_windows-1)*stride + H positions.
-    total_length = (n_windows - 1) * stride + H
-
-    # Array to store accumulated predictions for each feature
-    accumulated = np.zeros((total_length, n_features))
-    # store the count of predictions at each point for each feature
-    counts = np.zeros((total_length, n_features))
-
-    # Accumulate predictions and counts based on stride
-    for i in range(n_windows):
-        start = i * stride
-        accumulated[start:start+H] += predictions[i]
-        counts[start:start+H] += 1
-
-    # Avoid division by zero
-    counts[counts == 0] = 1
-
-    # Average the accumulated predictions
-    averaged_predictions = accumulated / counts
-
-    return averaged_predictions
+    # The last window starts at (n_windows-1)*stride and covers H samples.
+    return overlap_mean(predictions, stride, dtype=float)
 
 
 def check_data(data_path, dataset, data_type):
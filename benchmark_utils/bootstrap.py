@@ -0,0 +1,221 @@
+"""Block-bootstrap confidence intervals of the evaluation metrics.
+
+The aligned series is cut into contiguous blocks of ``block_length``
+positions, and each resample draws as many blocks with replacement. A
+resample is thus described by how many times it contains each block, and
+every metric is computed for all the resamples at once from per-block
+counts, with matrix products instead of one evaluation per resample.
+"""
+import numpy as np
+
+from benchmark_utils.metrics import (
+    _as_labels,
+    _distance_to_nearest,
+    _score_order,
+    _soft_from_counts,
+)
+
+
+def block_bootstrap(y_true,
+                    anomaly_scores=None,
+                    anomaly_predictions=None,
+                    n_resamples=1000,
+                    block_length=None,
+                    detection_ranges=(1, 3, 5, 10, 20),
+                    random_state=None,
+                    order=None):
+    """Metrics of block-bootstrap resamples of an evaluated series.
+
+    Parameters
+    ----------
+        y_true : np.ndarray
+            Ground truth labels
+        anomaly_scores : np.ndarray, optional
+            Anomaly scores, resampled for ``auc_roc`` and ``auc_pr``.
+        anomaly_predictions : np.ndarray, optional
+            Predicted labels, resampled for ``f1`` and ``soft_f1_<range>``.
+        n_resamples : int, default=1000
+            Number of bootstrap resamples.
+        block_length : int, optional
+            Length of the resampled blocks, ``ceil(sqrt(n_samples))`` by
+            default. Blocks should be longer than the anomalies.
+        detection_ranges : sequence of int, default=(1, 3, 5, 10, 20)
+            Detection ranges of the soft F1 scores.
+        random_state : int or np.random.Generator, optional
+            Seed of the resampling. With a fixed seed, every solver is
+            evaluated on the same resamples.
+        order : np.ndarray, optional
+            Indices sorting ``anomaly_scores`` in decreasing order, to reuse
+            a sort shared with other metrics.
+
+    Returns
+    -------
+        resamples : dict
+            Value of each metric for every resample, as arrays of shape
+            ``(n_resamples,)``. Metrics undefined for a resample, such as
+            AUCs without anomaly, are NaN.
+
+    Notes
+    -----
+    Soft metrics count, in each resample, the positions whose detection
+    window in the original series contains a match. Positions are
+    resampled, not the neighbourhoods around block boundaries.
+    """
+    labels = _as_labels(y_true)
+    n_samples = len(labels)
+    if block_length is None:
+        block_length = int(np.ceil(np.sqrt(n_samples)))
+    block_length = max(int(block_length), 1)
+    n_blocks = -(-n_samples // block_length)
+
+    rng = np.random.default_rng(random_state)
+    counts = rng.multinomial(
+        n_blocks, np.full(n_blocks, 1 / n_blocks), size=n_resamples
+    ).astype(float)
+    blocks = np.arange(n_samples) // block_length
+
+    resamples = {}
+    if anomaly_scores is not None:
+        resamples["auc_roc"], resamples["auc_pr"] = _bootstrap_aucs(
+            labels.mask, np.asarray(anomaly_scores).reshape(-1), blocks,
+            counts, order=order,
+        )
+    if anomaly_predictions is not None:
+        resamples.update(_bootstrap_prediction_metrics(
+            labels, np.asarray(anomaly_predictions).reshape(-1), blocks,
+            counts, detection_ranges,
+        ))
+    return resamples
+
+
+def confidence_interval(values, confidence=0.95):
+    """Percentile interval of the finite bootstrap values.
+
+    Returns ``(nan, nan)`` when no resample defines the metric.
+    """
+    values = np.asarray(values, dtype=float)
+    values = values[~np.isnan(values)]
+    if len(values) == 0:
+        return np.nan, np.nan
+    alpha = (1 - confidence) / 2
+    low, high = np.quantile(values, [alpha, 1 - alpha])
+    return float(low), float(high)
+
+
+def _bootstrap_aucs(true_mask, anomaly_scores, blocks, counts, order=None,
+                    max_cells=2 ** 24):
+    """AUC-ROC and AUC-PR of every resample from one sort of the scores.
+
+    In a resample, each position is weighted by the number of copies of its
+    block. Both AUCs only change at thresholds where positives enter, so
+    the weighted counts are evaluated at those thresholds only: positives
+    by cumulative sums over the sorted positives, negatives with a product
+    between the block counts and per-block histograms of the negatives,
+    built for chunks of at most ``max_cells`` cells.
+    """
+    n_resamples, n_blocks = counts.shape
+    nan = np.full(n_resamples, np.nan)
+    order = _score_order(anomaly_scores, order)
+    sorted_scores = anomaly_scores[order]
+    is_positive = true_mask[order]
+    if is_positive.all() or not is_positive.any():
+        return nan, nan.copy()
+
+    # Tie group of every rank, and the groups containing positives.
+    group = np.r_[0, np.cumsum(sorted_scores[1:] != sorted_scores[:-1])]
+    sorted_blocks = blocks[order]
+    pos_rank = np.flatnonzero(is_positive)
+    neg_rank = np.flatnonzero(~is_positive)
+    pos_groups = np.unique(group[pos_rank])
+
+    # Column of the first positive threshold each negative is above or tied
+    # with. Negatives below every positive never count as false positives.
+    neg_column = np.searchsorted(pos_groups, group[neg_rank])
+    tied = neg_column < len(pos_groups)
+    tied[tied] = pos_groups[neg_column[tied]] == group[neg_rank][tied]
+    neg_blocks = sorted_blocks[neg_rank]
+
+    n_pos = counts @ np.bincount(sorted_blocks[pos_rank], minlength=n_blocks)
+    n_neg = counts @ np.bincount(neg_blocks, minlength=n_blocks)
+
+    # Weighted positives entering at each positive threshold.
+    pos_column = np.searchsorted(pos_groups, group[pos_rank])
+    group_starts = np.flatnonzero(np.r_[True, np.diff(pos_column) > 0])
+    tp_step = np.add.reduceat(
+        counts[:, sorted_blocks[pos_rank]], group_starts, axis=1
+    )
+
+    roc = np.zeros(n_resamples)
+    ap = np.zeros(n_resamples)
+    tp_before = np.zeros(n_resamples)
+    fp_before = np.zeros(n_resamples)
+    step = max(1, max_cells // n_blocks)
+    for start in range(0, len(pos_groups), step):
+        stop = min(start + step, len(pos_groups))
+        selected = (neg_column >= start) & (neg_column < stop)
+        fp = fp_before[:, None] + np.cumsum(counts @ _block_histogram(
+            neg_blocks[selected], neg_column[selected] - start,
+            n_blocks, stop - start,
+        ), axis=1)
+        fp_before = fp[:, -1]
+
+        selected &= tied
+        ties = _block_histogram(
+            neg_blocks[selected], neg_column[selected] - start,
+            n_blocks, stop - start,
+        )
+        fp_tied = np.zeros_like(fp)
+        columns = np.flatnonzero(ties.any(axis=0))
+        fp_tied[:, columns] = counts @ ties[:, columns]
+
+        tp_new = tp_step[:, start:stop]
+        tp = tp_before[:, None] + np.cumsum(tp_new, axis=1)
+        tp_before = tp[:, -1]
+
+        # Positives rank above the negatives below them, half of the ties.
+        roc += np.sum(tp_new * (n_neg[:, None] - fp + 0.5 * fp_tied), axis=1)
+        precision = np.zeros_like(tp)
+        np.divide(tp, tp + fp, out=precision, where=tp_new > 0)
+        ap += np.sum(tp_new * precision, axis=1)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return roc / (n_pos * n_neg), ap / n_pos
+
+
+def _block_histogram(blocks, columns, n_blocks, n_columns):
+    """Number of positions of each block falling in each column."""
+    return np.bincount(
+        blocks * n_columns + columns, minlength=n_blocks * n_columns
+    ).reshape(n_blocks, n_columns)
+
+
+def _bootstrap_prediction_metrics(labels, anomaly_predictions, blocks,
+                                  counts, detection_ranges):
+    """Point-wise and soft F1 of every resample from per-block counts."""
+    n_blocks = counts.shape[1]
+    true_mask = labels.mask
+    pred_mask = anomaly_predictions == 1
+
+    def block_counts(mask):
+        return counts @ np.bincount(blocks[mask], minlength=n_blocks)
+
+    tp = block_counts(true_mask & pred_mask)
+    n_true = block_counts(true_mask)
+    n_pred = block_counts(pred_mask)
+    f1 = np.zeros(len(counts))
+    np.divide(2 * tp, n_true + n_pred, out=f1, where=tp > 0)
+    resamples = {"f1": f1}
+
+    to_pred = _distance_to_nearest(pred_mask)
+    to_true = labels.distance
+    radii = np.maximum(np.asarray(detection_ranges, dtype=np.int64), 0)
+    hits = np.column_stack(
+        [block_counts(true_mask & (to_pred <= r)) for r in radii]
+    )
+    false_alarms = np.column_stack(
+        [block_counts(pred_mask & (to_true > r)) for r in radii]
+    )
+    _, _, soft_f1 = _soft_from_counts(hits, false_alarms, n_true[:, None])
+    for i, detection_range in enumerate(detection_ranges):
+        resamples[f"soft_f1_{detection_range}"] = soft_f1[:, i]
+    return resamples
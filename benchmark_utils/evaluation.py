@@ -0,0 +1,934 @@
+"""Metric registry and compiled evaluation plans.
+
+Every metric declares the intermediate artifacts it is computed from (the
+sorted score order, the predicted ranges, the confusion counts, ...). A
+``MetricPlan`` resolves the requested metric names once, orders the
+artifacts they need, and then evaluates each artifact a single time per
+call, whatever the number of metrics sharing it.
+
+New metrics plug in with ``register_metric`` and new shared computations
+with ``register_artifact``; the objective does not need to change.
+``register_batch_artifact`` adds a batched version of an artifact, used
+to evaluate a matrix of anomaly scores row by row without repeating the
+sorts.
+
+``register_pooled_artifact`` tells how the artifacts of several recordings
+combine into the artifact of the recordings pooled together: counts are
+summed, ranges are offset by the length of the previous recordings, so
+that no anomaly range, neighbourhood or distance spans two recordings.
+Metrics registered with ``poolable=True`` only read such artifacts and get
+pooled values from ``MetricPlan.evaluate_recordings``.
+"""
+import os
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from benchmark_utils.metrics import (
+    AnomalyRanges,
+    LabelIndex,
+    _affiliation_zones,
+    _defined_mean,
+    _delay_summary,
+    _intersection_size,
+    _pa_from_counts,
+    _pa_k_counts,
+    _soft_counts,
+    _soft_from_counts,
+    _total_nearest_distance,
+    best_f1_t,
+    best_pa_k_f1,
+    detection_delays,
+    extract_anomaly_ranges,
+    f1_t,
+    precision_t,
+    range_auc,
+    recall_t,
+    roc_pr_scores,
+    roc_pr_scores_batch,
+    vus,
+)
+
+
+ARTIFACTS = {}
+SCORE_METRICS = {}
+PREDICTION_METRICS = {}
+
+
+class Artifact:
+    """An intermediate result shared by several metrics.
+
+    ``compute(values, params, options)`` receives the evaluation inputs
+    and the artifacts listed in ``requires`` through ``values``, the sorted
+    parameters requested by parametric metrics, and the plan options.
+
+    ``compute_batch``, if set, takes the same arguments for a matrix of
+    anomaly scores with one row per configuration, and returns a sequence
+    with the artifact of each row. See ``MetricPlan.evaluate_batch``.
+
+    ``pool``, if set, is called as ``pool(recordings, pooled, params,
+    options)`` with the evaluated values of each recording and the
+    artifacts already pooled, those listed in ``requires`` included, and
+    returns the artifact of the recordings pooled together.
+    """
+
+    def __init__(self, name, compute, requires=()):
+        self.name = name
+        self.compute = compute
+        self.requires = tuple(requires)
+        self.compute_batch = None
+        self.pool = None
+
+
+class Metric:
+    """A metric computed from evaluation inputs and shared artifacts.
+
+    ``compute(values, param)`` receives the inputs and artifacts through
+    ``values``. Parametric metrics are requested as ``<name>_<int>`` and get
+    the integer as ``param``; it is also forwarded to their artifacts.
+    ``param_name`` describes it in error messages. ``poolable`` metrics
+    only read artifacts with a pooled computation, and are also computed
+    on several recordings pooled together.
+    """
+
+    def __init__(self, name, compute, requires=(), parametric=False,
+                 param_name="parameter", poolable=False):
+        self.name = name
+        self.compute = compute
+        self.requires = tuple(requires)
+        self.parametric = parametric
+        self.param_name = param_name
+        self.poolable = poolable
+
+
+def register_artifact(name, requires=()):
+    """Decorator registering an artifact computation under ``name``."""
+    def decorator(compute):
+        ARTIFACTS[name] = Artifact(name, compute, requires=requires)
+        return compute
+    return decorator
+
+
+def register_batch_artifact(name):
+    """Decorator registering the batched computation of artifact ``name``.
+    """
+    def decorator(compute_batch):
+        ARTIFACTS[name].compute_batch = compute_batch
+        return compute_batch
+    return decorator
+
+
+def register_pooled_artifact(name):
+    """Decorator registering the pooled computation of artifact ``name``.
+    """
+    def decorator(pool):
+        ARTIFACTS[name].pool = pool
+        return pool
+    return decorator
+
+
+def register_metric(name, kind, requires=(), parametric=False,
+                    param_name="parameter", poolable=False):
+    """Decorator registering a ``"score"`` or ``"prediction"`` metric."""
+    registry = {"score": SCORE_METRICS, "prediction": PREDICTION_METRICS}
+    if kind not in registry:
+        raise ValueError(f"Unknown metric kind: {kind}")
+
+    def decorator(compute):
+        registry[kind][name] = Metric(
+            name, compute, requires=requires, parametric=parametric,
+            param_name=param_name, poolable=poolable,
+        )
+        return compute
+    return decorator
+
+
+class MetricPlan:
+    """Requested metrics compiled into an ordered list of computations.
+
+    Parameters
+    ----------
+    score_metrics : sequence of str
+        Metrics computed from ``anomaly_scores``.
+    prediction_metrics : sequence of str
+        Metrics computed from ``anomaly_predictions``. Parametric metrics
+        are given with their parameter, e.g. ``"soft_f1_3"``.
+    options : dict, optional
+        Options forwarded to the artifact computations.
+    """
+
+    def __init__(self, score_metrics=(), prediction_metrics=(), options=None):
+        self.options = dict(options or {})
+        self.score_metrics = self._resolve(score_metrics, SCORE_METRICS,
+                                           "score")
+        self.prediction_metrics = self._resolve(
+            prediction_metrics, PREDICTION_METRICS, "prediction"
+        )
+        self.metrics = self.score_metrics + self.prediction_metrics
+
+        # Parameters requested for each artifact, e.g. detection ranges.
+        params = {}
+        for _, metric, param in self.metrics:
+            if param is not None:
+                for name in metric.requires:
+                    params.setdefault(name, set()).add(param)
+        self.params = {name: tuple(sorted(p)) for name, p in params.items()}
+
+        self.artifacts = []
+        for _, metric, _ in self.metrics:
+            for name in metric.requires:
+                self._add_artifact(name, ())
+
+        # Artifacts grouped by dependency depth: the artifacts of one level
+        # only depend on previous levels and can be computed concurrently.
+        depth = {}
+        self.levels = []
+        for name in self.artifacts:
+            depth[name] = 1 + max(
+                (depth[dep] for dep in ARTIFACTS[name].requires), default=-1
+            )
+            if depth[name] == len(self.levels):
+                self.levels.append([])
+            self.levels[depth[name]].append(name)
+
+        # Metrics with a pooled value over several recordings, and the
+        # artifacts to pool for them, in dependency order.
+        self.pooled_metrics = tuple(
+            (key, metric, param) for key, metric, param in self.metrics
+            if metric.poolable
+        )
+        needed = set()
+        for _, metric, _ in self.pooled_metrics:
+            needed.update(metric.requires)
+        for name in reversed(self.artifacts):
+            if name in needed:
+                needed.update(ARTIFACTS[name].requires)
+        self.pooled_artifacts = [
+            name for name in self.artifacts if name in needed
+        ]
+        for name in self.pooled_artifacts:
+            if ARTIFACTS[name].pool is None:
+                raise ValueError(f"Artifact {name} cannot be pooled.")
+
+    def _resolve(self, names, registry, kind):
+        resolved = []
+        for key in names:
+            if key in registry and not registry[key].parametric:
+                resolved.append((key, registry[key], None))
+                continue
+
+            prefix, _, suffix = key.rpartition("_")
+            metric = registry.get(prefix)
+            if metric is None or not metric.parametric:
+                raise ValueError(f"Unknown {kind} metric: {key}")
+            try:
+                param = int(suffix)
+            except ValueError as exc:
+                raise ValueError(
+                    f"Invalid {metric.param_name} in {kind} metric: {key}"
+                ) from exc
+            resolved.append((key, metric, param))
+        return tuple(resolved)
+
+    def _add_artifact(self, name, visiting):
+        if name in self.artifacts:
+            return
+        if name in visiting:
+            raise ValueError(f"Circular artifact dependency on {name}")
+        for dependency in ARTIFACTS[name].requires:
+            self._add_artifact(dependency, visiting + (name,))
+        self.artifacts.append(name)
+
+    def evaluate(self, labels, anomaly_scores=None, anomaly_predictions=None,
+                 profile=False, n_jobs=1, artifacts=None):
+        """Compute every metric of the plan.
+
+        Parameters
+        ----------
+        labels : LabelIndex
+            Ground truth labels aligned with the solver outputs.
+        anomaly_scores : np.ndarray, optional
+            Aligned anomaly scores, required by score metrics.
+        anomaly_predictions : np.ndarray, optional
+            Aligned binary predictions, required by prediction metrics.
+        profile : bool, default=False
+            If True, also report the wall time in seconds and the peak
+            memory allocated in bytes by each artifact and each metric,
+            under the ``time_<name>`` and ``peak_memory_<name>`` keys.
+            Times come from an untraced pass, and peak memory from a second
+            pass traced with ``tracemalloc``, so the profiled evaluation
+            computes everything twice. Quantities cached by ``labels``
+            during the first pass are not counted in the second one.
+        n_jobs : int, default=1
+            Number of threads computing independent artifacts and metrics.
+            ``-1`` uses all cores. Most metrics are NumPy reductions
+            releasing the GIL, and the values do not depend on ``n_jobs``.
+            Profiled evaluations always run in a single thread.
+        artifacts : dict, optional
+            Filled with the computed artifacts, e.g. to reuse the
+            ``score_order`` outside of the plan.
+
+        Returns
+        -------
+        result : dict
+            Value of each requested metric.
+        """
+        values = dict(
+            labels=labels,
+            anomaly_scores=anomaly_scores,
+            anomaly_predictions=anomaly_predictions,
+        )
+        result = self._evaluate(values, profile=profile, n_jobs=n_jobs)
+        if artifacts is not None:
+            artifacts.update(
+                (name, values[name]) for name in self.artifacts
+                if name in values
+            )
+        return result
+
+    def evaluate_recordings(self, recordings, profile=False, n_jobs=1,
+                            artifacts=None):
+        """Compute every metric of each recording, and the pooled metrics.
+
+        Parameters
+        ----------
+        recordings : sequence of tuple
+            ``(labels, anomaly_scores, anomaly_predictions)`` of each
+            recording, as given to ``evaluate``.
+        profile : bool, default=False
+            Profile the evaluation of each recording, see ``evaluate``.
+        n_jobs : int, default=1
+            Number of threads, each one evaluating whole recordings
+            serially. Profiled evaluations always run in a single thread.
+        artifacts : dict, optional
+            Filled with the pooled artifacts, e.g. to reuse the
+            ``score_order`` of the concatenated scores.
+
+        Returns
+        -------
+        results : list of dict
+            Value of each requested metric for every recording.
+        pooled : dict
+            Value of each poolable metric on the recordings pooled
+            together, computed from their pooled artifacts. Metrics that
+            cannot be pooled without joining recordings, such as the
+            VUS or the best range F1, are left out.
+        """
+        evaluated = [
+            dict(labels=labels, anomaly_scores=anomaly_scores,
+                 anomaly_predictions=anomaly_predictions)
+            for labels, anomaly_scores, anomaly_predictions in recordings
+        ]
+        if n_jobs == -1:
+            n_jobs = os.cpu_count() or 1
+
+        def evaluate(values):
+            return self._evaluate(values, profile=profile)
+
+        if n_jobs > 1 and len(evaluated) > 1 and not profile:
+            with ThreadPoolExecutor(
+                    max_workers=min(n_jobs, len(evaluated))) as pool:
+                results = list(pool.map(evaluate, evaluated))
+        else:
+            results = [evaluate(values) for values in evaluated]
+
+        # Empty recordings have no artifact and do not count.
+        evaluated = [values for values in evaluated if len(values["labels"])]
+        if not evaluated:
+            return results, {
+                key: np.nan for key, _, _ in self.pooled_metrics
+            }
+        pooled = {}
+        for name in self.pooled_artifacts:
+            pooled[name] = ARTIFACTS[name].pool(
+                evaluated, pooled, self.params.get(name, ()), self.options
+            )
+        if artifacts is not None:
+            artifacts.update(pooled)
+        return results, {
+            key: metric.compute(pooled, param)
+            for key, metric, param in self.pooled_metrics
+        }
+
+    def _evaluate(self, values, profile=False, n_jobs=1):
+        """Compute the artifacts into ``values``, and return the metrics."""
+        if len(values["labels"]) == 0:
+            return {key: np.nan for key, _, _ in self.metrics}
+
+        if n_jobs == -1:
+            n_jobs = os.cpu_count() or 1
+        if not profile and n_jobs > 1:
+            return self._evaluate_parallel(values, n_jobs)
+        if not profile:
+            return self._evaluate_serial(values)
+
+        # tracemalloc slows allocations down unevenly across metrics, so
+        # wall times are measured in an untraced pass, and peak memory in a
+        # second, traced pass recomputing every artifact and metric.
+        result, seconds = {}, {}
+        for name in self.artifacts:
+            values[name], seconds[name] = _timed(
+                ARTIFACTS[name].compute,
+                values, self.params.get(name, ()), self.options,
+            )
+        for key, metric, param in self.metrics:
+            result[key], seconds[key] = _timed(metric.compute, values, param)
+
+        traced = {
+            name: values[name]
+            for name in ("labels", "anomaly_scores", "anomaly_predictions")
+        }
+        peaks = {}
+        tracing = tracemalloc.is_tracing()
+        if not tracing:
+            tracemalloc.start()
+        try:
+            for name in self.artifacts:
+                traced[name], peaks[name] = _peak_memory(
+                    ARTIFACTS[name].compute,
+                    traced, self.params.get(name, ()), self.options,
+                )
+            for key, metric, param in self.metrics:
+                _, peaks[key] = _peak_memory(metric.compute, traced, param)
+        finally:
+            if not tracing:
+                tracemalloc.stop()
+
+        for name in seconds:
+            result[f"time_{name}"] = seconds[name]
+            result[f"peak_memory_{name}"] = peaks[name]
+        return result
+
+    def evaluate_batch(self, labels, anomaly_scores, max_cells=2 ** 22):
+        """Compute the score metrics of every row of a score matrix.
+
+        Artifacts with a batched computation, such as the score order and
+        the ROC/PR counts, are computed for blocks of rows at once with
+        2-D sorts and cumulative sums. The other artifacts and the metrics
+        are then computed for each row, reusing the batched artifacts.
+
+        Parameters
+        ----------
+        labels : LabelIndex
+            Ground truth labels aligned with every row of the scores.
+        anomaly_scores : np.ndarray of shape (n_configs, n_samples)
+            Aligned anomaly scores, e.g. of every configuration of a solver.
+        max_cells : int, default=2 ** 22
+            Maximum number of scores processed in one block of rows, which
+            bounds the memory of the batched artifacts.
+
+        Returns
+        -------
+        result : dict
+            Array of shape ``(n_configs,)`` with the values of each
+            requested metric.
+        """
+        if self.prediction_metrics:
+            raise ValueError("Batched evaluations only support score metrics.")
+        anomaly_scores = np.asarray(anomaly_scores)
+        anomaly_scores = anomaly_scores.reshape(len(anomaly_scores), -1)
+        n_configs, n_samples = anomaly_scores.shape
+        result = {
+            key: np.full(n_configs, np.nan) for key, _, _ in self.metrics
+        }
+        if len(labels) == 0:
+            return result
+
+        batched = []
+        for name in self.artifacts:
+            artifact = ARTIFACTS[name]
+            if artifact.compute_batch is not None and all(
+                    dep in batched for dep in artifact.requires):
+                batched.append(name)
+
+        step = max(1, max_cells // max(n_samples, 1))
+        for start in range(0, n_configs, step):
+            rows = anomaly_scores[start:start + step]
+            batch = dict(
+                labels=labels, anomaly_scores=rows, anomaly_predictions=None
+            )
+            for name in batched:
+                batch[name] = ARTIFACTS[name].compute_batch(
+                    batch, self.params.get(name, ()), self.options
+                )
+            for i, row in enumerate(rows):
+                values = dict(
+                    labels=labels, anomaly_scores=row, anomaly_predictions=None
+                )
+                values.update((name, batch[name][i]) for name in batched)
+                for key, value in self._evaluate_serial(values).items():
+                    result[key][start + i] = value
+        return result
+
+    def _evaluate_serial(self, values):
+        """Compute the artifacts missing from ``values``, then the metrics.
+        """
+        for name in self.artifacts:
+            if name not in values:
+                values[name] = ARTIFACTS[name].compute(
+                    values, self.params.get(name, ()), self.options
+                )
+        return {
+            key: metric.compute(values, param)
+            for key, metric, param in self.metrics
+        }
+
+    def _evaluate_parallel(self, values, n_jobs):
+        n_tasks = max([len(self.metrics)] + [len(lvl) for lvl in self.levels])
+        with ThreadPoolExecutor(max_workers=min(n_jobs, n_tasks)) as pool:
+            for level in self.levels:
+                futures = {
+                    name: pool.submit(
+                        ARTIFACTS[name].compute,
+                        values, self.params.get(name, ()), self.options,
+                    )
+                    for name in level
+                }
+                # Artifacts are only stored once the whole level is done,
+                # so running tasks never see ``values`` change.
+                for name, future in futures.items():
+                    values[name] = future.result()
+
+            futures = {
+                key: pool.submit(metric.compute, values, param)
+                for key, metric, param in self.metrics
+            }
+            return {key: future.result() for key, future in futures.items()}
+
+
+def _timed(compute, *args):
+    """Return ``compute(*args)`` with its wall time in seconds."""
+    start = time.perf_counter()
+    value = compute(*args)
+    return value, time.perf_counter() - start
+
+
+def _peak_memory(compute, *args):
+    """Return ``compute(*args)`` with its peak allocation in bytes.
+
+    ``tracemalloc`` must be tracing.
+    """
+    tracemalloc.reset_peak()
+    start_memory = tracemalloc.get_traced_memory()[0]
+    value = compute(*args)
+    return value, tracemalloc.get_traced_memory()[1] - start_memory
+
+
+# Artifacts
+
+@register_artifact("score_order")
+def _score_order(values, params, options):
+    return np.argsort(values["anomaly_scores"])[::-1]
+
+
+@register_artifact("roc_pr", requires=("score_order",))
+def _roc_pr(values, params, options):
+    return roc_pr_scores(values["labels"], values["anomaly_scores"],
+                         order=values["score_order"])
+
+
+@register_batch_artifact("score_order")
+def _score_order_batch(values, params, options):
+    return np.argsort(values["anomaly_scores"], axis=1)[:, ::-1]
+
+
+@register_batch_artifact("roc_pr")
+def _roc_pr_batch(values, params, options):
+    return list(zip(*roc_pr_scores_batch(
+        values["labels"], values["anomaly_scores"],
+        order=values["score_order"],
+    )))
+
+
+@register_artifact("range_auc", requires=("score_order",))
+def _range_auc(values, params, options):
+    return range_auc(values["labels"], values["anomaly_scores"],
+                     buffer=options.get("vus_buffer", 100),
+                     order=values["score_order"])
+
+
+@register_artifact("vus", requires=("score_order",))
+def _vus(values, params, options):
+    return vus(values["labels"], values["anomaly_scores"],
+               max_buffer=options.get("vus_buffer", 100),
+               order=values["score_order"])
+
+
+@register_artifact("confusion")
+def _confusion(values, params, options):
+    labels, predictions = values["labels"], values["anomaly_predictions"]
+    if isinstance(predictions, AnomalyRanges):
+        tp = _intersection_size(
+            *labels.range_bounds, predictions.starts, predictions.ends
+        )
+        n_pred = predictions.n_anomalies
+    else:
+        pred_mask = np.asarray(predictions) == 1
+        tp = int(np.count_nonzero(labels.mask & pred_mask))
+        n_pred = int(np.count_nonzero(pred_mask))
+    fp = n_pred - tp
+    fn = labels.n_true - tp
+    tn = len(labels) - tp - fp - fn
+    return tp, fp, fn, tn
+
+
+@register_artifact("true_ranges")
+def _true_ranges(values, params, options):
+    return values["labels"].ranges
+
+
+@register_artifact("prediction_ranges")
+def _prediction_ranges(values, params, options):
+    return extract_anomaly_ranges(values["anomaly_predictions"])
+
+
+@register_artifact("nearest_distances")
+def _nearest_distances(values, params, options):
+    """Summed distances of CTT and TTC with their number of terms.
+
+    Returns ``(ctt_total, n_pred, ttc_total, n_true)``. A total is infinite
+    when there are points to match but nothing to match them with.
+    """
+    labels = values["labels"]
+    predicted = np.flatnonzero(
+        np.asarray(values["anomaly_predictions"]).reshape(-1) == 1
+    )
+    n_pred, n_true = len(predicted), labels.n_true
+    ctt_total = _total_nearest_distance(labels.positions, predicted)
+    ttc_total = _total_nearest_distance(predicted, labels.positions)
+    if n_true == 0 and n_pred:
+        ctt_total = np.inf
+    if n_pred == 0 and n_true:
+        ttc_total = np.inf
+    return ctt_total, n_pred, ttc_total, n_true
+
+
+@register_artifact("affiliation")
+def _affiliation(values, params, options):
+    return _affiliation_zones(values["labels"], values["anomaly_predictions"])
+
+
+@register_artifact("detection_delays")
+def _detection_delays(values, params, options):
+    return detection_delays(values["labels"], values["anomaly_predictions"])
+
+
+@register_artifact("pa_k_scores")
+def _pa_k_scores(values, params, options):
+    tp, fp, n_true = _pa_k_counts(
+        values["labels"], values["anomaly_predictions"],
+        np.asarray(params, dtype=float),
+    )
+    return {k: (tp_k, fp, n_true) for k, tp_k in zip(params, tp)}
+
+
+@register_artifact("soft_scores")
+def _soft_scores(values, params, options):
+    labels = values["labels"]
+    _, hits, false_alarms = _soft_counts(
+        labels, values["anomaly_predictions"], detection_ranges=params
+    )
+    return {
+        detection_range: (hit, false_alarm, labels.n_true)
+        for detection_range, hit, false_alarm
+        in zip(params, hits, false_alarms)
+    }
+
+
+# Pooled artifacts
+
+def _concatenate(recordings, name):
+    return np.concatenate([values[name] for values in recordings])
+
+
+def _sum_counts(counts):
+    """Element-wise sum of tuples of counts."""
+    return tuple(sum(terms) for terms in zip(*counts))
+
+
+def _offset_ranges(recordings, name):
+    """Ranges of every recording, shifted after the previous recordings."""
+    offset, ranges = 0, []
+    for values in recordings:
+        bounds = np.asarray(values[name], dtype=np.int64).reshape(-1, 2)
+        ranges.append(bounds + offset)
+        offset += len(values["labels"])
+    return np.concatenate(ranges)
+
+
+@register_pooled_artifact("score_order")
+def _score_order_pooled(recordings, pooled, params, options):
+    return np.argsort(_concatenate(recordings, "anomaly_scores"))[::-1]
+
+
+@register_pooled_artifact("roc_pr")
+def _roc_pr_pooled(recordings, pooled, params, options):
+    # Point-wise counts do not depend on where the recordings meet.
+    labels = LabelIndex(
+        np.concatenate([values["labels"].y_true for values in recordings])
+    )
+    return roc_pr_scores(labels, _concatenate(recordings, "anomaly_scores"),
+                         order=pooled["score_order"])
+
+
+@register_pooled_artifact("confusion")
+def _confusion_pooled(recordings, pooled, params, options):
+    return _sum_counts(values["confusion"] for values in recordings)
+
+
+@register_pooled_artifact("true_ranges")
+def _true_ranges_pooled(recordings, pooled, params, options):
+    return _offset_ranges(recordings, "true_ranges")
+
+
+@register_pooled_artifact("prediction_ranges")
+def _prediction_ranges_pooled(recordings, pooled, params, options):
+    return _offset_ranges(recordings, "prediction_ranges")
+
+
+@register_pooled_artifact("nearest_distances")
+def _nearest_distances_pooled(recordings, pooled, params, options):
+    return _sum_counts(values["nearest_distances"] for values in recordings)
+
+
+@register_pooled_artifact("affiliation")
+def _affiliation_pooled(recordings, pooled, params, options):
+    return tuple(
+        np.concatenate(zones)
+        for zones in zip(*(values["affiliation"] for values in recordings))
+    )
+
+
+@register_pooled_artifact("detection_delays")
+def _detection_delays_pooled(recordings, pooled, params, options):
+    return _concatenate(recordings, "detection_delays")
+
+
+@register_pooled_artifact("pa_k_scores")
+def _pa_k_scores_pooled(recordings, pooled, params, options):
+    return {
+        k: _sum_counts(values["pa_k_scores"][k] for values in recordings)
+        for k in params
+    }
+
+
+@register_pooled_artifact("soft_scores")
+def _soft_scores_pooled(recordings, pooled, params, options):
+    return {
+        detection_range: _sum_counts(
+            values["soft_scores"][detection_range] for values in recordings
+        )
+        for detection_range in params
+    }
+
+
+# Score metrics
+
+@register_metric("auc_roc", "score", requires=("roc_pr",), poolable=True)
+def _auc_roc_metric(values, param):
+    return values["roc_pr"][0]
+
+
+@register_metric("auc_pr", "score", requires=("roc_pr",), poolable=True)
+def _auc_pr_metric(values, param):
+    return values["roc_pr"][1]
+
+
+@register_metric("best_f1", "score", requires=("roc_pr",), poolable=True)
+def _best_f1_metric(values, param):
+    return values["roc_pr"][2]
+
+
+@register_metric("best_f1_t", "score", requires=("score_order",))
+def _best_f1_t_metric(values, param):
+    return best_f1_t(values["labels"], values["anomaly_scores"],
+                     order=values["score_order"])[0]
+
+
+@register_metric("best_pa_f1", "score", requires=("score_order",),
+                 parametric=True, param_name="K")
+def _best_pa_f1_metric(values, param):
+    return best_pa_k_f1(values["labels"], values["anomaly_scores"], k=param,
+                        order=values["score_order"])[0]
+
+
+@register_metric("range_auc_roc", "score", requires=("range_auc",))
+def _range_auc_roc_metric(values, param):
+    return values["range_auc"][0]
+
+
+@register_metric("range_auc_pr", "score", requires=("range_auc",))
+def _range_auc_pr_metric(values, param):
+    return values["range_auc"][1]
+
+
+@register_metric("vus_roc", "score", requires=("vus",))
+def _vus_roc_metric(values, param):
+    return values["vus"][0]
+
+
+@register_metric("vus_pr", "score", requires=("vus",))
+def _vus_pr_metric(values, param):
+    return values["vus"][1]
+
+
+# Prediction metrics
+
+@register_metric("precision", "prediction", requires=("confusion",),
+                 poolable=True)
+def _precision_metric(values, param):
+    tp, fp, _, _ = values["confusion"]
+    return tp / (tp + fp) if tp + fp else 0.0
+
+
+@register_metric("recall", "prediction", requires=("confusion",),
+                 poolable=True)
+def _recall_metric(values, param):
+    tp, _, fn, _ = values["confusion"]
+    return tp / (tp + fn) if tp + fn else 0.0
+
+
+@register_metric("f1", "prediction", requires=("confusion",), poolable=True)
+def _f1_metric(values, param):
+    tp, fp, fn, _ = values["confusion"]
+    return 2 * tp / (2 * tp + fp + fn) if tp else 0.0
+
+
+@register_metric("zoloss", "prediction", requires=("confusion",),
+                 poolable=True)
+def _zoloss_metric(values, param):
+    tp, fp, fn, tn = values["confusion"]
+    return 1 - (tp + tn) / (tp + fp + fn + tn)
+
+
+@register_metric("precision_t", "prediction",
+                 requires=("true_ranges", "prediction_ranges"),
+                 poolable=True)
+def _precision_t_metric(values, param):
+    return precision_t(values["true_ranges"], values["prediction_ranges"])
+
+
+@register_metric("recall_t", "prediction",
+                 requires=("true_ranges", "prediction_ranges"),
+                 poolable=True)
+def _recall_t_metric(values, param):
+    return recall_t(values["true_ranges"], values["prediction_ranges"])
+
+
+@register_metric("f1_t", "prediction",
+                 requires=("true_ranges", "prediction_ranges"),
+                 poolable=True)
+def _f1_t_metric(values, param):
+    return f1_t(values["true_ranges"], values["prediction_ranges"])
+
+
+@register_metric("ctt", "prediction", requires=("nearest_distances",),
+                 poolable=True)
+def _ctt_metric(values, param):
+    # Same conventions as ``metrics.ctt``.
+    ctt_total, n_pred, _, n_true = values["nearest_distances"]
+    if n_true == 0:
+        return float('inf')
+    elif n_pred == 0:
+        return 0
+    return ctt_total / n_pred
+
+
+@register_metric("ttc", "prediction", requires=("nearest_distances",),
+                 poolable=True)
+def _ttc_metric(values, param):
+    # Same conventions as ``metrics.ttc``.
+    _, n_pred, ttc_total, n_true = values["nearest_distances"]
+    if n_pred == 0:
+        return float('inf')
+    elif n_true == 0:
+        return 0
+    return ttc_total / n_true
+
+
+@register_metric("aff_precision", "prediction", requires=("affiliation",),
+                 poolable=True)
+def _aff_precision_metric(values, param):
+    return _defined_mean(values["affiliation"][0])
+
+
+@register_metric("aff_recall", "prediction", requires=("affiliation",),
+                 poolable=True)
+def _aff_recall_metric(values, param):
+    return _defined_mean(values["affiliation"][1])
+
+
+@register_metric("delay_mean", "prediction", requires=("detection_delays",),
+                 poolable=True)
+def _delay_mean_metric(values, param):
+    return _delay_summary(values["detection_delays"])[0]
+
+
+@register_metric("delay_median", "prediction",
+                 requires=("detection_delays",), poolable=True)
+def _delay_median_metric(values, param):
+    return float(_delay_summary(values["detection_delays"], [50])[1][0])
+
+
+@register_metric("delay_percentile", "prediction",
+                 requires=("detection_delays",), parametric=True,
+                 param_name="percentile", poolable=True)
+def _delay_percentile_metric(values, param):
+    return float(_delay_summary(values["detection_delays"], [param])[1][0])
+
+
+@register_metric("detected_within", "prediction",
+                 requires=("detection_delays",), parametric=True,
+                 param_name="horizon", poolable=True)
+def _detected_within_metric(values, param):
+    return float(_delay_summary(values["detection_delays"], (), [param])[2][0])
+
+
+def _pa_score(values, param, index):
+    tp, fp, n_true = values["pa_k_scores"][param]
+    return float(_pa_from_counts([tp], fp, n_true)[index][0])
+
+
+@register_metric("pa_precision", "prediction", requires=("pa_k_scores",),
+                 parametric=True, param_name="K", poolable=True)
+def _pa_precision_metric(values, param):
+    return _pa_score(values, param, 0)
+
+
+@register_metric("pa_recall", "prediction", requires=("pa_k_scores",),
+                 parametric=True, param_name="K", poolable=True)
+def _pa_recall_metric(values, param):
+    return _pa_score(values, param, 1)
+
+
+@register_metric("pa_f1", "prediction", requires=("pa_k_scores",),
+                 parametric=True, param_name="K", poolable=True)
+def _pa_f1_metric(values, param):
+    return _pa_score(values, param, 2)
+
+
+def _soft_score(values, param, index):
+    return float(_soft_from_counts(*values["soft_scores"][param])[index])
+
+
+@register_metric("soft_precision", "prediction", requires=("soft_scores",),
+                 parametric=True, param_name="detection range",
+                 poolable=True)
+def _soft_precision_metric(values, param):
+    return _soft_score(values, param, 0)
+
+
+@register_metric("soft_recall", "prediction", requires=("soft_scores",),
+                 parametric=True, param_name="detection range",
+                 poolable=True)
+def _soft_recall_metric(values, param):
+    return _soft_score(values, param, 1)
+
+
+@register_metric("soft_f1", "prediction", requires=("soft_scores",),
+                 parametric=True, param_name="detection range",
+                 poolable=True)
+def _soft_f1_metric(values, param):
+    return _soft_score(values, param, 2)
@@ -1,24 +1,252 @@
+from functools import cached_property
+
 import numpy as np
 
 
-def _dilate(mask: np.ndarray, radius: int) -> np.ndarray:
-    """Binary dilation with a centered window of half-width ``radius``.
+class AnomalyRanges:
+    """Binary labels stored as the closed ranges of their anomalies.
+
+    A run-length encoding of a series of ``length`` labels, as built by
+    ``from_labels`` with ``extract_anomaly_ranges``. Solvers may return it as
+    ``anomaly_predictions`` and datasets may provide ``y_test`` in this
+    form. The point-wise, range, soft, affiliation and delay metrics then
+    work on the ranges directly, in O(R log R) for R ranges instead of
+    O(n_samples). Other metrics convert it to dense labels, as
+    ``np.asarray`` does.
 
-    ``out[i]`` is True iff any entry of ``mask`` in ``[i-radius, i+radius]``
-    (clipped to the array) is truthy. Matches the half-open slice
-    ``mask[max(0, i-r):min(n, i+r+1)]`` used by the soft metrics.
+    Parameters
+    ----------
+        starts : array-like of int
+            First position of each anomaly range.
+        ends : array-like of int
+            Last position (inclusive) of each anomaly range.
+        length : int
+            Number of labels of the series.
     """
-    mask = np.asarray(mask)
-    n = mask.shape[0]
-    if n == 0:
-        return np.zeros(0, dtype=bool)
-    if radius <= 0:
-        return mask.astype(bool, copy=False)
-    cum = np.concatenate(([0], np.cumsum(mask.astype(np.int64))))
-    idx = np.arange(n)
-    left = np.maximum(0, idx - radius)
-    right = np.minimum(n, idx + radius + 1)
-    return (cum[right] - cum[left]) > 0
+
+    def __init__(self, starts, ends, length):
+        starts = np.asarray(starts, dtype=np.int64).reshape(-1)
+        ends = np.asarray(ends, dtype=np.int64).reshape(-1)
+        if len(starts) != len(ends):
+            raise ValueError("starts and ends must have the same length.")
+        keep = ends >= starts
+        # Ranges are kept sorted and maximal: touching ranges are joined,
+        # as in the output of ``extract_anomaly_ranges``.
+        starts, ends = _merge_ranges(starts[keep], ends[keep] + 1)
+        self.starts, self.ends = starts, ends - 1
+        self.length = int(length)
+
+    @classmethod
+    def from_labels(cls, labels):
+        """Encode a series of labels where 1 indicates an anomaly."""
+        labels = np.asarray(labels).reshape(-1)
+        return cls(*_label_bounds(labels), len(labels))
+
+    def __len__(self):
+        return self.length
+
+    def __repr__(self):
+        return (f"AnomalyRanges(n_ranges={len(self.starts)}, "
+                f"length={self.length})")
+
+    def __array__(self, dtype=None, copy=None):
+        return self.to_dense(int if dtype is None else dtype)
+
+    def __getitem__(self, key):
+        """Slices with a unit step stay ranges, other keys are dense."""
+        if not isinstance(key, slice) or key.step not in (None, 1):
+            return self.to_dense()[key]
+        start, stop, _ = key.indices(self.length)
+        stop = max(start, stop)
+        keep = (self.ends >= start) & (self.starts < stop)
+        return AnomalyRanges(
+            np.maximum(self.starts[keep], start) - start,
+            np.minimum(self.ends[keep], stop - 1) - start,
+            stop - start,
+        )
+
+    @property
+    def ranges(self):
+        """Ranges as the ``(start, end)`` tuples of ``extract_anomaly_ranges``.
+        """
+        return list(zip(self.starts.tolist(), self.ends.tolist()))
+
+    @property
+    def n_anomalies(self):
+        """Number of anomalous positions."""
+        return int(np.sum(self.ends - self.starts + 1))
+
+    def to_dense(self, dtype=int):
+        """Labels as an array of ``length`` zeros and ones."""
+        n = self.length + 1
+        steps = (np.bincount(self.starts, minlength=n)
+                 - np.bincount(self.ends + 1, minlength=n))
+        return np.cumsum(steps[:-1]).astype(dtype)
+
+
+class LabelIndex:
+    """Ground truth labels with derived quantities computed on first use.
+
+    Every metric taking ``y_true`` also accepts a ``LabelIndex``. Labels that
+    are evaluated many times, such as ``y_test`` in the objective, then only
+    pay once for the anomaly mask, the anomaly ranges and the distance
+    transforms, whatever the predictions they are compared to.
+
+    Parameters
+    ----------
+        y_true : np.ndarray or AnomalyRanges
+            Ground truth labels, flattened on construction. Anomaly ranges
+            are only expanded to dense labels when a metric needs them.
+    """
+
+    def __init__(self, y_true):
+        if isinstance(y_true, AnomalyRanges):
+            self.intervals = y_true
+            self._length = len(y_true)
+        else:
+            self.y_true = np.asarray(y_true).reshape(-1)
+            self._length = len(self.y_true)
+
+    def __len__(self):
+        return self._length
+
+    @cached_property
+    def y_true(self):
+        """Dense ground truth labels."""
+        return self.intervals.to_dense()
+
+    @cached_property
+    def intervals(self):
+        """Labels as ``AnomalyRanges``."""
+        return AnomalyRanges.from_labels(self.y_true)
+
+    @cached_property
+    def mask(self):
+        """Boolean mask of the anomalous positions."""
+        return self.y_true == 1
+
+    @cached_property
+    def n_true(self):
+        """Number of anomalous positions."""
+        return self.intervals.n_anomalies
+
+    @cached_property
+    def positions(self):
+        """Sorted indices of the anomalous positions."""
+        return np.flatnonzero(self.mask)
+
+    @cached_property
+    def ranges(self):
+        """Anomaly ranges as returned by ``extract_anomaly_ranges``."""
+        return self.intervals.ranges
+
+    @property
+    def range_bounds(self):
+        """Start and end arrays of the anomaly ranges."""
+        return self.intervals.starts, self.intervals.ends
+
+    @cached_property
+    def directional_distances(self):
+        """Distances to the previous and to the next anomalous position."""
+        return _directional_distances(self.mask)
+
+    @cached_property
+    def distance(self):
+        """Distance from every position to the closest anomaly."""
+        return np.minimum(*self.directional_distances)
+
+
+def _as_labels(y_true):
+    """Wrap ``y_true`` in a ``LabelIndex`` unless it already is one."""
+    if isinstance(y_true, LabelIndex):
+        return y_true
+    return LabelIndex(y_true)
+
+
+def _directional_distances(mask: np.ndarray):
+    """Distances from every position to the previous and next truthy entry.
+
+    Computed with one running max (forward) and one running min (backward)
+    over the truthy positions. Without a truthy entry on one side, the
+    distance on that side is larger than any usable radius.
+    """
+    mask = np.asarray(mask, dtype=bool)
+    idx = np.arange(mask.shape[0])
+    far = np.iinfo(np.int64).max // 2
+    prev = np.maximum.accumulate(np.where(mask, idx, -far))
+    next_ = np.minimum.accumulate(np.where(mask, idx, far)[::-1])[::-1]
+    return idx - prev, next_ - idx
+
+
+def _distance_to_nearest(mask: np.ndarray) -> np.ndarray:
+    """Distance from every position to the closest truthy entry of ``mask``.
+
+    ``out[i] <= r`` iff a binary dilation of ``mask`` with half-width ``r``
+    is True at ``i``.
+    """
+    return np.minimum(*_directional_distances(mask))
+
+
+def _soft_counts(y_true, y_pred, detection_ranges):
+    """Counts behind the soft metrics for several detection ranges at once.
+
+    Returns
+    -------
+        em : int
+            Number of exact matches.
+        hits : np.ndarray
+            For each range, number of true anomalies with a predicted anomaly
+            within that range (exact matches included).
+        false_alarms : np.ndarray
+            For each range, number of predicted anomalies with no true
+            anomaly within that range.
+    """
+    labels = _as_labels(y_true)
+    radii = np.maximum(np.asarray(detection_ranges, dtype=np.int64), 0)
+    if isinstance(y_pred, AnomalyRanges):
+        return _soft_counts_from_ranges(labels, y_pred, radii)
+
+    true_mask = labels.mask
+    pred_mask = np.asarray(y_pred).reshape(-1) == 1
+    em = int(np.sum(true_mask & pred_mask))
+
+    # Sorting the distances once answers every radius with searchsorted.
+    true_to_pred = np.sort(_distance_to_nearest(pred_mask)[true_mask])
+    pred_to_true = np.sort(labels.distance[pred_mask])
+    hits = np.searchsorted(true_to_pred, radii, side="right")
+    false_alarms = len(pred_to_true) - np.searchsorted(
+        pred_to_true, radii, side="right"
+    )
+    return em, hits, false_alarms
+
+
+def _soft_counts_from_ranges(labels, y_pred, radii):
+    """``_soft_counts`` for predictions given as ``AnomalyRanges``.
+
+    The true anomalies within ``r`` of a prediction are those covered by
+    the predicted ranges widened by ``r`` on both sides, and conversely for
+    the predictions within ``r`` of a true anomaly. Every count is thus an
+    overlap between two sets of ranges.
+    """
+    true_starts, true_ends = labels.range_bounds
+    pred_starts, pred_ends = y_pred.starts, y_pred.ends
+
+    em = _intersection_size(true_starts, true_ends, pred_starts, pred_ends)
+    hits = np.array([
+        _intersection_size(
+            true_starts, true_ends,
+            *_merge_ranges(pred_starts - r, pred_ends + r),
+        )
+        for r in radii
+    ], dtype=np.int64)
+    false_alarms = y_pred.n_anomalies - np.array([
+        _intersection_size(
+            pred_starts, pred_ends,
+            *_merge_ranges(true_starts - r, true_ends + r),
+        )
+        for r in radii
+    ], dtype=np.int64)
+    return em, hits, false_alarms
 
 
 def soft_precision(y_true: np.ndarray,
@@ -36,7 +264,7 @@ def soft_precision(y_true: np.ndarray,
     ----------
         y_true : np.ndarray
             Ground truth labels
-        y_pred : np.ndarray
+        y_pred : np.ndarray or AnomalyRanges
             Predicted labels
         detection_range : int, default=3
             Range in which the anomaly is considered correctly detected
@@ -52,27 +280,18 @@ def soft_precision(y_true: np.ndarray,
         fa : int
             Number of false anomalies
     """
-    y_true = np.asarray(y_true)
-    y_pred = np.asarray(y_pred)
-
-    true_mask = y_true == 1
-    pred_mask = y_pred == 1
-
     # TFDIR = (EM + DA) / (EM + DA + FA)
 
     # EM : Exact Match
-    em = int(np.sum(true_mask & pred_mask))
+    em, hits, false_alarms = _soft_counts(y_true, y_pred, [detection_range])
 
-    true_dil = _dilate(true_mask, detection_range)
-    pred_dil = _dilate(pred_mask, detection_range)
+    # FA : False Anomaly
+    fa = int(false_alarms[0])
 
     # DA : Detected Anomaly
-    fa = int(np.sum(pred_mask & ~true_dil))
-
-    # FA : False Anomaly
     # Removing exact matches from detected anomalies because they are
     # counted twice
-    da = int(np.sum(true_mask & pred_dil)) - em
+    da = int(hits[0]) - em
 
     total = em + da + fa
     score = (em + da) / total if total else 0
@@ -92,7 +311,7 @@ def soft_recall(y_true: np.ndarray,
     ----------
         y_true : np.ndarray
             Ground truth labels
-        y_pred : np.ndarray
+        y_pred : np.ndarray or AnomalyRanges
             Predicted labels
         detection_range : int, default=3
             Range in which the anomaly is considered correctly detected
@@ -108,18 +327,11 @@ def soft_recall(y_true: np.ndarray,
         ma : int
             Number of missed anomalies
     """
-    y_true = np.asarray(y_true)
-    y_pred = np.asarray(y_pred)
-
-    true_mask = y_true == 1
-    pred_mask = y_pred == 1
-
-    em = int(np.sum(true_mask & pred_mask))
+    labels = _as_labels(y_true)
+    em, hits, _ = _soft_counts(labels, y_pred, [detection_range])
 
-    pred_dil = _dilate(pred_mask, detection_range)
-
-    ma = int(np.sum(true_mask & ~pred_dil))
-    da = int(np.sum(true_mask & pred_dil)) - em
+    ma = labels.n_true - int(hits[0])
+    da = int(hits[0]) - em
 
     total = em + da + ma
     score = (em + da) / total if total else 0
@@ -129,6 +341,34 @@ def soft_recall(y_true: np.ndarray,
     return score
 
 
+def _nearest_signed_distances(targets, queries):
+    """Signed offset from each query index to its closest target index.
+
+    ``targets`` and ``queries`` are sorted integer index arrays and
+    ``targets`` must not be empty. Each query is located with
+    ``np.searchsorted`` and only its two neighbouring targets are compared,
+    so the cost is O(Q log T). On ties the earlier target wins, giving the
+    negative offset, as ``np.argmin`` over all offsets would.
+    """
+    pos = np.searchsorted(targets, queries)
+    has_left = pos > 0
+    has_right = pos < len(targets)
+    left = targets[np.maximum(pos - 1, 0)] - queries
+    right = targets[np.minimum(pos, len(targets) - 1)] - queries
+    use_left = has_left & (~has_right | (-left <= right))
+    return np.where(use_left, left, right)
+
+
+def _total_nearest_distance(targets, queries, return_signed=False):
+    """Sum over queries of the (signed) distance to the closest target."""
+    if len(targets) == 0 or len(queries) == 0:
+        return 0
+    dists = _nearest_signed_distances(targets, queries)
+    if not return_signed:
+        dists = np.abs(dists)
+    return dists.sum()
+
+
 def ctt(y_true: np.ndarray, y_pred: np.ndarray, return_signed: bool = False):
     """
     Candidate To Target: Means distance between predicted anomaly and
@@ -149,30 +389,21 @@ def ctt(y_true: np.ndarray, y_pred: np.ndarray, return_signed: bool = False):
         ctt : float
             Candidate To Target time
     """
-    if np.sum(y_true) == 0:
+    labels = _as_labels(y_true)
+    y_pred = np.asarray(y_pred).reshape(-1)
+
+    if labels.n_true == 0:
         # No anomalies to detect
         return float('inf')
     elif np.sum(y_pred) == 0:
         # No anomalies detected
         return 0
 
-    tot_dist = 0
-
-    # Indices of true anomalies
-    true_anomalies = np.where(y_true == 1)[0]
-
-    for i in np.where(y_pred == 1)[0]:
-        if len(true_anomalies) > 0:
-            # signed distances to all true anomalies
-            signed_dists = true_anomalies - i
-            if return_signed:
-                # signed distance with the smallest absolute value
-                min_dist = signed_dists[np.argmin(np.abs(signed_dists))]
-            else:
-                # absolute distance with the smallest value
-                min_dist = np.abs(signed_dists).min()
-            tot_dist += min_dist
-
+    tot_dist = _total_nearest_distance(
+        targets=labels.positions,
+        queries=np.flatnonzero(y_pred == 1),
+        return_signed=return_signed,
+    )
     return tot_dist / np.sum(y_pred)
 
 
@@ -196,31 +427,22 @@ def ttc(y_true: np.ndarray, y_pred: np.ndarray, return_signed: bool = False):
         ttc : float
             Target To Candidate
     """
+    labels = _as_labels(y_true)
+    y_pred = np.asarray(y_pred).reshape(-1)
+
     if np.sum(y_pred) == 0:
         # No anomalies detected
         return float('inf')
-    elif np.sum(y_true) == 0:
+    elif labels.n_true == 0:
         # No true anomalies
         return 0
 
-    tot_dist = 0
-
-    # Indices of predicted anomalies
-    pred_anomalies = np.where(y_pred == 1)[0]
-
-    for i in np.where(y_true == 1)[0]:
-        if len(pred_anomalies) > 0:
-            # signed distances to all predicted anomalies
-            signed_dists = pred_anomalies - i
-            if return_signed:
-                # signed distance with the smallest absolute value
-                min_dist = signed_dists[np.argmin(np.abs(signed_dists))]
-            else:
-                # absolute distance with the smallest value
-                min_dist = np.abs(signed_dists).min()
-            tot_dist += min_dist
-
-    return tot_dist / np.sum(y_true)
+    tot_dist = _total_nearest_distance(
+        targets=np.flatnonzero(y_pred == 1),
+        queries=labels.positions,
+        return_signed=return_signed,
+    )
+    return tot_dist / labels.n_true
 
 
 def soft_f1(precision, recall, detection_range=None):
@@ -256,6 +478,63 @@ def soft_f1(precision, recall, detection_range=None):
     return 2 * (precision * recall) / (precision + recall)
 
 
+def soft_scores(y_true: np.ndarray,
+                y_pred: np.ndarray,
+                detection_ranges=(1, 3, 5, 10, 20)
+                ):
+    """Soft precision, recall and F1 for several detection ranges at once.
+
+    Equivalent to calling ``soft_precision``, ``soft_recall`` and
+    ``soft_f1`` for every entry of ``detection_ranges``, but the distances
+    between true and predicted anomalies are computed in a single pass and
+    shared by all ranges.
+
+    Parameters
+    ----------
+        y_true : np.ndarray
+            Ground truth labels
+        y_pred : np.ndarray or AnomalyRanges
+            Predicted labels
+        detection_ranges : sequence of int, default=(1, 3, 5, 10, 20)
+            Ranges in which an anomaly is considered correctly detected
+
+    Returns
+    -------
+        precision : np.ndarray of shape (n_ranges,)
+            Soft precision for each detection range
+        recall : np.ndarray of shape (n_ranges,)
+            Soft recall for each detection range
+        f1 : np.ndarray of shape (n_ranges,)
+            Soft F1 score for each detection range
+    """
+    labels = _as_labels(y_true)
+    _, hits, false_alarms = _soft_counts(labels, y_pred, detection_ranges)
+    return _soft_from_counts(hits, false_alarms, labels.n_true)
+
+
+def _soft_from_counts(hits, false_alarms, n_true):
+    """Soft precision, recall and F1 from the counts of ``_soft_counts``.
+
+    The counts broadcast together, e.g. ``n_true`` of shape
+    ``(n_resamples, 1)`` with ``hits`` of shape ``(n_resamples, n_ranges)``.
+    """
+    hits, false_alarms, n_true = np.broadcast_arrays(
+        hits, false_alarms, n_true
+    )
+
+    # EM + DA + FA for precision, EM + DA + MA = all true anomalies for recall
+    precision_total = hits + false_alarms
+    precision = np.zeros(hits.shape)
+    np.divide(hits, precision_total, out=precision, where=precision_total > 0)
+    recall = np.zeros(hits.shape)
+    np.divide(hits, n_true, out=recall, where=n_true > 0)
+
+    denom = precision + recall
+    f1 = np.zeros(hits.shape)
+    np.divide(2 * (precision * recall), denom, out=f1, where=denom > 0)
+    return precision, recall, f1
+
+
 # Implementation of the range metrics proposed by Tatbul et al.
 # https://arxiv.org/abs/1803.03639
 
@@ -265,7 +544,7 @@ def extract_anomaly_ranges(labels: list[int]):
 
     Parameters
     ----------
-        labels : List[int]
+        labels : List[int] or AnomalyRanges
                 Series of labels where 1 indicates an
                 anomaly and 0 indicates normal.
 
@@ -275,15 +554,20 @@ def extract_anomaly_ranges(labels: list[int]):
                 Each tuple represents a range (start_index, end_index)
                 where anomalies are present.
     """
-    arr = np.asarray(labels)
-    if arr.size == 0:
-        return []
-    binary = (arr == 1).astype(np.int8)
+    if isinstance(labels, AnomalyRanges):
+        return labels.ranges
+    starts, ends = _label_bounds(labels)
+    return list(zip(starts.tolist(), ends.tolist()))
+
+
+def _label_bounds(labels):
+    """Start and end arrays of the runs of ones of ``labels``."""
+    binary = (np.asarray(labels).reshape(-1) == 1).astype(np.int8)
     padded = np.concatenate(([0], binary, [0]))
     diff = np.diff(padded)
     starts = np.where(diff == 1)[0]
     ends = np.where(diff == -1)[0] - 1
-    return list(zip(starts.tolist(), ends.tolist()))
+    return starts, ends
 
 
 def existence_reward(real_range, predicted_ranges):
@@ -408,6 +692,130 @@ def overlap_size(real_range, overlap_set, anomaly_length, bias_type='flat'):
     return overlap_value / max_value
 
 
+def _as_range_bounds(ranges):
+    """Split a list of ``(start, end)`` ranges into two int64 arrays."""
+    bounds = np.asarray(ranges, dtype=np.int64).reshape(-1, 2)
+    return bounds[:, 0], bounds[:, 1]
+
+
+def _merge_ranges(starts, ends):
+    """Union of closed ranges as sorted, pairwise disjoint bounds."""
+    if len(starts) == 0:
+        return starts, ends
+    order = np.argsort(starts, kind="stable")
+    starts, ends = starts[order], ends[order]
+    reach = np.maximum.accumulate(ends)
+    # A range opens a new block when it starts after everything seen so far.
+    opens = np.flatnonzero(np.r_[True, starts[1:] > reach[:-1]])
+    closes = np.r_[opens[1:] - 1, len(starts) - 1]
+    return starts[opens], reach[closes]
+
+
+def _intersection_size(starts_a, ends_a, starts_b, ends_b):
+    """Number of positions in both sets of pairwise disjoint closed ranges.
+    """
+    def size(starts, ends):
+        return int(np.sum(ends - starts + 1))
+
+    union = _merge_ranges(np.r_[starts_a, starts_b], np.r_[ends_a, ends_b])
+    return size(starts_a, ends_a) + size(starts_b, ends_b) - size(*union)
+
+
+def _bias_sum(lo, hi, anomaly_length, bias_type='flat'):
+    """Closed-form sum of ``positional_bias(j)`` for ``j`` in ``[lo, hi]``.
+
+    Positions are 1-based relative to the start of the anomaly, as in
+    ``overlap_size``. All arguments broadcast; empty spans sum to 0.
+    """
+    lo, hi = np.asarray(lo), np.asarray(hi)
+    anomaly_length = np.asarray(anomaly_length)
+
+    def tri(n):
+        return n * (n + 1) // 2
+
+    def increasing(a, b):
+        return np.where(b >= a, tri(b) - tri(a - 1), 0)
+
+    def decreasing(a, b):
+        count = np.maximum(b - a + 1, 0)
+        return (anomaly_length + 1) * count - increasing(a, b)
+
+    if bias_type == 'front':
+        return decreasing(lo, hi)
+    elif bias_type == 'back':
+        return increasing(lo, hi)
+    elif bias_type == 'middle':
+        mid = anomaly_length // 2
+        return (increasing(lo, np.minimum(hi, mid))
+                + decreasing(np.maximum(lo, mid + 1), hi))
+    return np.maximum(hi - lo + 1, 0)
+
+
+def _range_overlap_rewards(real_starts, real_ends, pred_starts, pred_ends,
+                           bias_type='flat'):
+    """Existence and overlap rewards of every real range in one sweep.
+
+    Equivalent to calling ``existence_reward`` and ``overlap_reward`` for
+    each real range, but the predicted ranges are sorted once and each real
+    range is matched with ``np.searchsorted``, so the cost is
+    O((R + P) log P) plus the number of overlapping pairs.
+
+    Returns
+    -------
+        existence : np.ndarray of bool
+            Whether each real range intersects at least one predicted range.
+        overlap : np.ndarray of float
+            Cardinality-weighted positional overlap of each real range.
+    """
+    n_real = len(real_starts)
+    if n_real == 0 or len(pred_starts) == 0:
+        return np.zeros(n_real, dtype=bool), np.zeros(n_real)
+
+    # Cardinality: a predicted range intersects [start, end] iff it starts
+    # before ``end`` and does not finish before ``start``.
+    counts = (
+        np.searchsorted(np.sort(pred_starts), real_ends, side="right")
+        - np.searchsorted(np.sort(pred_ends), real_starts, side="left")
+    )
+    existence = counts > 0
+
+    # Coverage: clip the disjoint union of predicted ranges to each real
+    # range and integrate the positional bias over every clipped piece.
+    merged_starts, merged_ends = _merge_ranges(pred_starts, pred_ends)
+    first = np.searchsorted(merged_ends, real_starts, side="left")
+    last = np.searchsorted(merged_starts, real_ends, side="right")
+    n_pieces = np.maximum(last - first, 0)
+    owner = np.repeat(np.arange(n_real), n_pieces)
+    offset = np.arange(n_pieces.sum()) - np.repeat(
+        np.cumsum(n_pieces) - n_pieces, n_pieces
+    )
+    block = first[owner] + offset
+
+    anomaly_length = real_ends - real_starts + 1
+    origin = real_starts[owner] - 1
+    covered = np.bincount(
+        owner,
+        weights=_bias_sum(
+            np.maximum(merged_starts[block], real_starts[owner]) - origin,
+            np.minimum(merged_ends[block], real_ends[owner]) - origin,
+            anomaly_length[owner],
+            bias_type,
+        ),
+        minlength=n_real,
+    )
+    total = _bias_sum(1, anomaly_length, anomaly_length, bias_type)
+
+    cardinality = np.where(counts <= 1, 1.0, 1.0 / np.maximum(counts, 1))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        overlap = np.where(existence, cardinality * (covered / total), 0.0)
+    return existence, overlap
+
+
+def _sequential_mean(values):
+    """Mean accumulated left to right, like a plain ``+=`` loop."""
+    return float(np.cumsum(values)[-1] / len(values))
+
+
 def overlap_reward(real_range, predicted_ranges, bias_type='flat'):
     """
     Calculates the overlap reward for a real anomaly range.
@@ -425,22 +833,12 @@ def overlap_reward(real_range, predicted_ranges, bias_type='flat'):
     -------
         float: The overlap reward for the real anomaly range.
     """
-    real_start, real_end = real_range
-    anomaly_length = real_end - real_start + 1
-    total_overlap = set()
-
-    for pred_start, pred_end in predicted_ranges:
-        overlap = set(range(max(real_start, pred_start),
-                            min(real_end, pred_end) + 1))
-        total_overlap.update(overlap)
-
-    if not total_overlap:
-        return 0.0
-
-    cardinality = cardinality_factor(real_range, predicted_ranges)
-    size = overlap_size(real_range, total_overlap, anomaly_length, bias_type)
-
-    return cardinality * size
+    real_starts, real_ends = _as_range_bounds([real_range])
+    pred_starts, pred_ends = _as_range_bounds(predicted_ranges)
+    _, overlap = _range_overlap_rewards(
+        real_starts, real_ends, pred_starts, pred_ends, bias_type
+    )
+    return float(overlap[0])
 
 
 def recall_t(real_ranges, predicted_ranges, alpha=0.5, bias_type='flat'):
@@ -464,15 +862,15 @@ def recall_t(real_ranges, predicted_ranges, alpha=0.5, bias_type='flat'):
     -------
         float: The range-based recall score.
     """
-    recall_sum = 0
-
-    for real_range in real_ranges:
-        existence = existence_reward(real_range, predicted_ranges)
-        overlap = overlap_reward(real_range, predicted_ranges,
-                                 bias_type=bias_type)
-        recall_sum += alpha * existence + (1 - alpha) * overlap
+    if len(real_ranges) == 0:
+        return 0
 
-    return recall_sum / len(real_ranges) if real_ranges else 0
+    real_starts, real_ends = _as_range_bounds(real_ranges)
+    pred_starts, pred_ends = _as_range_bounds(predicted_ranges)
+    existence, overlap = _range_overlap_rewards(
+        real_starts, real_ends, pred_starts, pred_ends, bias_type
+    )
+    return _sequential_mean(alpha * existence + (1 - alpha) * overlap)
 
 
 def precision_t(real_ranges, predicted_ranges, bias_type='flat'):
@@ -494,14 +892,15 @@ def precision_t(real_ranges, predicted_ranges, bias_type='flat'):
     -------
         float: The range-based precision score.
     """
-    precision_sum = 0
-
-    for predicted_range in predicted_ranges:
-        overlap = overlap_reward(predicted_range, real_ranges,
-                                 bias_type=bias_type)
-        precision_sum += overlap
+    if len(predicted_ranges) == 0:
+        return 0
 
-    return precision_sum / len(predicted_ranges) if predicted_ranges else 0
+    real_starts, real_ends = _as_range_bounds(real_ranges)
+    pred_starts, pred_ends = _as_range_bounds(predicted_ranges)
+    _, overlap = _range_overlap_rewards(
+        pred_starts, pred_ends, real_starts, real_ends, bias_type
+    )
+    return _sequential_mean(overlap)
 
 
 def f1_t(real_ranges, predicted_ranges, alpha=0.5, bias_type='flat'):
@@ -532,3 +931,1086 @@ def f1_t(real_ranges, predicted_ranges, alpha=0.5, bias_type='flat'):
         return 0
 
     return 2 * (recall_score*precision_score)/(recall_score+precision_score)
+
+
+# Threshold-free metrics computed from a single sort of the anomaly scores.
+
+def _score_order(anomaly_scores, order=None):
+    """Indices sorting the scores in decreasing order, unless given."""
+    if order is None:
+        # Tied scores are always grouped by the callers, so the sort does
+        # not need to be stable.
+        order = np.argsort(anomaly_scores)[::-1]
+    return order
+
+
+def _threshold_counts(y_true, anomaly_scores, order=None):
+    """Cumulative TP/FP counts for every distinct score threshold.
+
+    Scores are sorted once in decreasing order. Entry ``k`` of the outputs
+    describes the prediction ``anomaly_scores >= thresholds[k]``, so tied
+    scores always switch on together.
+
+    Returns
+    -------
+        thresholds : np.ndarray
+            Distinct scores in decreasing order.
+        tp : np.ndarray
+            Number of true anomalies scored at or above each threshold.
+        fp : np.ndarray
+            Number of normal points scored at or above each threshold.
+    """
+    y_true = _as_labels(y_true).mask
+    anomaly_scores = np.asarray(anomaly_scores, dtype=float).reshape(-1)
+
+    order = _score_order(anomaly_scores, order)
+    sorted_scores = anomaly_scores[order]
+    tp = np.cumsum(y_true[order])
+    fp = np.arange(1, len(tp) + 1) - tp
+
+    # Only keep the last position of each group of tied scores.
+    last = np.r_[sorted_scores[1:] != sorted_scores[:-1], True]
+    return sorted_scores[last], tp[last], fp[last]
+
+
+def best_f1(y_true: np.ndarray, anomaly_scores: np.ndarray, order=None):
+    """Best point-wise F1 score over all thresholds of the anomaly scores.
+
+    Every threshold ``t`` defines the prediction ``anomaly_scores >= t``.
+    The scores are sorted once and precision/recall are obtained for all
+    thresholds from cumulative TP/FP counts, so the cost is O(n log n).
+
+    Parameters
+    ----------
+        y_true : np.ndarray
+            Ground truth labels
+        anomaly_scores : np.ndarray
+            Anomaly scores, larger values being more anomalous
+        order : np.ndarray, optional
+            Indices sorting ``anomaly_scores`` in decreasing order, to reuse
+            a sort shared with other metrics.
+
+    Returns
+    -------
+        f1 : float
+            Best F1 score
+        threshold : float
+            Score threshold reaching the best F1 score
+        precision : float
+            Precision at that threshold
+        recall : float
+            Recall at that threshold
+    """
+    if len(y_true) == 0:
+        return 0.0, np.inf, 0.0, 0.0
+    return _best_f1_from_counts(
+        *_threshold_counts(y_true, anomaly_scores, order=order)
+    )
+
+
+def _best_f1_from_counts(thresholds, tp, fp):
+    """Best F1 with its threshold, precision and recall from TP/FP counts."""
+    n_pos = tp[-1]
+    if n_pos == 0:
+        return 0.0, np.inf, 0.0, 0.0
+
+    # F1 = 2TP / (2TP + FP + FN) with FN = n_pos - TP
+    f1 = 2 * tp / (tp + fp + n_pos)
+    best = int(np.argmax(f1))
+    return (
+        float(f1[best]),
+        float(thresholds[best]),
+        float(tp[best] / (tp[best] + fp[best])),
+        float(tp[best] / n_pos),
+    )
+
+
+def roc_pr_scores(y_true: np.ndarray,
+                  anomaly_scores: np.ndarray,
+                  order=None
+                  ):
+    """AUC-ROC, AUC-PR and best F1 score from a single sort of the scores.
+
+    The three metrics are derived from the same cumulative TP/FP counts.
+    Tied scores are grouped into one threshold, as in scikit-learn, so
+    AUC-ROC matches ``roc_auc_score`` and AUC-PR matches
+    ``average_precision_score``.
+
+    Parameters
+    ----------
+        y_true : np.ndarray
+            Ground truth labels
+        anomaly_scores : np.ndarray
+            Anomaly scores, larger values being more anomalous
+        order : np.ndarray, optional
+            Indices sorting ``anomaly_scores`` in decreasing order, to reuse
+            a sort shared with other metrics.
+
+    Returns
+    -------
+        auc_roc : float
+            Area under the ROC curve, NaN if ``y_true`` has a single class
+        auc_pr : float
+            Average precision, NaN if ``y_true`` has a single class
+        f1 : float
+            Best point-wise F1 score over all thresholds
+    """
+    if len(y_true) == 0:
+        return np.nan, np.nan, 0.0
+
+    thresholds, tp, fp = _threshold_counts(y_true, anomaly_scores, order)
+    f1 = _best_f1_from_counts(thresholds, tp, fp)[0]
+
+    n_pos, n_neg = tp[-1], fp[-1]
+    if n_pos == 0 or n_neg == 0:
+        return np.nan, np.nan, f1
+
+    tpr = np.r_[0, tp / n_pos]
+    fpr = np.r_[0, fp / n_neg]
+    auc_roc = np.sum(np.diff(fpr) * (tpr[1:] + tpr[:-1]) / 2)
+    # Step-wise integral of the precision over the recall increments.
+    auc_pr = np.sum(np.diff(tpr) * (tp / (tp + fp)))
+    return float(auc_roc), float(max(0.0, auc_pr)), f1
+
+
+def roc_pr_scores_batch(y_true: np.ndarray,
+                        anomaly_scores: np.ndarray,
+                        order=None
+                        ):
+    """``roc_pr_scores`` of every row of a score matrix at once.
+
+    The rows are sorted with one 2-D argsort. Every row has the same
+    number ``P`` of positives, so their ranks form a ``(n_configs, P)``
+    array, and the ``k``-th positive of a row has ``k + 1`` true positives
+    at or above it. The three metrics are then sums over the positives,
+    without cumulative counts over all the samples. Tied scores move each
+    positive to the end of its tie group, found for all the rows with one
+    ``np.searchsorted`` over flattened indices.
+
+    Parameters
+    ----------
+        y_true : np.ndarray
+            Ground truth labels, shared by all the rows
+        anomaly_scores : np.ndarray of shape (n_configs, n_samples)
+            Anomaly scores of each configuration, larger values being more
+            anomalous
+        order : np.ndarray of shape (n_configs, n_samples), optional
+            Indices sorting each row of ``anomaly_scores`` in decreasing
+            order, to reuse a sort shared with other metrics.
+
+    Returns
+    -------
+        auc_roc : np.ndarray of shape (n_configs,)
+            Area under the ROC curve of each row, NaN if ``y_true`` has a
+            single class
+        auc_pr : np.ndarray of shape (n_configs,)
+            Average precision of each row, NaN if ``y_true`` has a single
+            class
+        f1 : np.ndarray of shape (n_configs,)
+            Best point-wise F1 score of each row over all thresholds
+    """
+    labels = _as_labels(y_true)
+    anomaly_scores = np.asarray(anomaly_scores, dtype=float)
+    anomaly_scores = anomaly_scores.reshape(len(anomaly_scores), -1)
+    n_configs, n_samples = anomaly_scores.shape
+    n_pos = labels.n_true
+    n_neg = n_samples - n_pos
+    nan = np.full(n_configs, np.nan)
+    if n_pos == 0:
+        return nan, nan.copy(), np.zeros(n_configs)
+
+    if order is None:
+        order = np.argsort(anomaly_scores, axis=1)[:, ::-1]
+    pos_rank = np.nonzero(labels.mask[order])[1].reshape(n_configs, n_pos)
+
+    # For each positive: the first and last ranks of its tie group, and the
+    # true positives above the group and up to its end.
+    first = last = pos_rank
+    tp_last = np.arange(1, n_pos + 1)
+    tp_above = tp_last - 1
+    if _positives_are_tied(anomaly_scores, order, pos_rank):
+        sorted_scores = np.take_along_axis(anomaly_scores, order, axis=1)
+        tied = sorted_scores[:, 1:] == sorted_scores[:, :-1]
+        is_end = np.ones((n_configs, n_samples), dtype=bool)
+        is_end[:, :-1] = ~tied
+        # The last sample of every row ends a group, so a row never looks
+        # past its own groups.
+        ends = np.r_[-1, np.flatnonzero(is_end)]
+        offsets = np.arange(n_configs)[:, None]
+        flat_pos = (pos_rank + offsets * n_samples).ravel()
+        group = np.searchsorted(ends, flat_pos)
+
+        def positives_up_to(flat):
+            return (np.searchsorted(flat_pos, flat, side="right")
+                    .reshape(n_configs, n_pos) - offsets * n_pos)
+
+        tp_last = positives_up_to(ends[group])
+        tp_above = positives_up_to(ends[group - 1])
+        last = ends[group].reshape(n_configs, n_pos) - offsets * n_samples
+        first = ends[group - 1].reshape(n_configs, n_pos) + 1 \
+            - offsets * n_samples
+
+    # F1 = 2TP / (2TP + FP + FN), best at the end of a group of positives.
+    f1 = np.max(2 * tp_last / (last + 1 + n_pos), axis=1)
+    if n_neg == 0:
+        return nan, nan.copy(), f1
+
+    # Negatives ranked below each positive, and half of those tied with it.
+    below = n_samples - 1 - last - (n_pos - tp_last)
+    tied_neg = last - first + 1 - (tp_last - tp_above)
+    auc_roc = np.sum(below + 0.5 * tied_neg, axis=1) / (n_pos * n_neg)
+    auc_pr = np.mean(tp_last / (last + 1), axis=1)
+    return auc_roc, np.maximum(0.0, auc_pr), f1
+
+
+def _positives_are_tied(anomaly_scores, order, pos_rank):
+    """Whether a positive ties with a neighbour in the sorted rows.
+
+    Ties between negatives change none of the ROC/PR metrics, so only the
+    neighbours of the positives are compared.
+    """
+    n_samples = anomaly_scores.shape[1]
+    rows = np.arange(len(anomaly_scores))[:, None]
+
+    def score_at(rank):
+        rank = np.clip(rank, 0, n_samples - 1)
+        return anomaly_scores[rows, order[rows, rank]]
+
+    scores = score_at(pos_rank)
+    return bool(np.any(
+        ((score_at(pos_rank - 1) == scores) & (pos_rank > 0))
+        | ((score_at(pos_rank + 1) == scores) & (pos_rank < n_samples - 1))
+    ))
+
+
+def _previous_later(t, inclusive=False, block=16):
+    """Last earlier position switching on after each position.
+
+    For non-negative integer switch-on times ``t``, returns for every ``i``
+    the largest ``j < i`` with ``t[j] > t[i]`` (``>=`` if ``inclusive``), or
+    -1. Positions are cut into blocks: each block is scanned with shifted
+    comparisons, and the positions left unresolved find the closest block
+    holding a later time by binary lifting over a sparse table of the block
+    maxima, then scan that block. All steps are vectorized and the sparse
+    table only has O(n / block * log n) entries.
+    """
+    later = np.greater_equal if inclusive else np.greater
+    n = len(t)
+    n_blocks = -(-n // block)
+    # Column b holds the positions of block b. Padding switches on before
+    # everything, so it is never later.
+    times = np.full(n_blocks * block, -1, dtype=np.int64)
+    times[:n] = t
+    times = np.ascontiguousarray(times.reshape(n_blocks, block).T)
+    positions = np.arange(n_blocks * block).reshape(n_blocks, block).T
+
+    previous = np.full((block, n_blocks), -1, dtype=np.int64)
+    for d in range(1, block):
+        hit = (previous[d:] < 0) & later(times[:-d], times[d:])
+        np.copyto(previous[d:], positions[:-d], where=hit)
+    previous = previous.T.reshape(-1)[:n]
+
+    queries = np.flatnonzero(previous < 0)
+    x = t[queries]
+    # maxima[k][b] is the largest time of blocks b - 2**k + 1 .. b.
+    maxima = [times.max(axis=0)]
+    while 2 ** len(maxima) < n_blocks:
+        step = 2 ** (len(maxima) - 1)
+        maxima.append(np.r_[maxima[-1][:step],
+                            np.maximum(maxima[-1][step:], maxima[-1][:-step])])
+    b = queries // block - 1
+    for k in range(len(maxima) - 1, -1, -1):
+        active = np.flatnonzero(b >= 0)
+        skip = active[~later(maxima[k][b[active]], x[active])]
+        b[skip] -= 2 ** k
+
+    found = b >= 0
+    b = b[found]
+    hit = later(times[:, b], x[found])
+    previous[queries[found]] = (b * block + block - 1
+                                - np.argmax(hit[::-1], axis=0))
+    return previous
+
+
+def range_f1_curve(y_true: np.ndarray,
+                   anomaly_scores: np.ndarray,
+                   alpha=0.5,
+                   bias_type='flat',
+                   order=None
+                   ):
+    """Range-based precision, recall and F1 for every score threshold.
+
+    Points switch on in decreasing score order, at the index of their
+    group of tied scores. A predicted range ``[s, e]`` exists from the
+    switch-on of its last point until one of ``s - 1`` and ``e + 1`` switches
+    on, and these bounds are found for all ranges at once by
+    ``_previous_later``, so the precision sum is a cumulative sum of the
+    rewards of the ranges entering and leaving. The recall term of a real
+    range only changes when one of its points or adjacent pairs of points
+    switches on, so these events are sorted per real range and their terms
+    differenced. Everything is vectorized and costs O(n log n).
+
+    Parameters
+    ----------
+        y_true : np.ndarray
+            Ground truth labels
+        anomaly_scores : np.ndarray
+            Anomaly scores, larger values being more anomalous
+        alpha : float
+            The weight to assign to the existence reward.
+        bias_type : str
+            The type of positional bias ('flat', 'front', 'back', 'middle').
+        order : np.ndarray, optional
+            Indices sorting ``anomaly_scores`` in decreasing order, to reuse
+            a sort shared with other metrics.
+
+    Returns
+    -------
+        thresholds : np.ndarray
+            Distinct scores in decreasing order. Entry ``k`` of the other
+            outputs is computed for ``anomaly_scores >= thresholds[k]``.
+        precision : np.ndarray
+            ``precision_t`` at each threshold.
+        recall : np.ndarray
+            ``recall_t`` at each threshold.
+        f1 : np.ndarray
+            ``f1_t`` at each threshold.
+    """
+    labels = _as_labels(y_true)
+    y_true = labels.mask
+    anomaly_scores = np.asarray(anomaly_scores, dtype=float).reshape(-1)
+    n = len(y_true)
+    if n == 0:
+        return np.zeros(0), np.zeros(0), np.zeros(0), np.zeros(0)
+
+    order = _score_order(anomaly_scores, order)
+    sorted_scores = anomaly_scores[order]
+    group_end = np.r_[sorted_scores[1:] != sorted_scores[:-1], True]
+    n_groups = int(np.count_nonzero(group_end))
+    # Index of the threshold switching on each position.
+    t = np.empty(n, dtype=np.int64)
+    t[order] = np.r_[0, np.cumsum(group_end[:-1])]
+
+    # Real ranges: owner of each position and positional bias inside it.
+    real_starts, real_ends = labels.range_bounds
+    n_real = len(real_starts)
+    real_lengths = real_ends - real_starts + 1
+    owner = np.full(n, -1, dtype=np.int64)
+    owner[y_true] = np.repeat(np.arange(n_real), real_lengths)
+    rel = np.flatnonzero(y_true) - real_starts[owner[y_true]] + 1
+    weight = np.zeros(n)
+    weight[y_true] = _bias_sum(rel, rel, real_lengths[owner[y_true]],
+                               bias_type)
+    real_totals = _bias_sum(1, real_lengths, real_lengths, bias_type)
+
+    # Every predicted range that ever exists, one per position: bounded by
+    # the nearest positions switching on later, and alive between the
+    # switch-on of that position and of its bounds.
+    prev = _previous_later(t)
+    nxt = n - 1 - _previous_later(t[::-1], inclusive=True)[::-1]
+    s, e = prev + 1, nxt - 1
+    t_after = np.r_[t, n_groups]
+    birth, death = t, np.minimum(t_after[prev], t_after[nxt])
+
+    # Prefix sums answering "true points in [s, e]" (count and position
+    # weighted) for all ranges at once.
+    n_true_before = np.r_[0, np.cumsum(y_true)]
+    pos_true_before = np.r_[0, np.cumsum((np.arange(n) + 1) * y_true)]
+
+    def increasing(a, b):
+        # sum over true j in [a, b] of the 1-based position j - s + 1
+        count = n_true_before[b + 1] - n_true_before[a]
+        return count, pos_true_before[b + 1] - pos_true_before[a] - s * count
+
+    length = e - s + 1
+    if bias_type == 'back':
+        true_weight = increasing(s, e)[1]
+    elif bias_type == 'front':
+        count, pos = increasing(s, e)
+        true_weight = (length + 1) * count - pos
+    elif bias_type == 'middle':
+        mid = length // 2
+        count, pos = increasing(s + mid, e)
+        true_weight = (increasing(s, s + mid - 1)[1]
+                       + (length + 1) * count - pos)
+    else:
+        true_weight = increasing(s, e)[0]
+    if bias_type in ('front', 'back'):
+        total = length * (length + 1) // 2
+    elif bias_type == 'middle':
+        mid = length // 2
+        total = mid * (mid + 1) // 2 + (length - mid) * (
+            length - mid + 1) // 2
+    else:
+        total = length
+    count = (np.searchsorted(real_starts, e, side='right')
+             - np.searchsorted(real_ends, s, side='left'))
+    reward = true_weight / total / np.maximum(count, 1)
+
+    def running(at, values):
+        # Value of the running sum of ``values`` at each threshold.
+        change = np.bincount(at, values, minlength=n_groups + 1)
+        return np.cumsum(change)[:n_groups]
+
+    n_ranges = running(birth, None) - running(death, None)
+    precision = (running(birth, reward) - running(death, reward)) / n_ranges
+
+    # Recall events of each real range: a point switching on adds a
+    # predicted range and its bias weight, a pair of adjacent points
+    # switching on joins two predicted ranges.
+    points = np.flatnonzero(y_true)
+    pairs = np.flatnonzero(y_true[:-1] & y_true[1:])
+    is_point = np.r_[np.ones(len(points)), np.zeros(len(pairs))]
+    at = np.r_[t[points], np.maximum(t[pairs], t[pairs + 1])]
+    real = owner[np.r_[points, pairs]]
+    events = np.lexsort((-is_point, at, real))
+    at, real, is_point = at[events], real[events], is_point[events]
+    is_first = np.r_[True, real[1:] != real[:-1]]
+    first = np.maximum.accumulate(
+        np.where(is_first, np.arange(len(real)), 0))
+
+    def cumulative(values):
+        # Running sum of ``values`` within each real range.
+        total = np.cumsum(values)
+        return total - (total - values)[first]
+
+    n_on = cumulative(is_point)
+    n_overlaps = cumulative(2 * is_point - 1)
+    covered = cumulative(np.r_[weight[points], np.zeros(len(pairs))][events])
+    term = np.where(n_on > 0, alpha + (1 - alpha) * (
+        covered / real_totals[real] / np.maximum(n_overlaps, 1)), 0.0)
+    delta = term - np.where(is_first, 0.0, np.r_[0.0, term[:-1]])
+    recall = running(at, delta) / n_real if n_real else np.zeros(n_groups)
+
+    denom = precision + recall
+    f1 = np.zeros(len(denom))
+    np.divide(2 * (recall * precision), denom, out=f1, where=denom > 0)
+    return sorted_scores[group_end], precision, recall, f1
+
+
+def best_f1_t(y_true: np.ndarray,
+              anomaly_scores: np.ndarray,
+              alpha=0.5,
+              bias_type='flat',
+              order=None
+              ):
+    """Best range-based F1 score over all thresholds of the anomaly scores.
+
+    The threshold is selected on the curve of ``range_f1_curve`` and the
+    reported scores are recomputed exactly with ``precision_t`` and
+    ``recall_t`` at that threshold.
+
+    Parameters
+    ----------
+        y_true : np.ndarray
+            Ground truth labels
+        anomaly_scores : np.ndarray
+            Anomaly scores, larger values being more anomalous
+        alpha : float
+            The weight to assign to the existence reward.
+        bias_type : str
+            The type of positional bias ('flat', 'front', 'back', 'middle').
+        order : np.ndarray, optional
+            Indices sorting ``anomaly_scores`` in decreasing order, to reuse
+            a sort shared with other metrics.
+
+    Returns
+    -------
+        f1 : float
+            Best range-based F1 score
+        threshold : float
+            Score threshold reaching the best F1 score
+        precision : float
+            Range-based precision at that threshold
+        recall : float
+            Range-based recall at that threshold
+    """
+    labels = _as_labels(y_true)
+    thresholds, _, _, f1 = range_f1_curve(
+        labels, anomaly_scores, alpha=alpha, bias_type=bias_type, order=order
+    )
+    if len(thresholds) == 0:
+        return 0.0, np.inf, 0.0, 0.0
+    threshold = thresholds[int(np.argmax(f1))]
+
+    real_ranges = labels.ranges
+    predicted_ranges = extract_anomaly_ranges(
+        np.asarray(anomaly_scores) >= threshold
+    )
+    precision = precision_t(real_ranges, predicted_ranges, bias_type)
+    recall = recall_t(real_ranges, predicted_ranges, alpha, bias_type)
+    f1 = f1_t(real_ranges, predicted_ranges, alpha, bias_type)
+    return float(f1), float(threshold), float(precision), float(recall)
+
+
+# Range-AUC and VUS (volume under the surface) as proposed by Paparrizos et al.
+# https://doi.org/10.14778/3551793.3551830
+
+def _range_auc_surface(y_true, anomaly_scores, buffers, n_thresholds=250,
+                       order=None):
+    """Range-AUC-ROC and Range-AUC-PR for several buffer lengths.
+
+    Each true anomaly is extended on both sides by ``buffer // 2`` points
+    with soft labels ``sqrt(1 - d / buffer)``, ``d`` being the distance to
+    the anomaly. Only the nearest anomaly on each side contributes to a
+    buffer label. The scores are sorted once; the ranks of the points near
+    an anomaly and the first detection of every buffered segment are then
+    shared by all buffer lengths, so each extra buffer only costs
+    O(#anomalies * max(buffers) + n_thresholds).
+
+    Parameters
+    ----------
+        y_true : np.ndarray
+            Ground truth labels
+        anomaly_scores : np.ndarray
+            Anomaly scores, larger values being more anomalous
+        buffers : sequence of int
+            Buffer lengths around each anomaly
+        n_thresholds : int or None, default=250
+            Number of thresholds, taken at evenly spaced positions of the
+            sorted scores. If None, every distinct score is a threshold.
+        order : np.ndarray, optional
+            Indices sorting ``anomaly_scores`` in decreasing order, to reuse
+            a sort shared with other metrics.
+
+    Returns
+    -------
+        auc_roc : np.ndarray of shape (n_buffers,)
+            Range-AUC-ROC for each buffer length
+        auc_pr : np.ndarray of shape (n_buffers,)
+            Range-AUC-PR for each buffer length
+    """
+    labels = _as_labels(y_true)
+    y_true = labels.mask
+    anomaly_scores = np.asarray(anomaly_scores, dtype=float).reshape(-1)
+    buffers = np.asarray(buffers, dtype=np.int64)
+    n = len(y_true)
+    n_true = labels.n_true
+    if n_true == 0 or n_true == n:
+        return np.full(len(buffers), np.nan), np.full(len(buffers), np.nan)
+
+    order = _score_order(anomaly_scores, order)
+    rank = np.empty(n, dtype=np.int64)
+    rank[order] = np.arange(n)
+    sorted_scores = anomaly_scores[order]
+
+    # Last sorted position predicted positive at each threshold, with ties
+    # switching on together.
+    if n_thresholds is None:
+        picks = np.flatnonzero(np.r_[sorted_scores[1:] != sorted_scores[:-1],
+                                     True])
+    else:
+        picks = np.linspace(0, n - 1, n_thresholds).astype(int)
+    cuts = np.searchsorted(-sorted_scores, -sorted_scores[picks],
+                           side="right") - 1
+    n_pred = cuts + 1
+    true_tp = np.cumsum(y_true[order])[cuts]
+
+    # Normal points close enough to an anomaly to get a buffer label, with
+    # their distance to the previous anomaly end and the next anomaly start.
+    half = int(buffers.max()) // 2
+    after_end, before_start = labels.directional_distances
+    near = ~y_true & ((after_end < half) | (before_start <= half))
+    near_order = np.argsort(rank[near], kind="stable")
+    near_rank = rank[near][near_order]
+    after_end = after_end[near][near_order]
+    before_start = before_start[near][near_order]
+    near_count = np.searchsorted(near_rank, cuts, side="right")
+
+    # First detection rank of each true range and of its buffers, as running
+    # minima over the distance to the range.
+    real_starts, real_ends = labels.range_bounds
+    real_first = np.minimum.reduceat(rank[y_true], np.r_[
+        0, np.cumsum(real_ends - real_starts + 1)[:-1]])
+    offsets = np.arange(1, half + 1)
+    left = real_starts[:, None] - offsets
+    right = real_ends[:, None] + offsets
+    left_first = np.minimum.accumulate(np.where(
+        left >= 0, rank[np.clip(left, 0, n - 1)], n), axis=1)
+    right_first = np.minimum.accumulate(np.where(
+        right < n, rank[np.clip(right, 0, n - 1)], n), axis=1)
+
+    auc_roc, auc_pr = np.zeros(len(buffers)), np.zeros(len(buffers))
+    for b, buffer in enumerate(buffers.tolist()):
+        h = buffer // 2
+
+        # Buffer labels: points after an end at distance < h, points before
+        # a start at distance <= h.
+        labels = np.zeros(len(near_rank))
+        if h > 0:
+            labels += np.where(after_end < h, np.sqrt(np.maximum(
+                1 - after_end / buffer, 0)), 0)
+            labels += np.where(before_start <= h, np.sqrt(np.maximum(
+                1 - before_start / buffer, 0)), 0)
+        labels = np.minimum(labels, 1)
+        tp = true_tp + np.r_[0, np.cumsum(labels)][near_count]
+
+        # Buffered segments: extended ranges merged when they touch.
+        seg_start = np.maximum(real_starts - h, 0)
+        seg_end = np.minimum(real_ends + max(h - 1, 0), n - 1)
+        first = real_first.copy()
+        if h > 0:
+            first = np.minimum(first, left_first[:, h - 1])
+        if h > 1:
+            first = np.minimum(first, right_first[:, h - 2])
+        groups = np.flatnonzero(np.r_[True, seg_start[1:] > seg_end[:-1] + 1])
+        first = np.sort(np.minimum.reduceat(first, groups))
+        existence = np.searchsorted(first, cuts, side="right") / len(groups)
+
+        p_new = n_true + labels.sum() / 2
+        tpr = np.minimum(tp / p_new, 1) * existence
+        fpr = (n_pred - tp) / (n - p_new)
+        precision = tp / n_pred
+
+        tpr_curve = np.r_[0, tpr, 1]
+        fpr_curve = np.r_[0, fpr, 1]
+        auc_roc[b] = np.sum(np.diff(fpr_curve)
+                            * (tpr_curve[1:] + tpr_curve[:-1]) / 2)
+        auc_pr[b] = np.dot(np.diff(tpr_curve[:-1]), precision)
+    return auc_roc, auc_pr
+
+
+def range_auc(y_true: np.ndarray,
+              anomaly_scores: np.ndarray,
+              buffer=100,
+              n_thresholds=250,
+              order=None
+              ):
+    """Range-AUC-ROC and Range-AUC-PR for a single buffer length.
+
+    Parameters
+    ----------
+        y_true : np.ndarray
+            Ground truth labels
+        anomaly_scores : np.ndarray
+            Anomaly scores, larger values being more anomalous
+        buffer : int, default=100
+            Buffer length around each anomaly
+        n_thresholds : int or None, default=250
+            Number of thresholds. If None, every distinct score is used.
+        order : np.ndarray, optional
+            Indices sorting ``anomaly_scores`` in decreasing order, to reuse
+            a sort shared with other metrics.
+
+    Returns
+    -------
+        auc_roc : float
+            Range-AUC-ROC
+        auc_pr : float
+            Range-AUC-PR
+    """
+    auc_roc, auc_pr = _range_auc_surface(
+        y_true, anomaly_scores, [buffer], n_thresholds=n_thresholds,
+        order=order
+    )
+    return float(auc_roc[0]), float(auc_pr[0])
+
+
+def vus(y_true: np.ndarray,
+        anomaly_scores: np.ndarray,
+        max_buffer=100,
+        n_thresholds=250,
+        order=None
+        ):
+    """VUS-ROC and VUS-PR: Range-AUC averaged over buffers 0..max_buffer.
+
+    Parameters
+    ----------
+        y_true : np.ndarray
+            Ground truth labels
+        anomaly_scores : np.ndarray
+            Anomaly scores, larger values being more anomalous
+        max_buffer : int, default=100
+            Largest buffer length of the surface
+        n_thresholds : int or None, default=250
+            Number of thresholds. If None, every distinct score is used.
+        order : np.ndarray, optional
+            Indices sorting ``anomaly_scores`` in decreasing order, to reuse
+            a sort shared with other metrics.
+
+    Returns
+    -------
+        vus_roc : float
+            Volume under the Range-AUC-ROC surface
+        vus_pr : float
+            Volume under the Range-AUC-PR surface
+    """
+    auc_roc, auc_pr = _range_auc_surface(
+        y_true, anomaly_scores, np.arange(max_buffer + 1),
+        n_thresholds=n_thresholds, order=order
+    )
+    return float(auc_roc.mean()), float(auc_pr.mean())
+
+
+# Point-adjusted F1 and the PA%K protocol proposed by Kim et al.
+# https://arxiv.org/abs/2109.05257
+
+def pa_k_scores(y_true: np.ndarray, y_pred: np.ndarray, ks=None):
+    """Point-adjusted precision, recall and F1 for several values of K.
+
+    With PA%K, every point of a true anomaly segment counts as detected
+    when more than ``K`` percent of its points are predicted. ``K=0`` gives
+    the usual point-adjust protocol and ``K=100`` the point-wise scores.
+    The hits of every segment are counted once with ``np.add.reduceat``,
+    then each ``K`` only adds the points of the segments it adjusts.
+
+    Parameters
+    ----------
+        y_true : np.ndarray
+            Ground truth labels
+        y_pred : np.ndarray
+            Predicted labels
+        ks : sequence of float, optional
+            Percentages K, every integer from 0 to 100 by default.
+
+    Returns
+    -------
+        precision : np.ndarray of shape (n_ks,)
+            Point-adjusted precision for each K
+        recall : np.ndarray of shape (n_ks,)
+            Point-adjusted recall for each K
+        f1 : np.ndarray of shape (n_ks,)
+            Point-adjusted F1 score for each K
+    """
+    ks = np.arange(101) if ks is None else np.asarray(ks, dtype=float)
+    return _pa_from_counts(*_pa_k_counts(y_true, y_pred, ks))
+
+
+def _pa_k_counts(y_true, y_pred, ks):
+    """Point-adjusted true positives for each K, false positives and the
+    number of true anomalies behind ``pa_k_scores``.
+    """
+    labels = _as_labels(y_true)
+    pred_mask = np.asarray(y_pred).reshape(-1) == 1
+
+    starts, ends = labels.range_bounds
+    fp = int(np.count_nonzero(pred_mask & ~labels.mask))
+
+    tp = np.zeros(len(ks))
+    if len(starts):
+        # Sums over [start, end] and over the following gaps, interleaved.
+        bounds = np.column_stack((starts, ends + 1)).ravel()
+        padded = np.r_[pred_mask, False].astype(np.int64)
+        hits = np.add.reduceat(padded, bounds)[::2]
+
+        # A segment is adjusted iff K < critical, gaining its missed points.
+        lengths = ends - starts + 1
+        critical = 100 * hits / lengths
+        gains = lengths - hits
+        order = np.argsort(critical)
+        critical = critical[order]
+        # Total gain of the segments whose critical K is above each value.
+        suffix = np.r_[np.cumsum(gains[order][::-1])[::-1], 0]
+        tp = hits.sum() + suffix[np.searchsorted(critical, ks, side="right")]
+    return tp, fp, labels.n_true
+
+
+def _pa_from_counts(tp, fp, n_true):
+    """Point-adjusted precision, recall and F1 from ``_pa_k_counts``."""
+    tp = np.asarray(tp, dtype=float)
+    predicted = tp + fp
+    precision = np.zeros(tp.shape)
+    np.divide(tp, predicted, out=precision, where=predicted > 0)
+    recall = tp / n_true if n_true else np.zeros(tp.shape)
+    f1 = np.zeros(tp.shape)
+    np.divide(2 * tp, predicted + n_true, out=f1, where=tp > 0)
+    return precision, recall, f1
+
+
+def best_pa_k_f1(y_true: np.ndarray,
+                 anomaly_scores: np.ndarray,
+                 k=0,
+                 order=None):
+    """Best PA%K F1 score over all thresholds of the anomaly scores.
+
+    Scores are sorted once. A true anomaly segment is adjusted at the
+    threshold where its ``floor(k * length / 100) + 1``-th point switches
+    on, and from then on all its points count as true positives. Each
+    point is thus credited at the earlier of its own threshold and the
+    adjustment threshold of its segment, and the adjusted TP counts of all
+    thresholds follow from one cumulative sum.
+
+    Parameters
+    ----------
+        y_true : np.ndarray
+            Ground truth labels
+        anomaly_scores : np.ndarray
+            Anomaly scores, larger values being more anomalous
+        k : float, default=0
+            Percentage of detected points above which a segment is
+            adjusted, 0 giving the point-adjust protocol.
+        order : np.ndarray, optional
+            Indices sorting ``anomaly_scores`` in decreasing order, to reuse
+            a sort shared with other metrics.
+
+    Returns
+    -------
+        f1 : float
+            Best point-adjusted F1 score
+        threshold : float
+            Score threshold reaching the best F1 score
+        precision : float
+            Point-adjusted precision at that threshold
+        recall : float
+            Point-adjusted recall at that threshold
+    """
+    labels = _as_labels(y_true)
+    if len(labels) == 0 or labels.n_true == 0:
+        return 0.0, np.inf, 0.0, 0.0
+    anomaly_scores = np.asarray(anomaly_scores, dtype=float).reshape(-1)
+    order = _score_order(anomaly_scores, order)
+    thresholds, _, fp = _threshold_counts(labels, anomaly_scores, order)
+
+    # Threshold index at which every point switches on.
+    sorted_scores = anomaly_scores[order]
+    group = np.empty(len(order), dtype=np.int64)
+    group[order] = np.r_[0, np.cumsum(sorted_scores[1:] != sorted_scores[:-1])]
+
+    starts, ends = labels.range_bounds
+    lengths = ends - starts + 1
+    positions = labels.positions
+    segment = np.repeat(np.arange(len(starts)), lengths)
+    point_group = group[positions]
+
+    # Threshold index of the point adjusting each segment, if any.
+    needed = np.floor(k * lengths / 100).astype(np.int64) + 1
+    adjusted = needed <= lengths
+    by_segment = np.lexsort((point_group, segment))
+    offsets = np.r_[0, np.cumsum(lengths)[:-1]]
+    adjust_group = np.full(len(starts), len(thresholds), dtype=np.int64)
+    adjust_group[adjusted] = point_group[by_segment][
+        offsets[adjusted] + needed[adjusted] - 1
+    ]
+
+    credited = np.minimum(point_group, adjust_group[segment])
+    tp = np.cumsum(np.bincount(credited, minlength=len(thresholds)))
+    return _best_f1_from_counts(thresholds, tp, fp)
+
+
+# Affiliation metrics proposed by Huet et al.
+# https://arxiv.org/abs/2206.13167
+
+def _ramp_integral(u, c):
+    """``int_{-inf}^{u} max(0, t - c) dt``, vectorised."""
+    return np.maximum(u - c, 0) ** 2 / 2
+
+
+def _events(y):
+    """Runs of ones as half-open intervals ``[start, end + 1)``."""
+    starts, ends = _as_range_bounds(extract_anomaly_ranges(y))
+    return starts.astype(float), ends + 1.0
+
+
+def _cut_into_zones(starts, ends, zone_lo, zone_hi):
+    """Pieces of the intervals inside each zone, with their zone index.
+
+    Zones are contiguous and sorted. Empty intersections are dropped.
+    """
+    first = np.searchsorted(zone_hi, starts, side="right")
+    last = np.searchsorted(zone_lo, ends, side="left") - 1
+    counts = np.maximum(last - first + 1, 0)
+    interval = np.repeat(np.arange(len(starts)), counts)
+    zone = first[interval] + np.arange(counts.sum()) - np.repeat(
+        np.cumsum(counts) - counts, counts
+    )
+    lo = np.maximum(starts[interval], zone_lo[zone])
+    hi = np.minimum(ends[interval], zone_hi[zone])
+    keep = hi > lo
+    return lo[keep], hi[keep], zone[keep]
+
+
+def affiliation_scores(y_true: np.ndarray, y_pred: np.ndarray):
+    """Affiliation precision and recall.
+
+    The timeline ``[0, n)`` is split into one zone per true event, cutting
+    halfway between consecutive events. In each zone, a predicted point
+    scores the probability that a point drawn uniformly in the zone is at
+    least as far from the true event, and a true point scores the
+    probability that a uniform point is at least as far from it as the
+    closest prediction. These survival functions are piecewise linear,
+    so their integrals over the predicted and true intervals have closed
+    forms, computed for all the pieces at once. The cost is
+    O((R + P) log(R + P)) for R true and P predicted events.
+
+    Parameters
+    ----------
+        y_true : np.ndarray
+            Ground truth labels
+        y_pred : np.ndarray or AnomalyRanges
+            Predicted labels
+
+    Returns
+    -------
+        precision : float
+            Mean individual precision over the zones containing a
+            prediction, NaN without prediction.
+        recall : float
+            Mean individual recall over the zones, NaN without true event.
+    """
+    precision, recall = _affiliation_zones(y_true, y_pred)
+    return _defined_mean(precision), _defined_mean(recall)
+
+
+def _defined_mean(values):
+    """Mean of the non-NaN values, NaN if there is none."""
+    values = values[~np.isnan(values)]
+    return float(np.mean(values)) if len(values) else np.nan
+
+
+def _affiliation_zones(y_true, y_pred):
+    """Individual affiliation precision and recall of every zone.
+
+    Returns two arrays of shape (n_true_events,), the precision being NaN
+    in the zones without prediction. ``affiliation_scores`` averages them.
+    """
+    labels = _as_labels(y_true)
+    true_starts, true_ends = labels.range_bounds
+    true_starts, true_ends = true_starts.astype(float), true_ends + 1.0
+    pred_starts, pred_ends = _events(y_pred)
+    if len(true_starts) == 0:
+        return np.zeros(0), np.zeros(0)
+    if len(pred_starts) == 0:
+        return np.full(len(true_starts), np.nan), np.zeros(len(true_starts))
+
+    cuts = (true_ends[:-1] + true_starts[1:]) / 2
+    zone_lo = np.r_[0.0, cuts]
+    zone_hi = np.r_[cuts, float(len(labels))]
+    lo, hi, zone = _cut_into_zones(pred_starts, pred_ends, zone_lo, zone_hi)
+    n_zones = len(zone_lo)
+
+    a, b = zone_lo[zone], zone_hi[zone]
+    j0, j1 = true_starts[zone], true_ends[zone]
+    width = b - a
+
+    # Precision: a point at distance d > 0 before the event scores
+    # (t - a + max(0, t - (j0 - (b - j1)))) / width, and symmetrically after.
+    u1 = np.minimum(hi, j0)
+    u0 = np.minimum(lo, u1)
+    before = (_ramp_integral(u1, a) - _ramp_integral(u0, a)
+              + _ramp_integral(u1, j0 - (b - j1))
+              - _ramp_integral(u0, j0 - (b - j1)))
+    v0 = np.maximum(lo, j1)
+    v1 = np.maximum(hi, v0)
+    after = (_ramp_integral(-v0, -b) - _ramp_integral(-v1, -b)
+             + _ramp_integral(-v0, -(j1 + j0 - a))
+             - _ramp_integral(-v1, -(j1 + j0 - a)))
+    inside = np.maximum(np.minimum(hi, j1) - np.maximum(lo, j0), 0)
+    scored = np.bincount(zone, (before + after) / width + inside, n_zones)
+    length = np.bincount(zone, hi - lo, n_zones)
+    has_pred = length > 0
+    precision = np.full(n_zones, np.nan)
+    precision[has_pred] = scored[has_pred] / length[has_pred]
+
+    # Recall: each piece is closest to the true points between the
+    # midpoints with the neighbouring pieces of the same zone.
+    same_prev = np.r_[False, zone[1:] == zone[:-1]]
+    same_next = np.r_[same_prev[1:], False]
+    mid = (hi[:-1] + lo[1:]) / 2
+    y0 = np.maximum(j0, np.where(same_prev, np.r_[0.0, mid], a))
+    y1 = np.minimum(j1, np.where(same_next, np.r_[mid, 0.0], b))
+    y1 = np.maximum(y0, y1)
+
+    # Before the piece, a true point y scores
+    # (max(0, 2y - (lo + a)) + b - lo) / width, and symmetrically after.
+    w1 = np.minimum(y1, lo)
+    w0 = np.minimum(y0, w1)
+    before = ((_ramp_integral(2 * w1, lo + a)
+               - _ramp_integral(2 * w0, lo + a)) / 2
+              + (b - lo) * (w1 - w0))
+    x0 = np.maximum(y0, hi)
+    x1 = np.maximum(y1, x0)
+    after = ((_ramp_integral(-2 * x0, -(b + hi))
+              - _ramp_integral(-2 * x1, -(b + hi))) / 2
+             + (hi - a) * (x1 - x0))
+    inside = np.maximum(np.minimum(y1, hi) - np.maximum(y0, lo), 0)
+    scored = np.bincount(zone, (before + after) / width + inside, n_zones)
+    recall = scored / (true_ends - true_starts)
+    return precision, recall
+
+
+# Event-wise detection delays.
+
+def detection_delays(y_true: np.ndarray, y_pred: np.ndarray):
+    """Delay between the start of each true event and its first detection.
+
+    The first predicted anomaly at or after the start of every range of
+    ``extract_anomaly_ranges(y_true)`` is found with a single
+    ``np.searchsorted`` over the predicted positive indices.
+
+    Parameters
+    ----------
+        y_true : np.ndarray
+            Ground truth labels
+        y_pred : np.ndarray or AnomalyRanges
+            Predicted labels
+
+    Returns
+    -------
+        delays : np.ndarray of shape (n_events,)
+            Number of samples between the start of each event and its
+            first predicted anomaly, NaN when no prediction falls inside
+            the event.
+    """
+    starts, ends = _as_labels(y_true).range_bounds
+    # The sentinel stands for "no prediction after the start".
+    sentinel = np.iinfo(np.int64).max
+    if isinstance(y_pred, AnomalyRanges):
+        # First predicted range ending at or after each start.
+        first = np.maximum(np.r_[y_pred.starts, sentinel][
+            np.searchsorted(y_pred.ends, starts)
+        ], starts)
+    else:
+        predicted = np.flatnonzero(np.asarray(y_pred).reshape(-1) == 1)
+        first = np.r_[predicted, sentinel][np.searchsorted(predicted, starts)]
+    return np.where(first <= ends, first - starts, np.nan)
+
+
+def detection_delay_scores(y_true: np.ndarray,
+                           y_pred: np.ndarray,
+                           percentiles=(50,),
+                           horizons=(0, 10, 100)):
+    """Summary statistics of the detection delays of the true events.
+
+    Parameters
+    ----------
+        y_true : np.ndarray
+            Ground truth labels
+        y_pred : np.ndarray or AnomalyRanges
+            Predicted labels
+        percentiles : sequence of float, default=(50,)
+            Percentiles of the delays of the detected events.
+        horizons : sequence of int, default=(0, 10, 100)
+            Delays ``k`` for the rate of events detected within ``k``
+            samples of their start.
+
+    Returns
+    -------
+        mean : float
+            Mean delay of the detected events, NaN if none is detected.
+        percentiles : np.ndarray of shape (n_percentiles,)
+            Delay percentiles of the detected events.
+        detected_within : np.ndarray of shape (n_horizons,)
+            Fraction of all the true events detected within each horizon,
+            NaN without true event.
+    """
+    return _delay_summary(
+        detection_delays(y_true, y_pred), percentiles, horizons
+    )
+
+
+def _delay_summary(delays, percentiles=(), horizons=()):
+    """Statistics of ``detection_delay_scores`` from the event delays."""
+    detected = np.sort(delays[~np.isnan(delays)])
+    if len(detected):
+        mean = float(detected.mean())
+        quantiles = np.percentile(detected, percentiles)
+    else:
+        mean = np.nan
+        quantiles = np.full(len(percentiles), np.nan)
+
+    if len(delays):
+        within = np.searchsorted(detected, horizons, side="right")
+        within = within / len(delays)
+    else:
+        within = np.full(len(horizons), np.nan)
+    return mean, np.asarray(quantiles, dtype=float), within
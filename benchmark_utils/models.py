@@ -2,10 +2,12 @@ from torch import nn
 from sklearn.preprocessing import MinMaxScaler
 import torch
 import torch.optim as optim
-from torch.utils.data import DataLoader, Dataset
+from torch.utils.data import BatchSampler, DataLoader, Dataset, RandomSampler
 import numpy as np
 from tqdm import tqdm
 
+from benchmark_utils.windowing import RecordingWindows
+
 
 class ARModel(nn.Module):
     """
@@ -190,21 +192,32 @@ class Autoencoder(nn.Module):
         x = x.view(x.size(0), -1)
         return self.encoder(x)
 
-    def _create_sliding_windows(self, X):
-        """Create sliding windows from input data"""
-        if isinstance(X, np.ndarray):
-            X = torch.from_numpy(X).float()
+    @staticmethod
+    def _as_recordings(X):
+        """Data as recordings of shape (n_recordings, n_features, n_samples)
+
+        X of shape (n_samples,) or (n_samples, n_features) is one recording.
+        """
+        if isinstance(X, torch.Tensor):
+            X = X.detach().cpu().numpy()
+        X = np.asarray(X, dtype=np.float32)
 
         # If X is 1D, reshape to 2D
-        if X.dim() == 1:
-            X = X.unsqueeze(1)
+        if X.ndim == 1:
+            X = X[:, None]
+        if X.ndim == 2:
+            X = X.T[None]
+        return X
 
-        windows = []
-        for i in range(len(X) - self.sliding_window + 1):
-            window = X[i:i + self.sliding_window].flatten()
-            windows.append(window)
+    def _create_sliding_windows(self, X):
+        """Create sliding windows from input data
 
-        return torch.stack(windows)
+        Windows never cross two recordings. They are views of X, gathered
+        batch by batch and flattened time first by ``forward``.
+        """
+        return RecordingWindows(
+            self._as_recordings(X), window_size=self.sliding_window
+        )
 
     def fit(
         self,
@@ -218,7 +231,9 @@ class Autoencoder(nn.Module):
         Train the autoencoder on the provided data.
 
         Args:
-            X: Input data tensor or numpy array shape (n_samples, n_features)
+            X: Input data tensor or numpy array shape (n_samples, n_features),
+                or (n_recordings, n_features, n_samples) for recordings
+                windowed separately
             num_epochs: Number of training epochs
             learning_rate: Learning rate for optimizer
             device: Device to train on ('cuda' or 'cpu')
@@ -232,25 +247,18 @@ class Autoencoder(nn.Module):
                 "cuda" if torch.cuda.is_available() else "cpu"
             )
 
-        # Convert to tensor if numpy array
-        if isinstance(X, np.ndarray):
-            X = torch.from_numpy(X).float()
-
-        # Ensure X is 2D
-        if X.dim() == 1:
-            X = X.unsqueeze(1)
-        if X.dim() == 3:
-            # (n_samples, n_timesteps, n_features)
-            X = X.view(-1, 1)
-
         # Create sliding windows
-        windowed_data = self._create_sliding_windows(X)
+        windows = self._create_sliding_windows(X)
 
-        # Create dataset and dataloader
-        # window_size=1 since we already created windows
-        dataset = SlidingWindowDataset(windowed_data, window_size=1)
+        # Each shuffled batch of indices is gathered from the windows at
+        # once, the windows are never all copied.
         dataloader = DataLoader(
-            dataset, batch_size=batch_size, shuffle=True, drop_last=True)
+            windows,
+            sampler=BatchSampler(
+                RandomSampler(windows), batch_size=batch_size, drop_last=True
+            ),
+            batch_size=None,
+        )
 
         self.to(device)
         criterion = nn.MSELoss()
@@ -270,7 +278,7 @@ class Autoencoder(nn.Module):
                 dataloader, desc=f"Epoch {epoch+1}/{num_epochs}", leave=False)
 
             for batch_idx, (data) in enumerate(batch_pbar):
-                data = data.to(device)
+                data = data.to(device).flatten(1)
 
                 # Forward pass
                 output = self(data)
@@ -294,17 +302,19 @@ class Autoencoder(nn.Module):
 
         return losses
 
-    def predict(self, X_test, X_dirty=None, device=None):
+    def predict(self, X_test, X_dirty=None, device=None, batch_size=1024):
         """
         Predict anomaly scores for time series data.
 
         Args:
-            X_test: Test data for reconstruction
+            X_test: Test data for reconstruction, with the shapes of ``fit``
             X_dirty: Original dirty data (if None, uses X_test)
             device: Device to run inference on
+            batch_size: Number of windows reconstructed at once
 
         Returns:
-            Reconstructed data and sets decision_scores_ attribute
+            Reconstruction MAE of each window and sets decision_scores_
+            attribute
         """
         if device is None:
             device = torch.device(
@@ -314,18 +324,18 @@ class Autoencoder(nn.Module):
         self.to(device)
 
         # Create sliding windows for test data
-        if isinstance(X_test, np.ndarray):
-            X_test = torch.from_numpy(X_test).float()
-
-        windowed_test = self._create_sliding_windows(X_test)
-        windowed_test = windowed_test.to(device)
+        windows = self._create_sliding_windows(X_test)
 
+        # Calculate MAE loss, batch by batch
+        test_mae_loss = np.empty(len(windows))
         with torch.no_grad():
-            test_predict = self(windowed_test).cpu().numpy()
-
-        # Calculate MAE loss
-        test_mae_loss = np.mean(
-            np.abs(test_predict - windowed_test.cpu().numpy()), axis=1)
+            for start in range(0, len(windows), batch_size):
+                batch = torch.from_numpy(
+                    windows[start:start + batch_size]
+                ).to(device).flatten(1)
+                test_mae_loss[start:start + len(batch)] = torch.mean(
+                    torch.abs(self(batch) - batch), dim=1
+                ).cpu().numpy()
 
         # Normalize MAE loss
         nor_test_mae_loss = MinMaxScaler().fit_transform(
@@ -333,25 +343,25 @@ class Autoencoder(nn.Module):
 
         # Use X_dirty if provided, otherwise use original X_test
         if X_dirty is None:
-            if isinstance(X_test, torch.Tensor):
-                X_dirty = X_test.cpu().numpy()
-            else:
-                X_dirty = X_test
+            X_dirty = X_test
+        n_recordings, _, n_samples = self._as_recordings(X_dirty).shape
 
-        # Initialize score array
-        score = np.zeros(len(X_dirty))
+        # Initialize score array, one row per recording
+        score = np.zeros((n_recordings, n_samples))
+        nor_test_mae_loss = nor_test_mae_loss.reshape(n_recordings, -1)
+        n_windows = nor_test_mae_loss.shape[1]
 
         # Fill the score array with sliding window approach
-        score[self.sliding_window // 2:self.sliding_window //
-              2 + len(test_mae_loss)] = nor_test_mae_loss
-        score[:self.sliding_window // 2] = nor_test_mae_loss[0]
-        score[self.sliding_window // 2 +
-              len(test_mae_loss):] = nor_test_mae_loss[-1]
+        score[:, self.sliding_window // 2:self.sliding_window //
+              2 + n_windows] = nor_test_mae_loss
+        score[:, :self.sliding_window // 2] = nor_test_mae_loss[:, :1]
+        score[:, self.sliding_window // 2 +
+              n_windows:] = nor_test_mae_loss[:, -1:]
 
-        # Store decision scores
-        self.decision_scores_ = score
+        # Store decision scores, recording after recording
+        self.decision_scores_ = score.reshape(-1)
 
-        return test_predict
+        return test_mae_loss
 
     def encode_data(self, x, device=None):
         """
@@ -0,0 +1,193 @@
+"""Overlap-add of sliding windows back into the signal they cover.
+
+Window ``i`` covers positions ``i * stride`` to ``i * stride + window_size``
+of the signal. Instead of scattering every window value with ``np.add.at``,
+the windows are added with strided slices: for each offset ``j`` in the
+window, the ``j``-th values of all the windows land on distinct positions
+``j, j + stride, ...``, so one vectorised ``+=`` adds them. When there are
+fewer windows than offsets, whole windows are added one by one instead.
+Either way there are at most ``min(n_windows, window_size)`` NumPy
+operations, and no index map is built.
+
+``WindowReconstructor`` applies the same overlap-add to windows produced
+batch by batch, e.g. by a model during inference, without keeping them.
+"""
+import numpy as np
+
+
+def _n_times(n_windows, window_size, stride):
+    if n_windows == 0:
+        return 0
+    return (n_windows - 1) * stride + window_size
+
+
+def overlap_add(windows, stride=1, weights=None, out=None, dtype=None):
+    """Sum overlapping windows into a signal.
+
+    Parameters
+    ----------
+    windows : np.ndarray
+        Windows of shape (..., n_windows, window_size, n_features), leading
+        dimensions being reconstructed independently.
+    stride : int, default=1
+        Stride between consecutive windows.
+    weights : np.ndarray, optional
+        Weight of each position of a window, of shape (window_size,).
+    out : np.ndarray, optional
+        Signal of shape (..., n_times, n_features) the windows are added to,
+        in place, with ``n_times = (n_windows - 1) * stride + window_size``.
+    dtype : dtype, optional
+        Type of the signal when ``out`` is not given, the type of the
+        windows promoted to at least float32 by default.
+
+    Returns
+    -------
+    out : np.ndarray
+        Signal of shape (..., n_times, n_features).
+    """
+    windows = np.asarray(windows)
+    *lead, n_windows, window_size, n_features = windows.shape
+    shape = (*lead, _n_times(n_windows, window_size, stride), n_features)
+    if out is None:
+        if dtype is None:
+            dtype = np.result_type(windows.dtype, np.float32)
+        out = np.zeros(shape, dtype=dtype)
+    elif out.shape != shape:
+        raise ValueError(
+            f"Windows of shape {windows.shape} with stride {stride} "
+            f"cover a signal of shape {shape}, got out of shape {out.shape}."
+        )
+    if weights is not None:
+        weights = np.asarray(weights).reshape(window_size, 1)
+
+    if n_windows <= window_size:
+        for i in range(n_windows):
+            window = windows[..., i, :, :]
+            if weights is not None:
+                window = window * weights
+            out[..., i * stride:i * stride + window_size, :] += window
+    else:
+        span = (n_windows - 1) * stride + 1
+        for j in range(window_size):
+            values = windows[..., :, j, :]
+            if weights is not None:
+                values = values * weights[j]
+            out[..., j:j + span:stride, :] += values
+    return out
+
+
+def overlap_counts(n_windows, window_size, stride=1, weights=None):
+    """Total weight of the windows covering each position of the signal.
+
+    Returns an array of shape (n_times,), the number of windows covering
+    each position when ``weights`` is None.
+    """
+    counts = np.zeros(_n_times(n_windows, window_size, stride))
+    if n_windows == 0:
+        return counts
+    if weights is None:
+        weights = np.ones(window_size)
+    span = (n_windows - 1) * stride + 1
+    for j, weight in enumerate(np.asarray(weights).reshape(-1)):
+        counts[j:j + span:stride] += weight
+    return counts
+
+
+def overlap_mean(windows, stride=1, weights=None, out=None, dtype=None,
+                 fill_value=0.0):
+    """Weighted mean of the overlapping windows at each position.
+
+    Takes the parameters of ``overlap_add``, except that ``out`` is
+    overwritten instead of accumulated into. Positions covered by no window,
+    when ``stride > window_size``, are set to ``fill_value``.
+    """
+    if out is not None:
+        out[...] = 0
+    total = overlap_add(windows, stride, weights, out=out, dtype=dtype)
+    n_windows, window_size = np.shape(windows)[-3:-1]
+    counts = overlap_counts(n_windows, window_size, stride, weights)
+
+    covered = counts > 0
+    np.divide(total, counts[:, None], out=total, where=covered[:, None])
+    if not covered.all():
+        total[..., ~covered, :] = fill_value
+    return total
+
+
+class WindowReconstructor:
+    """Overlap-add of windows arriving in consecutive batches.
+
+    Windows are received in the order of ``make_windows``: all the windows
+    of the first signal, then of the second one, and so on, a batch possibly
+    spanning several signals. Each batch is added to the signal buffer as
+    soon as it arrives, so only one batch of windows is ever held besides
+    the output.
+
+    Parameters
+    ----------
+    n_signals : int
+        Number of signals the windows were cut from.
+    n_windows : int
+        Number of windows of each signal.
+    window_size : int
+        Size of the windows.
+    n_features : int
+        Number of features of the windows.
+    stride : int, default=1
+        Stride between consecutive windows.
+    weights : np.ndarray, optional
+        Weight of each position of a window, of shape (window_size,).
+    dtype : dtype, default=np.float32
+        Type of the signal buffer.
+    """
+
+    def __init__(self, n_signals, n_windows, window_size, n_features,
+                 stride=1, weights=None, dtype=np.float32):
+        self.n_windows = n_windows
+        self.window_size = window_size
+        self.stride = stride
+        self.weights = weights
+        self.total = np.zeros(
+            (n_signals, _n_times(n_windows, window_size, stride),
+             n_features),
+            dtype=dtype,
+        )
+        self.n_seen = 0
+
+    def update(self, windows):
+        """Add the next windows, of shape (n, window_size, n_features)."""
+        windows = np.asarray(windows)
+        if self.n_seen + len(windows) > len(self.total) * self.n_windows:
+            raise ValueError("Received more windows than expected.")
+        start = 0
+        while start < len(windows):
+            signal, first = divmod(self.n_seen, self.n_windows)
+            stop = min(len(windows), start + self.n_windows - first)
+            offset = first * self.stride
+            n_times = _n_times(stop - start, self.window_size, self.stride)
+            overlap_add(
+                windows[start:stop], self.stride, self.weights,
+                out=self.total[signal, offset:offset + n_times],
+            )
+            self.n_seen += stop - start
+            start = stop
+
+    def finalize(self, fill_value=np.nan):
+        """Return the mean signal, of shape (n_signals, n_times, n_features).
+
+        Positions covered by no window are set to ``fill_value``.
+        """
+        if self.n_seen != len(self.total) * self.n_windows:
+            raise ValueError(
+                f"Received {self.n_seen} windows out of "
+                f"{len(self.total) * self.n_windows}."
+            )
+        counts = overlap_counts(
+            self.n_windows, self.window_size, self.stride, self.weights
+        )
+        covered = counts > 0
+        np.divide(self.total, counts[:, None], out=self.total,
+                  where=covered[:, None])
+        if not covered.all():
+            self.total[:, ~covered] = fill_value
+        return self.total
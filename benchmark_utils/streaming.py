@@ -0,0 +1,372 @@
+"""Prediction metrics accumulated over chunks of a long recording.
+
+Each accumulator receives consecutive, aligned chunks of ``y_true`` and
+``y_pred`` through ``update`` and carries the state crossing chunk
+boundaries: open anomaly segments, the neighbourhood of the last positions
+for the soft metrics, or the predictions still waiting for their closest
+anomaly for CTT/TTC. ``finalize`` then returns the same values as the batch
+functions of ``benchmark_utils.metrics`` on the concatenated chunks.
+
+Memory does not depend on the length of the recording: it is bounded by
+the chunk size, the largest detection range, the number of ranges
+overlapping a single open range (kept by the range metrics) and the number
+of prediction runs between two consecutive targets (kept by CTT/TTC).
+
+The accumulators are a library for scripts evaluating outputs too long to
+hold in memory; the objective evaluates whole arrays and does not use them.
+"""
+import numpy as np
+
+from benchmark_utils.metrics import (
+    _as_range_bounds,
+    _distance_to_nearest,
+    _nearest_signed_distances,
+    _range_overlap_rewards,
+    _soft_from_counts,
+)
+
+
+def _as_chunk(y_true, y_pred):
+    true_mask = np.asarray(y_true).reshape(-1) == 1
+    pred_mask = np.asarray(y_pred).reshape(-1) == 1
+    if len(true_mask) != len(pred_mask):
+        raise ValueError("y_true and y_pred chunks must have the same length.")
+    return true_mask, pred_mask
+
+
+def _segments(mask, offset):
+    """Start and end (inclusive) positions of the runs of ``mask``."""
+    diff = np.diff(np.concatenate(([0], mask.astype(np.int8), [0])))
+    starts = np.flatnonzero(diff == 1)
+    ends = np.flatnonzero(diff == -1) - 1
+    return starts + offset, ends + offset
+
+
+class ConfusionAccumulator:
+    """Point-wise precision, recall, F1 and zero-one loss."""
+
+    def __init__(self):
+        self.tp = self.fp = self.fn = self.tn = 0
+
+    def update(self, y_true, y_pred):
+        true_mask, pred_mask = _as_chunk(y_true, y_pred)
+        tp = int(np.count_nonzero(true_mask & pred_mask))
+        fp = int(np.count_nonzero(pred_mask)) - tp
+        fn = int(np.count_nonzero(true_mask)) - tp
+        self.tp += tp
+        self.fp += fp
+        self.fn += fn
+        self.tn += len(true_mask) - tp - fp - fn
+
+    def finalize(self):
+        """Return the metrics with the ``zero_division=0`` convention."""
+        tp, fp, fn, tn = self.tp, self.fp, self.fn, self.tn
+        n = tp + fp + fn + tn
+        return dict(
+            precision=tp / (tp + fp) if tp + fp else 0.0,
+            recall=tp / (tp + fn) if tp + fn else 0.0,
+            f1=2 * tp / (2 * tp + fp + fn) if tp else 0.0,
+            zoloss=1 - (tp + tn) / n if n else np.nan,
+        )
+
+
+class SoftAccumulator:
+    """Soft precision, recall and F1 for several detection ranges.
+
+    Only distances up to the largest range matter, so each chunk is
+    evaluated with the last ``max(detection_ranges)`` positions of the
+    previous chunks as context, and its last positions wait for the next
+    chunk before being counted.
+
+    Parameters
+    ----------
+        detection_ranges : sequence of int, default=(1, 3, 5, 10, 20)
+            Ranges in which an anomaly is considered correctly detected
+    """
+
+    def __init__(self, detection_ranges=(1, 3, 5, 10, 20)):
+        self.detection_ranges = tuple(detection_ranges)
+        self.radii = np.maximum(
+            np.asarray(self.detection_ranges, dtype=np.int64), 0
+        )
+        self.margin = int(self.radii.max(initial=0))
+        self.true_buffer = np.zeros(0, dtype=bool)
+        self.pred_buffer = np.zeros(0, dtype=bool)
+        # Leading buffer positions that were already counted.
+        self.n_context = 0
+        self.n_true = 0
+        self.hits = np.zeros(len(self.radii), dtype=np.int64)
+        self.false_alarms = np.zeros(len(self.radii), dtype=np.int64)
+
+    def update(self, y_true, y_pred):
+        true_mask, pred_mask = _as_chunk(y_true, y_pred)
+        self.true_buffer = np.concatenate((self.true_buffer, true_mask))
+        self.pred_buffer = np.concatenate((self.pred_buffer, pred_mask))
+
+        # Positions with their whole neighbourhood in the buffer.
+        stop = max(self.n_context, len(self.true_buffer) - self.margin)
+        self._count(self.n_context, stop)
+
+        keep = max(0, stop - self.margin)
+        self.true_buffer = self.true_buffer[keep:]
+        self.pred_buffer = self.pred_buffer[keep:]
+        self.n_context = stop - keep
+
+    def _count(self, start, stop):
+        if start == stop:
+            return
+        true_mask = self.true_buffer[start:stop]
+        pred_mask = self.pred_buffer[start:stop]
+        to_pred = _distance_to_nearest(self.pred_buffer)[start:stop]
+        to_true = _distance_to_nearest(self.true_buffer)[start:stop]
+
+        true_to_pred = np.sort(to_pred[true_mask])
+        pred_to_true = np.sort(to_true[pred_mask])
+        self.n_true += len(true_to_pred)
+        self.hits += np.searchsorted(true_to_pred, self.radii, side="right")
+        self.false_alarms += len(pred_to_true) - np.searchsorted(
+            pred_to_true, self.radii, side="right"
+        )
+
+    def finalize(self):
+        """Return ``(precision, recall, f1)`` as ``soft_scores`` does."""
+        self._count(self.n_context, len(self.true_buffer))
+        self.n_context = len(self.true_buffer)
+
+        return _soft_from_counts(self.hits, self.false_alarms, self.n_true)
+
+
+class _NearestDistanceSum:
+    """Sum of the distances from query positions to their closest target.
+
+    Queries after the last target seen so far wait, as runs of positions,
+    for the next target to know on which side their closest target is.
+    """
+
+    def __init__(self, return_signed=False):
+        self.return_signed = return_signed
+        self.last_target = None
+        self.pending_starts = []
+        self.pending_ends = []
+        self.total = 0
+        self.n_targets = 0
+        self.n_queries = 0
+
+    def update(self, targets, queries, offset):
+        """Add a chunk given by its target and query masks."""
+        target_positions = np.flatnonzero(targets) + offset
+        query_positions = np.flatnonzero(queries) + offset
+        self.n_targets += len(target_positions)
+        self.n_queries += len(query_positions)
+
+        if len(target_positions) == 0:
+            self._add_pending(queries, offset)
+            return
+
+        # Pending queries lie between the last target and the first one of
+        # this chunk.
+        self._resolve_pending(target_positions[0])
+
+        last = target_positions[-1]
+        resolved = query_positions[query_positions <= last]
+        if len(resolved):
+            known = target_positions
+            if self.last_target is not None:
+                known = np.r_[self.last_target, target_positions]
+            dists = _nearest_signed_distances(known, resolved)
+            if not self.return_signed:
+                dists = np.abs(dists)
+            self.total += int(dists.sum())
+
+        self.last_target = int(last)
+        self._add_pending(queries[last - offset + 1:], last + 1)
+
+    def _add_pending(self, queries, offset):
+        starts, ends = _segments(queries, offset)
+        self.pending_starts.append(starts)
+        self.pending_ends.append(ends)
+
+    def _resolve_pending(self, next_target):
+        starts = np.concatenate([np.zeros(0, np.int64)] + self.pending_starts)
+        ends = np.concatenate([np.zeros(0, np.int64)] + self.pending_ends)
+        self.pending_starts, self.pending_ends = [], []
+        if len(starts) == 0:
+            return
+
+        left = self.last_target
+        # On ties the earlier target wins, as in the batch metrics.
+        if left is None:
+            split = starts - 1
+        elif next_target is None:
+            split = ends
+        else:
+            split = np.clip((left + next_target) // 2, starts - 1, ends)
+
+        # Runs [starts, split] go to the left target, the rest to the right.
+        if left is not None:
+            count, total = _run_sums(starts, split)
+            self.total += self._distances(left * count - total)
+        if next_target is not None:
+            count, total = _run_sums(split + 1, ends)
+            self.total += self._distances(next_target * count - total)
+
+    def _distances(self, signed_total):
+        # Offsets are all negative on the left and positive on the right.
+        return signed_total if self.return_signed else abs(signed_total)
+
+    def finalize(self):
+        self._resolve_pending(None)
+        return self.total
+
+
+def _run_sums(starts, ends):
+    """Number and sum of the integers in the runs ``[starts, ends]``."""
+    count = np.maximum(ends - starts + 1, 0)
+    return int(count.sum()), int(((starts + ends) * count).sum() // 2)
+
+
+class DistanceAccumulator:
+    """CTT (candidate to target) and TTC (target to candidate) distances.
+
+    Parameters
+    ----------
+        return_signed : bool, default=False
+            If True, accumulate signed distances instead of absolute ones.
+    """
+
+    def __init__(self, return_signed=False):
+        self.ctt = _NearestDistanceSum(return_signed)
+        self.ttc = _NearestDistanceSum(return_signed)
+        self.offset = 0
+
+    def update(self, y_true, y_pred):
+        true_mask, pred_mask = _as_chunk(y_true, y_pred)
+        self.ctt.update(true_mask, pred_mask, self.offset)
+        self.ttc.update(pred_mask, true_mask, self.offset)
+        self.offset += len(true_mask)
+
+    def finalize(self):
+        """Return ``(ctt, ttc)`` as the ``ctt`` and ``ttc`` functions do."""
+        n_true, n_pred = self.ctt.n_targets, self.ctt.n_queries
+        if n_true == 0:
+            ctt_value = float('inf')
+        elif n_pred == 0:
+            ctt_value = 0
+        else:
+            ctt_value = self.ctt.finalize() / n_pred
+
+        if n_pred == 0:
+            ttc_value = float('inf')
+        elif n_true == 0:
+            ttc_value = 0
+        else:
+            ttc_value = self.ttc.finalize() / n_true
+        return ctt_value, ttc_value
+
+
+class RangeAccumulator:
+    """Range-based precision, recall and F1 of Tatbul et al.
+
+    Anomaly segments are collected as chunks arrive, a segment still open
+    at the end of a chunk being continued by the next one. Once a segment
+    is closed, every range of the other kind it overlaps is known, so its
+    term of ``recall_t`` or ``precision_t`` is added to a running sum. Only
+    the segments still open and the closed ones of the other kind they
+    overlap are kept, so memory is O(number of ranges overlapping a single
+    open range), not O(number of ranges).
+
+    Parameters
+    ----------
+        alpha : float, default=0.5
+            The weight to assign to the existence reward.
+        bias_type : str, default='flat'
+            The type of positional bias ('flat', 'front', 'back', 'middle').
+    """
+
+    def __init__(self, alpha=0.5, bias_type='flat'):
+        self.alpha = alpha
+        self.bias_type = bias_type
+        # Kept segments, of which the first ``n_*_closed`` are already
+        # summed and only kept as context of the open segments.
+        self.real_ranges = []
+        self.predicted_ranges = []
+        self.n_real_closed = self.n_predicted_closed = 0
+        self.n_real = self.n_predicted = 0
+        self.recall_sum = self.precision_sum = 0.0
+        self.offset = 0
+
+    def update(self, y_true, y_pred):
+        true_mask, pred_mask = _as_chunk(y_true, y_pred)
+        self._extend(self.real_ranges, true_mask)
+        self._extend(self.predicted_ranges, pred_mask)
+        self.offset += len(true_mask)
+        # Segments reaching the last position may go on in the next chunk.
+        self._close(self.offset - 1)
+
+    def _extend(self, ranges, mask):
+        starts, ends = _segments(mask, self.offset)
+        segments = list(zip(starts.tolist(), ends.tolist()))
+        # Join a segment crossing the boundary with the previous chunk.
+        if segments and ranges and ranges[-1][1] == self.offset - 1 \
+                and segments[0][0] == self.offset:
+            ranges[-1] = (ranges[-1][0], segments.pop(0)[1])
+        ranges.extend(segments)
+
+    def _close(self, stop):
+        """Sum the terms of the open segments ending before ``stop``."""
+        real = [r for r in self.real_ranges[self.n_real_closed:]
+                if r[1] < stop]
+        predicted = [r for r in self.predicted_ranges[self.n_predicted_closed:]
+                     if r[1] < stop]
+
+        # Terms are added left to right, as ``recall_t`` and
+        # ``precision_t`` average them.
+        if real:
+            existence, overlap = _range_overlap_rewards(
+                *_as_range_bounds(real),
+                *_as_range_bounds(self.predicted_ranges), self.bias_type,
+            )
+            for term in (self.alpha * existence
+                         + (1 - self.alpha) * overlap).tolist():
+                self.recall_sum += term
+        if predicted:
+            _, overlap = _range_overlap_rewards(
+                *_as_range_bounds(predicted),
+                *_as_range_bounds(self.real_ranges), self.bias_type,
+            )
+            for term in overlap.tolist():
+                self.precision_sum += term
+        self.n_real += len(real)
+        self.n_predicted += len(predicted)
+        self.n_real_closed += len(real)
+        self.n_predicted_closed += len(predicted)
+
+        # Later segments start after ``stop``, so closed segments are only
+        # needed while they overlap a segment still open.
+        self.real_ranges, self.n_real_closed = _drop_closed(
+            self.real_ranges, self.n_real_closed,
+            self.predicted_ranges[self.n_predicted_closed:],
+        )
+        self.predicted_ranges, self.n_predicted_closed = _drop_closed(
+            self.predicted_ranges, self.n_predicted_closed,
+            self.real_ranges[self.n_real_closed:],
+        )
+
+    def finalize(self):
+        """Return ``(precision_t, recall_t, f1_t)``."""
+        self._close(self.offset)
+        recall = self.recall_sum / self.n_real if self.n_real else 0
+        precision = (self.precision_sum / self.n_predicted
+                     if self.n_predicted else 0)
+        if recall + precision == 0:
+            return precision, recall, 0
+        return precision, recall, 2 * (recall*precision)/(recall+precision)
+
+
+def _drop_closed(ranges, n_closed, open_ranges):
+    """Drop the closed ranges no open range of the other kind overlaps."""
+    if not open_ranges:
+        return ranges[n_closed:], 0
+    first = open_ranges[0][0]
+    kept = [r for r in ranges[:n_closed] if r[1] >= first]
+    return kept + ranges[n_closed:], len(kept)
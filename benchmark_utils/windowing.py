@@ -1,31 +1,84 @@
+import hashlib
+import operator
+
 import numpy as np
 import torch
-from torch.utils.data import TensorDataset
+from torch.utils.data import Dataset, TensorDataset
+
+from benchmark_utils.overlap import overlap_mean
+
+
+# Periods already estimated, keyed by a fingerprint of the data: solvers
+# call find_period_length on the same X_train in skip and set_objective.
+_PERIOD_CACHE = {}
+_PERIOD_CACHE_SIZE = 64
 
 
-def find_period_length(data, default=125):
+def find_period_length(data, default=125, max_samples=20_000):
     """Estimate a reasonable period length from autocorrelation.
 
     This local helper replaces the small ``TSB_AD`` utility previously used by
     several solvers, avoiding a heavy optional dependency for solvers that only
     need automatic window sizing.
+
+    The autocorrelation is computed with an FFT, in O(n log n). For several
+    channels or recordings, the autocorrelation of each series is normalised
+    by its energy and they are averaged, which amounts to averaging their
+    periodograms. Recordings are never concatenated. Results are cached by
+    a fingerprint of the data.
+
+    Parameters
+    ----------
+    data : np.ndarray
+        Series of shape (n_samples,), (n_features, n_samples) or
+        (n_recordings, n_features, n_samples).
+    default : int, default=125
+        Period returned when no autocorrelation peak is found.
+    max_samples : int or None, default=20_000
+        Number of leading samples of each series used, None for all.
+
+    Returns
+    -------
+    period : int
+        Lag of the highest local maximum of the autocorrelation, between 3
+        and 300, ``default`` if there is none, and 0 for series shorter
+        than 6 samples.
     """
-    data = np.asarray(data)
-    if data.ndim > 1:
+    data = np.asarray(data, dtype=float)
+    if data.size == 0:
         return 0
-
-    data = data[: min(20_000, len(data))]
-    if len(data) < 6:
+    series = data.reshape(-1, data.shape[-1])[:, :max_samples]
+    series = np.ascontiguousarray(series)
+    key = (series.shape, default,
+           hashlib.blake2b(series, digest_size=16).hexdigest())
+    if key not in _PERIOD_CACHE:
+        if len(_PERIOD_CACHE) >= _PERIOD_CACHE_SIZE:
+            del _PERIOD_CACHE[next(iter(_PERIOD_CACHE))]
+        _PERIOD_CACHE[key] = _find_period_length(series, default)
+    return _PERIOD_CACHE[key]
+
+
+def _find_period_length(series, default):
+    n_samples = series.shape[1]
+    if n_samples < 6:
         return 0
 
-    centered = data - data.mean()
-    norm = np.dot(centered, centered)
-    if norm == 0:
+    centered = series - series.mean(axis=1, keepdims=True)
+    norm = np.einsum("ij,ij->i", centered, centered)
+    keep = norm > 0
+    if not keep.any():
         return default
-
-    max_lag = min(400, len(centered) - 1)
-    autocorr = np.correlate(centered, centered, mode="full")
-    autocorr = autocorr[len(centered) - 1: len(centered) + max_lag] / norm
+    centered, norm = centered[keep], norm[keep]
+
+    # Zero-padding to n_samples + max_lag keeps the circular correlation
+    # exact up to max_lag.
+    max_lag = min(400, n_samples - 1)
+    n_fft = 1 << (n_samples + max_lag - 1).bit_length()
+    spectrum = np.fft.rfft(centered, n_fft, axis=1)
+    power = np.mean(
+        (spectrum.real ** 2 + spectrum.imag ** 2) / norm[:, None], axis=0
+    )
+    autocorr = np.fft.irfft(power, n_fft)[:max_lag + 1]
 
     base = 3
     values = autocorr[base:]
@@ -78,9 +131,189 @@ def make_windows(X, window_size=32, stride=1, padding=False):
     ).transpose(0, 2, 1)
 
 
+class RecordingWindows:
+    """Sliding windows of several recordings, never crossing recordings.
+
+    The windows of each recording are a zero-copy strided view of it, in
+    the ``(window_size, n_features)`` layout of ``make_windows``. Windows
+    are numbered recording after recording, and ``index`` maps each one
+    back to its recording and start time. Slices of consecutive windows
+    pack windows of several short recordings into one batch.
+
+    Parameters
+    ----------
+    X : np.ndarray or sequence of np.ndarray
+        Recordings of shape (n_recordings, n_features, n_samples), or a
+        sequence of arrays of shape (n_features, n_samples_i) for
+        recordings of different lengths.
+    window_size : int
+        Size of the sliding window.
+    stride : int
+        Stride of the sliding window.
+
+    Attributes
+    ----------
+    index : np.ndarray of shape (n_windows, 2)
+        Recording and start time of each window.
+    offsets : np.ndarray of shape (n_recordings + 1,)
+        Number of the first window of each recording, followed by the
+        total number of windows.
+    """
+
+    def __init__(self, X, window_size=32, stride=1):
+        self.window_size = window_size
+        self.stride = stride
+        self.views = []
+        for recording in X:
+            recording = np.asarray(recording)
+            n_features, n_samples = recording.shape
+            if n_samples < window_size:
+                self.views.append(
+                    np.empty((0, window_size, n_features), recording.dtype)
+                )
+                continue
+            self.views.append(np.lib.stride_tricks.sliding_window_view(
+                recording, window_shape=window_size, axis=-1
+            )[:, ::stride].transpose(1, 2, 0))
+
+        counts = [len(view) for view in self.views]
+        self.offsets = np.r_[0, np.cumsum(counts, dtype=np.int64)]
+        recordings = np.repeat(np.arange(len(counts)), counts)
+        starts = (np.arange(self.offsets[-1]) - self.offsets[recordings])
+        self.index = np.column_stack((recordings, starts * stride))
+
+    def __len__(self):
+        return int(self.offsets[-1])
+
+    def __iter__(self):
+        """Yield ``(recording, windows)`` with the view of the windows of
+        each recording, of shape (n_windows_i, window_size, n_features).
+        """
+        return iter(enumerate(self.views))
+
+    def __getitem__(self, key):
+        """Window ``key`` as a view, or the windows of a slice or of an
+        array of indices gathered into one array.
+        """
+        if isinstance(key, (list, np.ndarray)):
+            return self.take(key)
+        if not isinstance(key, slice):
+            key = operator.index(key)
+            if key < 0:
+                key += len(self)
+            if not 0 <= key < len(self):
+                raise IndexError(
+                    f"Window index out of range for {len(self)} windows."
+                )
+            recording = int(self.index[key, 0])
+            return self.views[recording][key - self.offsets[recording]]
+
+        start, stop, step = key.indices(len(self))
+        if step != 1:
+            raise ValueError("Only slices with a unit step are supported.")
+        first = np.searchsorted(self.offsets, start, side="right") - 1
+        last = np.searchsorted(self.offsets, stop, side="left")
+        parts = [
+            self.views[r][max(start, self.offsets[r]) - self.offsets[r]:
+                          min(stop, self.offsets[r + 1]) - self.offsets[r]]
+            for r in range(max(first, 0), last)
+        ]
+        if not parts:
+            return np.empty((0, self.window_size) + self.views[0].shape[2:])
+        return np.concatenate(parts)
+
+    def take(self, indices):
+        """Windows at ``indices``, of shape (n, window_size, n_features).
+
+        Windows are gathered with one fancy indexing per recording, so a
+        shuffled batch costs as many copies as recordings it draws from.
+        """
+        indices = np.asarray(indices, dtype=np.int64).reshape(-1)
+        indices = np.where(indices < 0, indices + len(self), indices)
+        if len(indices) and not (
+                0 <= indices.min() and indices.max() < len(self)):
+            raise IndexError(
+                f"Window index out of range for {len(self)} windows."
+            )
+        view = self.views[0]
+        windows = np.empty((len(indices),) + view.shape[1:], view.dtype)
+        recordings = self.index[indices, 0]
+        for recording in np.unique(recordings):
+            selected = recordings == recording
+            windows[selected] = self.views[recording][
+                indices[selected] - self.offsets[recording]
+            ]
+        return windows
+
+    def batches(self, batch_size):
+        """Yield batches of consecutive windows with their ``index`` rows.
+
+        A batch gathers windows from as many recordings as needed, so short
+        recordings do not give small batches.
+        """
+        for start in range(0, len(self), batch_size):
+            stop = start + batch_size
+            yield self[start:stop], self.index[start:stop]
+
+
+def stack_recordings(X):
+    """Concatenate recordings along time, for models taking one series.
+
+    Recordings of shape (n_recordings, n_features, n_samples) become one
+    series of shape (n_recordings * n_samples, n_features), whose rows
+    follow the flattened labels. Windows taken by the model on this series
+    can cross recordings; use ``RecordingWindows`` when windowing here.
+    """
+    X = np.asarray(X)
+    return X.transpose(0, 2, 1).reshape(-1, X.shape[1])
+
+
+class WindowDataset(Dataset):
+    """Sliding windows of a series, gathered on demand.
+
+    The series is stored once as a float32 tensor, shared with ``X`` when
+    it already is a float32 array, and each item is a strided view of one
+    window. Memory stays O(n_samples * n_features * n_times) whatever the
+    window size and stride, and only the DataLoader batches are copied.
+    Items are ordered as the windows of ``make_windows``.
+
+    Parameters
+    ----------
+    X : np.ndarray
+        Input data of shape (n_samples, n_features, n_times).
+    y : np.ndarray, optional
+        Target data of shape (n_samples, n_times).
+    window_size : int
+        Size of the sliding window.
+    stride : int
+        Stride of the sliding window.
+    """
+
+    def __init__(self, X, y=None, window_size=32, stride=1):
+        X = torch.as_tensor(np.asarray(X), dtype=torch.float32)
+        # (n_samples, n_features, n_windows, window_size) view.
+        self.windows = X.unfold(2, window_size, stride)
+        self.n_windows = self.windows.shape[2]
+        self.y_windows = None
+        if y is not None:
+            y = torch.as_tensor(np.asarray(y), dtype=torch.float32)
+            self.y_windows = y.unfold(-1, window_size, stride)
+
+    def __len__(self):
+        return self.windows.shape[0] * self.n_windows
+
+    def __getitem__(self, index):
+        sample, window = divmod(index, self.n_windows)
+        # (window_size, n_features) view.
+        x = self.windows[sample, :, window].T
+        if self.y_windows is None:
+            return (x,)
+        return x, self.y_windows[sample, window]
+
+
 def make_windowed_dataset(X, y=None, window_size=32, stride=1):
     """
-    Create a DataLoader with windowed views of the data.
+    Create a Dataset with windowed views of the data.
 
     Parameters
     ----------
@@ -97,29 +330,21 @@ def make_windowed_dataset(X, y=None, window_size=32, stride=1):
     -------
     Dataset
         A PyTorch Dataset with windowed data in shape:
-        (n_eff_samples, window_size, n_features)
+        (n_eff_samples, window_size, n_features). Windows are not
+        materialised, see ``WindowDataset``.
     """
 
     if window_size is not None:
-        X = make_windows(X, window_size, stride)
+        return WindowDataset(X, y, window_size=window_size, stride=stride)
 
     X_tensor = torch.tensor(X, dtype=torch.float32)
-
     if y is not None:
-        if window_size is not None:
-            y = np.lib.stride_tricks.sliding_window_view(
-                y, window_shape=window_size, axis=-1
-            )[..., ::stride, :].reshape(-1, window_size)
+        return TensorDataset(X_tensor, torch.tensor(y, dtype=torch.float32))
+    return TensorDataset(X_tensor)
 
-        y_tensor = torch.tensor(y, dtype=torch.float32)
-        dataset = TensorDataset(X_tensor, y_tensor)
-    else:
-        dataset = TensorDataset(X_tensor)
 
-    return dataset
-
-
-def reconstruct_from_windows(windows, stride, batch, n_features):
+def reconstruct_from_windows(windows, stride, batch, n_features,
+                             dtype=float):
     """Reconstruct the original signal from overlapping windows
 
     Parameters
@@ -132,25 +357,17 @@ def reconstruct_from_windows(windows, stride, batch, n_features):
         The batch size used when creating the windows
     n_features : int
         The number of features in the original signal
+    dtype : dtype, default=float
+        The type of the reconstruction, e.g. float32 to halve its memory
+
+    Returns
+    -------
+    signal : np.ndarray
+        The mean of the windows covering each position, of shape
+        (batch, n_features, n_times). Positions covered by no window are NaN.
     """
-    # windows: (batch*n_windows, window_size, n_features)
     w = windows.shape[1]
     windows = windows.reshape(batch, -1, w, n_features)
-    b, nw, ws, nf = windows.shape
-    nt = (nw - 1) * stride + ws
-
-    # allocate accumulator + counts for correct overlap averaging
-    acc = np.zeros((b, nf, nt))
-    cnt = np.zeros((nt,), dtype=int)
-
-    # build index map for overlap positions
-    idx = np.arange(ws)[:, None] + stride * np.arange(nw)
-
-    # add windows efficiently
-    np.add.at(acc, (slice(None), slice(None), idx.ravel()),
-              windows.transpose(0, 3, 1, 2).reshape(b, nf, -1))
-
-    # count contributions
-    np.add.at(cnt, idx.ravel(), 1)
-
-    return acc / cnt
+    return overlap_mean(
+        windows, stride, dtype=dtype, fill_value=np.nan
+    ).transpose(0, 2, 1)
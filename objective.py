@@ -1,25 +1,9 @@
 from benchopt import BaseObjective
-from benchmark_utils.metrics import (
-    soft_precision as soft_precision_score,
-    soft_recall as soft_recall_score,
-    soft_f1 as soft_f1_score,
-    ctt,
-    ttc,
-    extract_anomaly_ranges,
-    precision_t as precision_t_score,
-    recall_t as recall_t_score,
-    f1_t as f1_t_score,
-)
+from benchmark_utils.bootstrap import block_bootstrap, confidence_interval
+from benchmark_utils.evaluation import MetricPlan
+from benchmark_utils.metrics import AnomalyRanges, LabelIndex
 
 import numpy as np
-from sklearn.metrics import (
-    average_precision_score,
-    precision_score,
-    recall_score,
-    f1_score,
-    zero_one_loss,
-    roc_auc_score,
-)
 
 
 class Objective(BaseObjective):
@@ -31,9 +15,47 @@ class Objective(BaseObjective):
     parameters = {
         "score_metrics": [("auc_pr", "auc_roc")],
         "prediction_metrics": [None],
+        # Report the time and peak memory of each metric and of each
+        # intermediate result shared by metrics (sorts, ranges, ...).
+        "profile_metrics": [False],
+        # Threads used to compute independent metrics, -1 for all cores.
+        "n_jobs": [1],
+        # Evaluate each recording of (n_recordings, n_samples) test sets
+        # separately and report macro and micro aggregates.
+        "per_recording": [False],
+        # Block-bootstrap resamples for the confidence intervals of auc_pr,
+        # auc_roc, f1 and soft_f1, 0 to disable them.
+        "n_bootstrap": [0],
     }
 
+    all_score_metrics = (
+        "auc_pr",
+        "auc_roc",
+        "best_f1",
+        "best_f1_t",
+        "range_auc_roc",
+        "range_auc_pr",
+        "vus_roc",
+        "vus_pr",
+    )
+    # Buffer length of Range-AUC, also the largest buffer of the VUS surface.
+    vus_buffer = 100
+
+    # Bootstrap blocks default to sqrt(n_samples) positions. The fixed seed
+    # evaluates every solver on the same resamples.
+    bootstrap_block_length = None
+    bootstrap_confidence = 0.95
+    bootstrap_seed = 0
+
     detection_ranges = (1, 3, 5, 10, 20)
+    soft_metrics = ("soft_precision", "soft_recall", "soft_f1")
+    # PA%K metrics requested without K are reported for these values.
+    pa_k_values = (0, 20, 50, 80)
+    pa_metrics = ("pa_precision", "pa_recall", "pa_f1", "best_pa_f1")
+    # Percentiles of the detection delays and delays k of the rates of
+    # events detected within k samples.
+    delay_percentiles = (90,)
+    detection_horizons = (0, 10, 100)
     default_prediction_metrics = (
         "precision",
         "recall",
@@ -43,6 +65,12 @@ class Objective(BaseObjective):
         "f1_t",
         "ctt",
         "ttc",
+        "aff_precision",
+        "aff_recall",
+        "delay_mean",
+        "delay_median",
+        "delay_percentile",
+        "detected_within",
         "zoloss",
         "soft_precision",
         "soft_recall",
@@ -74,6 +102,24 @@ class Objective(BaseObjective):
         self.X_train = X_train
         self.X_test, self.y_test = X_test, y_test
 
+        # Quantities derived from y_test (ranges, distance transforms, ...)
+        # are computed on first use and shared by every evaluate_result
+        # call. ``_aligned_labels`` caches the index of the last subset of
+        # positions selected for the whole series (key None) and for each
+        # recording.
+        self._labels = LabelIndex(y_test)
+        self._aligned_labels = {}
+
+        # Labels of each recording, for per-recording evaluations.
+        if isinstance(y_test, AnomalyRanges):
+            self._recording_labels = [self._labels]
+            return
+        y_test = np.asarray(y_test)
+        n_recordings = y_test.shape[0] if y_test.ndim > 1 else 1
+        self._recording_labels = [
+            LabelIndex(y) for y in y_test.reshape(n_recordings, -1)
+        ]
+
     def evaluate_result(
         self,
         anomaly_scores=None,
@@ -84,6 +130,10 @@ class Objective(BaseObjective):
         anomaly_scores is the score-based solver output.
         anomaly_predictions is optional and only needed when requesting
         prediction-based metrics.
+        Both can be ``np.memmap`` arrays, e.g. written to disk by the solver.
+        They are only copied when NaN or -1 padding has to be dropped.
+        anomaly_predictions can also be ``AnomalyRanges``, which the range,
+        soft and point-wise metrics evaluate without dense labels.
         """
         score_metrics = self._normalize_metrics(
             getattr(self, "score_metrics", ("auc_pr", "auc_roc"))
@@ -98,69 +148,244 @@ class Objective(BaseObjective):
             raise ValueError(
                 "prediction_metrics require an anomaly_predictions array.")
 
-        y_true, scores, predictions = self._align_inputs(
-            anomaly_scores=anomaly_scores,
-            anomaly_predictions=anomaly_predictions,
-        )
-
-        result = {}
-        if score_metrics:
-            result.update(
-                self._compute_score_metrics(
-                    y_true=y_true,
-                    anomaly_scores=scores,
-                    metrics=score_metrics,
-                )
+        plan = self._get_plan(score_metrics, prediction_metrics)
+        if getattr(self, "per_recording", False):
+            result = self._evaluate_recordings(
+                plan, anomaly_scores, anomaly_predictions
             )
-        if prediction_metrics:
-            result.update(
-                self._compute_prediction_metrics(
-                    y_true=y_true,
-                    anomaly_predictions=predictions,
-                    metrics=prediction_metrics,
-                )
+        else:
+            labels, scores, predictions = self._align_inputs(
+                anomaly_scores=anomaly_scores,
+                anomaly_predictions=anomaly_predictions,
             )
+            artifacts = {}
+            result = plan.evaluate(
+                labels, scores, predictions,
+                profile=getattr(self, "profile_metrics", False),
+                n_jobs=getattr(self, "n_jobs", 1),
+                artifacts=artifacts,
+            )
+            result.update(self._bootstrap_intervals(
+                score_metrics + prediction_metrics,
+                labels, scores, predictions,
+                order=artifacts.get("score_order"),
+            ))
 
         # Setting value to 0. The actual value is not used for ranking.
         result["value"] = 0.0
         return result
 
+    def evaluate_score_matrix(self, anomaly_scores):
+        """Evaluate the score metrics of several solver outputs at once.
+
+        Meant to re-score stored outputs offline, e.g. of every point of a
+        solver's parameter grid, without running benchopt again.
+
+        anomaly_scores is an array of shape ``(n_configs, n_samples)`` with
+        one score vector per row, aligned as in ``evaluate_result``. A
+        single 1-D score vector is evaluated as one row. Rows with the same
+        NaN padding are evaluated together by
+        ``MetricPlan.evaluate_batch``.
+        Returns a dict with an array of shape ``(n_configs,)`` per metric.
+        """
+        score_metrics = self._normalize_metrics(
+            getattr(self, "score_metrics", ("auc_pr", "auc_roc"))
+        )
+        plan = self._get_plan(score_metrics, ())
+        scores = np.atleast_2d(anomaly_scores)
+        scores = scores.reshape(len(scores), -1)
+        length = min(len(self._labels), scores.shape[1])
+        scores = scores[:, scores.shape[1] - length:]
+
+        if not np.isnan(np.sum(scores)):
+            return plan.evaluate_batch(
+                self._get_aligned_labels(length, None), scores
+            )
+
+        result = {
+            key: np.full(len(scores), np.nan) for key, _, _ in plan.metrics
+        }
+        groups = {}
+        for i, valid in enumerate(~np.isnan(scores)):
+            groups.setdefault(valid.tobytes(), (valid, []))[1].append(i)
+        for valid, rows in groups.values():
+            if valid.all():
+                valid = None
+            values = plan.evaluate_batch(
+                self._get_aligned_labels(length, valid),
+                scores[rows] if valid is None else scores[rows][:, valid],
+            )
+            for key, value in values.items():
+                result[key][rows] = value
+        return result
+
     def get_objective(self):
         return dict(X_train=self.X_train, X_test=self.X_test)
 
+    def _evaluate_recordings(self, plan, anomaly_scores, anomaly_predictions):
+        """Evaluate each recording separately and aggregate the metrics.
+
+        ``macro_<metric>`` is the mean of the per-recording values, ignoring
+        recordings where the metric is undefined. ``micro_<metric>`` is the
+        metric of all the aligned recordings pooled together, computed from
+        their summed counts and offset ranges, so that no anomaly range,
+        neighbourhood or distance spans two recordings. Metrics that cannot
+        be pooled this way, such as the VUS, only have macro values.
+        """
+        n_recordings = len(self._recording_labels)
+        scores = self._as_recordings(anomaly_scores, n_recordings)
+        predictions = self._as_recordings(anomaly_predictions, n_recordings)
+
+        aligned = []
+        for i, labels in enumerate(self._recording_labels):
+            length, valid, rec_scores, rec_predictions = self._align_arrays(
+                len(labels),
+                None if scores is None else scores[i],
+                None if predictions is None else predictions[i],
+            )
+            labels = self._get_aligned_labels(length, valid, recording=i)
+            aligned.append((labels, rec_scores, rec_predictions))
+
+        # Recordings are spread over the threads, each one being evaluated
+        # serially. Profiled evaluations stay serial, see MetricPlan.
+        pooled = {}
+        recordings, micro = plan.evaluate_recordings(
+            aligned,
+            profile=getattr(self, "profile_metrics", False),
+            n_jobs=getattr(self, "n_jobs", 1),
+            artifacts=pooled,
+        )
+
+        # Block-bootstrap intervals of the pooled point-wise metrics only,
+        # soft metrics would look across recordings.
+        labels, scores, predictions = zip(*aligned)
+        micro.update(self._bootstrap_intervals(
+            [key for key, _, _ in plan.metrics
+             if not key.startswith("soft_f1_")],
+            LabelIndex(np.concatenate([rec.y_true for rec in labels])),
+            None if scores[0] is None else np.concatenate(scores),
+            None if predictions[0] is None else np.concatenate(predictions),
+            order=pooled.get("score_order"),
+        ))
+
+        result = {}
+        for key in recordings[0]:
+            values = np.array([rec[key] for rec in recordings], dtype=float)
+            values = values[~np.isnan(values)]
+            result[f"macro_{key}"] = values.mean() if len(values) else np.nan
+        for key, value in micro.items():
+            result[f"micro_{key}"] = value
+        return result
+
+    def _bootstrap_intervals(self, metrics, labels, anomaly_scores,
+                             anomaly_predictions, order=None):
+        """Block-bootstrap confidence intervals of the supported metrics.
+
+        Reported as ``<metric>_ci_low`` and ``<metric>_ci_high`` for the
+        requested metrics among auc_pr, auc_roc, f1 and soft_f1_<range>.
+        ``order`` is the decreasing order of ``anomaly_scores`` already
+        computed by the metric plan, if any, so the scores are sorted once.
+        """
+        n_resamples = getattr(self, "n_bootstrap", 0)
+        metrics = [
+            metric for metric in metrics
+            if metric in ("auc_pr", "auc_roc", "f1")
+            or metric.startswith("soft_f1_")
+        ]
+        if not n_resamples or not metrics:
+            return {}
+        if len(labels) == 0:
+            return {
+                f"{metric}_ci_{bound}": np.nan
+                for metric in metrics for bound in ("low", "high")
+            }
+
+        use_scores = {"auc_pr", "auc_roc"} & set(metrics)
+        use_predictions = set(metrics) - use_scores
+        resamples = block_bootstrap(
+            labels,
+            anomaly_scores=anomaly_scores if use_scores else None,
+            anomaly_predictions=(
+                anomaly_predictions if use_predictions else None
+            ),
+            n_resamples=n_resamples,
+            block_length=self.bootstrap_block_length,
+            detection_ranges=[
+                int(metric[len("soft_f1_"):]) for metric in metrics
+                if metric.startswith("soft_f1_")
+            ],
+            random_state=self.bootstrap_seed,
+            order=order,
+        )
+
+        result = {}
+        for metric in metrics:
+            low, high = confidence_interval(
+                resamples[metric], self.bootstrap_confidence
+            )
+            result[f"{metric}_ci_low"] = low
+            result[f"{metric}_ci_high"] = high
+        return result
+
+    def _as_recordings(self, array, n_recordings):
+        """Reshape a solver output to ``(n_recordings, n_samples)``."""
+        if array is None:
+            return None
+        array = np.asarray(array)
+        if array.size % n_recordings:
+            raise ValueError(
+                f"Cannot split a solver output of shape {array.shape} into "
+                f"{n_recordings} recordings."
+            )
+        return array.reshape(n_recordings, -1)
+
+    def _get_plan(self, score_metrics, prediction_metrics):
+        """Compiled plan of the requested metrics, built once per request."""
+        key = (score_metrics, prediction_metrics)
+        plan = getattr(self, "_plan", None)
+        if plan is None or plan[0] != key:
+            plan = (key, MetricPlan(
+                score_metrics, prediction_metrics,
+                options=dict(vus_buffer=self.vus_buffer),
+            ))
+            self._plan = plan
+        return plan[1]
+
     def _normalize_metrics(self, metrics):
         if metrics is None:
             return ()
         if isinstance(metrics, str):
             if metrics == "all":
-                return ("auc_pr", "auc_roc")
-            return (metrics,)
-        return tuple(metric for metric in metrics if metric is not None)
+                return self.all_score_metrics
+            metrics = (metrics,)
+        return self._expand_parametric_metrics(
+            metric for metric in metrics if metric is not None
+        )
 
-    def _expand_prediction_metrics(self, metrics):
-        metrics = self._normalize_prediction_metrics(metrics)
+    def _expand_parametric_metrics(self, metrics):
+        """Expand parametric metrics requested without their parameter."""
+        defaults = {
+            **{name: self.detection_ranges for name in self.soft_metrics},
+            **{name: self.pa_k_values for name in self.pa_metrics},
+            "delay_percentile": self.delay_percentiles,
+            "detected_within": self.detection_horizons,
+        }
         expanded = []
+        for name in metrics:
+            if name in defaults:
+                expanded.extend(f"{name}_{value}" for value in defaults[name])
+            else:
+                expanded.append(name)
+        return tuple(expanded)
 
-        for metric in metrics:
+    def _expand_prediction_metrics(self, metrics):
+        expanded = []
+        for metric in self._normalize_prediction_metrics(metrics):
             if metric == "all":
-                metric = self.default_prediction_metrics
+                expanded.extend(self.default_prediction_metrics)
             else:
-                metric = (metric,)
-
-            for name in metric:
-                if name in {
-                    "soft_precision",
-                    "soft_recall",
-                    "soft_f1",
-                }:
-                    expanded.extend(
-                        f"{name}_{detection_range}"
-                        for detection_range in self.detection_ranges
-                    )
-                else:
-                    expanded.append(name)
-
-        return tuple(expanded)
+                expanded.append(metric)
+        return self._expand_parametric_metrics(expanded)
 
     def _normalize_prediction_metrics(self, metrics):
         if metrics is None:
@@ -170,31 +395,48 @@ class Objective(BaseObjective):
         return tuple(metric for metric in metrics if metric is not None)
 
     def _align_inputs(self, anomaly_scores, anomaly_predictions):
-        # flatten everything before aligning lengths.
-        y_true = np.asarray(self.y_test).reshape(-1)
+        # y_test is flattened once in set_data.
         scores = self._as_flat_array(anomaly_scores)
         predictions = self._as_flat_array(anomaly_predictions)
+        if scores is None and predictions is None:
+            return self._labels, None, None
 
+        length, valid, scores, predictions = self._align_arrays(
+            len(self._labels), scores, predictions
+        )
+        return self._get_aligned_labels(length, valid), scores, predictions
+
+    def _align_arrays(self, n_labels, scores, predictions):
+        """Select the positions of ``scores`` and ``predictions`` to evaluate.
+
+        Returns the number of trailing labels the outputs are aligned with,
+        the mask of valid positions among them (None if all are valid), and
+        the masked outputs.
+        """
         # Only align against arrays that were returned. This keeps
         # score-only and prediction-only evaluations valid.
         arrays = [array for array in (
             scores, predictions) if array is not None]
-        if not arrays:
-            return y_true, None, None
 
         # Windowed solvers return fewer outputs than y_test because the
         # first timestamps have no full context window. Keep the last samples,
         # which correspond to the part of y_test the solver scored.
-        length = min([len(y_true)] + [len(array) for array in arrays])
-        y_true = y_true[-length:]
+        length = min([n_labels] + [len(array) for array in arrays])
         if scores is not None:
-            scores = scores[-length:]
+            scores = scores[len(scores) - length:]
         if predictions is not None:
-            predictions = predictions[-length:]
+            predictions = predictions[len(predictions) - length:]
 
         # Drop invalid positions. NaN score padding and -1 prediction padding
         # When both scores and predictions are present, the same mask is
         # applied to keep mixed metric requests on the same timestamps.
+        # Without padding, ``valid`` is None and the outputs stay views, so
+        # memory-mapped outputs are never copied.
+        if not self._has_padding(scores, predictions):
+            return length, None, scores, predictions
+        if isinstance(predictions, AnomalyRanges):
+            predictions = predictions.to_dense()
+
         valid = np.ones(length, dtype=bool)
         if scores is not None:
             valid &= ~np.isnan(scores)
@@ -202,127 +444,60 @@ class Objective(BaseObjective):
             valid &= ~np.isnan(predictions)
             valid &= predictions != -1
 
-        y_true = y_true[valid]
         if scores is not None:
             scores = scores[valid]
         if predictions is not None:
             predictions = predictions[valid]
 
-        return y_true, scores, predictions
+        return length, valid, scores, predictions
 
-    def _as_flat_array(self, array):
-        if array is None:
-            return None
-        return np.asarray(array).reshape(-1)
+    def _has_padding(self, scores, predictions):
+        """Whether the outputs may contain NaN or -1 padding.
 
-    def _compute_score_metrics(self, y_true, anomaly_scores, metrics):
-        if len(y_true) == 0:
-            return {metric: np.nan for metric in metrics}
-
-        result = {}
-        for metric in metrics:
-            if metric == "auc_roc":
-                result[metric] = self._safe_auc_roc(y_true, anomaly_scores)
-            elif metric == "auc_pr":
-                result[metric] = self._auc_pr(y_true, anomaly_scores)
-            else:
-                raise ValueError(f"Unknown score metric: {metric}")
-        return result
-
-    def _compute_prediction_metrics(
-            self,
-            y_true,
-            anomaly_predictions,
-            metrics,
-    ):
-        if len(y_true) == 0:
-            return {metric: np.nan for metric in metrics}
-
-        result = {}
-        anomaly_ranges = None
-        prediction_ranges = None
-
-        for metric in metrics:
-            if metric == "precision":
-                result[metric] = precision_score(
-                    y_true, anomaly_predictions, zero_division=0
-                )
-            elif metric == "recall":
-                result[metric] = recall_score(
-                    y_true, anomaly_predictions, zero_division=0
-                )
-            elif metric == "f1":
-                result[metric] = f1_score(
-                    y_true, anomaly_predictions, zero_division=0)
-            elif metric == "zoloss":
-                result[metric] = zero_one_loss(y_true, anomaly_predictions)
-            elif metric in {"precision_t", "recall_t", "f1_t"}:
-                if anomaly_ranges is None:
-                    anomaly_ranges, prediction_ranges = self._get_ranges(
-                        y_true, anomaly_predictions
-                    )
-                if metric == "precision_t":
-                    result[metric] = precision_t_score(
-                        anomaly_ranges, prediction_ranges
-                    )
-                elif metric == "recall_t":
-                    result[metric] = recall_t_score(
-                        anomaly_ranges, prediction_ranges)
-                else:
-                    result[metric] = f1_t_score(
-                        anomaly_ranges, prediction_ranges)
-            elif metric == "ctt":
-                result[metric] = ctt(y_true, anomaly_predictions)
-            elif metric == "ttc":
-                result[metric] = ttc(y_true, anomaly_predictions)
-            elif metric.startswith("soft_precision_"):
-                detection_range = self._parse_detection_range(
-                    metric, "soft_precision")
-                result[metric] = soft_precision_score(
-                    y_true,
-                    anomaly_predictions,
-                    detection_range=detection_range,
-                )
-            elif metric.startswith("soft_recall_"):
-                detection_range = self._parse_detection_range(
-                    metric, "soft_recall")
-                result[metric] = soft_recall_score(
-                    y_true,
-                    anomaly_predictions,
-                    detection_range=detection_range,
-                )
-            elif metric.startswith("soft_f1_"):
-                detection_range = self._parse_detection_range(
-                    metric, "soft_f1")
-                result[metric] = soft_f1_score(
-                    y_true,
-                    anomaly_predictions,
-                    detection_range=detection_range,
-                )
-            else:
-                raise ValueError(f"Unknown prediction metric: {metric}")
-
-        return result
-
-    def _get_ranges(self, y_true, anomaly_predictions):
-        return (
-            extract_anomaly_ranges(y_true),
-            extract_anomaly_ranges(anomaly_predictions),
-        )
-
-    def _parse_detection_range(self, metric, prefix):
-        suffix = metric.replace(f"{prefix}_", "", 1)
-        try:
-            return int(suffix)
-        except ValueError as exc:
-            raise ValueError(
-                f"Invalid detection range in prediction metric: {metric}"
-            ) from exc
-
-    def _safe_auc_roc(self, y_true, anomaly_scores):
-        return roc_auc_score(y_true, anomaly_scores)
+        Reductions do not allocate temporaries of the size of the outputs.
+        A NaN propagates to the sum, and a sum of infinite scores giving
+        NaN only triggers the exact masking path.
+        """
+        if scores is not None and len(scores) and np.isnan(np.sum(scores)):
+            return True
+        if isinstance(predictions, AnomalyRanges):
+            return False
+        if predictions is not None and len(predictions):
+            return not np.min(predictions) > -1
+        return False
+
+    def _get_aligned_labels(self, length, valid, recording=None):
+        """Label index of the last ``length`` labels restricted to ``valid``.
+
+        Labels of the whole series, or of ``recording`` if given. The full
+        index is reused when no position is dropped, and the index of a
+        subset is kept until a call selects different positions.
+        """
+        if recording is None:
+            full = self._labels
+        else:
+            full = self._recording_labels[recording]
+        if length == len(full) and valid is None:
+            return full
+
+        cached = self._aligned_labels.get(recording)
+        if cached is not None and cached[0] == length and (
+                cached[1] is valid or np.array_equal(cached[1], valid)):
+            return cached[2]
+
+        y_test = self.y_test
+        if recording is not None or not isinstance(y_test, AnomalyRanges):
+            y_test = full.y_true
+        labels = LabelIndex(self._select(y_test, length, valid))
+        self._aligned_labels[recording] = (length, valid, labels)
+        return labels
+
+    def _select(self, y_true, length, valid):
+        # Slicing keeps AnomalyRanges compact, masking makes them dense.
+        y_true = y_true[len(y_true) - length:]
+        return y_true if valid is None else y_true[valid]
 
-    def _auc_pr(self, y_true, anomaly_scores):
-        if len(np.unique(y_true)) == 1:
-            return np.nan
-        return average_precision_score(y_true, anomaly_scores)
+    def _as_flat_array(self, array):
+        if array is None or isinstance(array, AnomalyRanges):
+            return array
+        return np.asarray(array).reshape(-1)
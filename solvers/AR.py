@@ -7,8 +7,9 @@ import numpy as np
 from tqdm import tqdm
 
 from benchmark_utils.models import ARModel
-from benchmark_utils import mean_overlaping_pred
+from benchmark_utils.overlap import WindowReconstructor
 from benchmark_utils.predictions import cutoff_scores
+from benchmark_utils.windowing import RecordingWindows
 
 
 class Solver(BaseSolver):
@@ -44,10 +45,8 @@ class Solver(BaseSolver):
 
         _, n_features, _ = X_train.shape
 
-        # (n_samples, n_features)
-        self.X_train = X_train.reshape(-1, n_features)
-        # (n_samples, n_features)
-        self.X_test = X_test.reshape(-1, n_features)
+        self.X_train = X_train
+        self.X_test = X_test
 
         self.model = ARModel(
             n_features,
@@ -61,21 +60,17 @@ class Solver(BaseSolver):
         )
         self.criterion = nn.MSELoss()
 
+        # Windows of (window_size+horizon, n_features) taken within each
+        # recording, so that no input window straddles two recordings.
         if self.X_train is not None:
-            # (n_windows, window_size+horizon, n_features)
-            self.Xw_train = np.lib.stride_tricks.sliding_window_view(
-                self.X_train,
-                window_shape=self.window_size+self.horizon,
-                axis=0
-            ).transpose(0, 2, 1)
+            self.Xw_train = RecordingWindows(
+                self.X_train, window_size=self.window_size+self.horizon
+            )
 
         if self.X_test is not None:
-            # (n_windows, window_size+horizon, n_features)
-            self.Xw_test = np.lib.stride_tricks.sliding_window_view(
-                self.X_test,
-                window_shape=self.window_size+self.horizon,
-                axis=0
-            ).transpose(0, 2, 1)
+            self.Xw_test = RecordingWindows(
+                self.X_test, window_size=self.window_size+self.horizon
+            )
 
     def run(self, _):
 
@@ -91,15 +86,15 @@ class Solver(BaseSolver):
             self.model.train()
             epoch_loss = 0.0
 
-            for i in range(0, len(self.Xw_train), self.batch_size):
+            for xw, _ in self.Xw_train.batches(self.batch_size):
                 # (batch_size, window_size, n_features)
                 x = torch.tensor(
-                    self.Xw_train[i:i+self.batch_size, :self.window_size, :],
+                    xw[:, :self.window_size, :],
                     dtype=torch.float32, device=self.device
                 )
                 # (batch_size, horizon, n_features)
                 y = torch.tensor(
-                    self.Xw_train[i:i+self.batch_size, :self.horizon, :],
+                    xw[:, :self.horizon, :],
                     dtype=torch.float32, device=self.device
                 )
 
@@ -123,28 +118,35 @@ class Solver(BaseSolver):
         self.model.load_state_dict(best_model)
 
         self.model.eval()
-        # (n_test_windows, horizon, n_features)
-        xw_hat = self.model(torch.tensor(
-            self.Xw_test[:, :self.window_size, :],
-            dtype=torch.float32
-        ).to(self.device))
-
-        xw_hat = xw_hat.detach().cpu().numpy()
-
-        # Reconstructing the prediction from the predicted windows.
-        # The first ``window_size`` positions have no forecast (no full input
-        # window precedes them); fill them with -1 as a sentinel.
-        x_hat = np.zeros_like(self.X_test) - 1
-        x_hat[self.window_size:] = mean_overlaping_pred(xw_hat, 1)
+        # Reconstructing the forecasts of each recording batch by batch.
+        # The first ``window_size`` positions of a recording have no
+        # forecast (no full input window precedes them).
+        n_recordings, n_features, n_samples = self.X_test.shape
+        reconstructor = WindowReconstructor(
+            n_recordings, n_samples - self.window_size - self.horizon + 1,
+            self.horizon, n_features,
+        )
+        with torch.no_grad():
+            for xw, _ in self.Xw_test.batches(self.batch_size):
+                # (batch_size, horizon, n_features)
+                xw_hat = self.model(torch.tensor(
+                    xw[:, :self.window_size, :],
+                    dtype=torch.float32, device=self.device
+                ))
+                reconstructor.update(xw_hat.cpu().numpy())
+        # (n_recordings, n_samples - window_size, n_features)
+        x_hat = reconstructor.finalize()
 
         reconstruction_err = np.abs(
-            self.X_test[self.window_size:] - x_hat[self.window_size:]
+            self.X_test.transpose(0, 2, 1)[:, self.window_size:] - x_hat
         )
         self.anomaly_scores = np.full(
-            self.X_test.shape, np.nan, dtype=float
+            (n_recordings, n_samples), np.nan, dtype=float
+        )
+        self.anomaly_scores[:, self.window_size:] = np.max(
+            reconstruction_err, axis=2
         )
-        self.anomaly_scores[self.window_size:] = reconstruction_err
-        self.anomaly_scores = np.max(self.anomaly_scores, axis=1)
+        self.anomaly_scores = self.anomaly_scores.reshape(-1)
 
         self.anomaly_predictions = cutoff_scores(
             self.anomaly_scores,
@@ -153,9 +155,9 @@ class Solver(BaseSolver):
 
     # Skipping the solver call if a condition is met
     def skip(self, X_train, X_test):
-        if X_train.shape[0]*X_train.shape[2] < self.window_size + self.horizon:
+        if X_train.shape[2] < self.window_size + self.horizon:
             return True, "No enough training samples"
-        if X_test.shape[0]*X_test.shape[2] < self.window_size + self.horizon:
+        if X_test.shape[2] < self.window_size + self.horizon:
             return True, "No enough testing samples"
         return False, None
 
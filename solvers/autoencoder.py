@@ -33,12 +33,13 @@ class Solver(BaseSolver):
 
     def set_objective(self, X_train, X_test):
         if self.window_size == "auto":
-            self.window_size = find_period_length(X_train.reshape(-1))
+            self.window_size = find_period_length(X_train)
 
-        # Data received has shape (n_recordings, n_features, n_samples)
+        # Data received has shape (n_recordings, n_features, n_samples),
+        # the autoencoder windows each recording separately.
         n_features = X_train.shape[1]
-        self.X_train = X_train.reshape(-1, n_features)
-        self.X_test = X_test.reshape(-1, n_features)
+        self.X_train = X_train
+        self.X_test = X_test
 
         # For multivariate data, input_size = window_size * n_features
         self.clf = Autoencoder(
@@ -71,7 +72,7 @@ class Solver(BaseSolver):
 
     def skip(self, X_train, X_test):
         """Check if the solver can be skipped."""
-        if find_period_length(X_train.reshape(-1)) == 0 and (
+        if find_period_length(X_train) == 0 and (
             self.window_size == "auto"
         ):
             return True, "Window size is 0"
@@ -93,14 +93,8 @@ class Solver(BaseSolver):
         # Anomaly : 1
         # Inlier : 0
         # To ignore : -1
-        # For now, take the first recording
-        anomaly_scores = self.anomaly_scores[0] if (
-            self.anomaly_scores.ndim > 1
-        ) else self.anomaly_scores
-        result = dict(anomaly_scores=anomaly_scores)
+        # Every recording is returned, the objective aligns them with y_test.
+        result = dict(anomaly_scores=self.anomaly_scores)
         if self.anomaly_predictions is not None:
-            anomaly_predictions = self.anomaly_predictions[0] if (
-                self.anomaly_predictions.ndim > 1
-            ) else self.anomaly_predictions
-            result["anomaly_predictions"] = anomaly_predictions
+            result["anomaly_predictions"] = self.anomaly_predictions
         return result
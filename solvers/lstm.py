@@ -9,7 +9,7 @@ from torch.utils.data import DataLoader
 from tqdm import tqdm
 from benchmark_utils.models import AutoEncoderLSTM
 from benchmark_utils.windowing import make_windowed_dataset
-from benchmark_utils.windowing import reconstruct_from_windows
+from benchmark_utils.overlap import WindowReconstructor
 from benchmark_utils.predictions import cutoff_scores
 
 
@@ -104,20 +104,21 @@ class Solver(BaseSolver):
 
             ti.set_postfix(train_loss=f"{train_loss:.5f}")
 
-        # Test loop
+        # Test loop, each batch being added to the reconstruction as soon
+        # as it is computed.
         self.model.eval()
-        raw_reconstruction = []
+        reconstructor = WindowReconstructor(
+            len(self.X_test), self.Xw_test.n_windows, self.window_size,
+            self.n_features, stride=self.stride,
+        )
         for x, in self.test_loader:
 
             x = x.to(self.device)
             with torch.no_grad():
                 x_hat = self.model(x)
-            raw_reconstruction.append(x_hat.detach().cpu().numpy())
-        reconstructed_data = np.concatenate(raw_reconstruction, axis=0)
-        reconstructed_data = reconstruct_from_windows(
-            reconstructed_data, stride=self.stride,
-            batch=len(self.X_test), n_features=self.n_features
-        )
+            reconstructor.update(x_hat.detach().cpu().numpy())
+        # (n_recordings, n_features, n_times)
+        reconstructed_data = reconstructor.finalize().transpose(0, 2, 1)
 
         reconstruction_err = np.mean(
             np.abs(self.X_test - reconstructed_data), axis=1
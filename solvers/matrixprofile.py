@@ -2,7 +2,7 @@ from benchopt import BaseSolver
 from sklearn.preprocessing import MinMaxScaler
 
 from benchmark_utils.predictions import cutoff_scores
-from benchmark_utils.windowing import find_period_length
+from benchmark_utils.windowing import find_period_length, stack_recordings
 from TSB_AD.models.MatrixProfile import MatrixProfile
 
 
@@ -31,13 +31,11 @@ class Solver(BaseSolver):
         self.X_train = X_train
         self.X_test = X_test
 
-        n_features = X_train.shape[1]
-
-        self.X_train = self.X_train.reshape(-1, n_features)
-        self.X_test = self.X_test.reshape(-1, n_features)
+        self.X_train = stack_recordings(self.X_train)
+        self.X_test = stack_recordings(self.X_test)
 
         if self.window_size == "auto":
-            self.window_size = int(find_period_length(X_train.reshape(-1)))
+            self.window_size = int(find_period_length(X_train))
 
         self.clf = MatrixProfile(
             window=self.window_size,
@@ -59,7 +57,7 @@ class Solver(BaseSolver):
 
     def skip(self, X_train, X_test):
         """Check if the solver can be skipped."""
-        if (find_period_length(X_train.reshape(-1)) == 0) and (
+        if (find_period_length(X_train) == 0) and (
                 self.window_size == "auto"):
             return True, "Window size is 0"
         if X_train.shape[1] != 1:
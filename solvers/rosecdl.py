@@ -51,7 +51,7 @@ class Solver(BaseSolver):
         self.X_test = X_test
 
         if self.kernel_size == "auto":
-            self.kernel_size = int(find_period_length(X_train.reshape(-1)))
+            self.kernel_size = int(find_period_length(X_train))
 
         self.clf = RoseCDL(
             n_components=self.n_components,
@@ -7,6 +7,7 @@ import torch
 from TSB_AD.model_wrapper import run_TimesFM
 
 from benchmark_utils.predictions import cutoff_scores
+from benchmark_utils.windowing import stack_recordings
 
 
 class Solver(BaseSolver):
@@ -23,10 +24,10 @@ class Solver(BaseSolver):
     sampling_strategy = "run_once"
 
     def set_objective(self, X_train, X_test):
-        _, n_features, _ = X_train.shape
-        self.data = np.append(X_train, X_test, axis=2)
-        self.data = self.data.reshape(-1, n_features)
-        self.X_test = X_test.reshape(-1, n_features)
+        # All the training recordings, then all the test ones, as one
+        # series whose last rows are the test samples.
+        self.X_test = stack_recordings(X_test)
+        self.data = np.concatenate((stack_recordings(X_train), self.X_test))
 
     def skip(self, X_train, X_test):
         if find_spec("timesfm") is None:
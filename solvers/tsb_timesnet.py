@@ -4,6 +4,7 @@ import torch
 from TSB_AD.models.TimesNet import TimesNet
 
 from benchmark_utils.predictions import cutoff_scores
+from benchmark_utils.windowing import stack_recordings
 
 
 class Solver(BaseSolver):
@@ -35,8 +36,8 @@ class Solver(BaseSolver):
 
     def set_objective(self, X_train, X_test):
         _, n_features, _ = X_train.shape
-        self.X_train = X_train.reshape(-1, n_features)
-        self.X_test = X_test.reshape(-1, n_features)
+        self.X_train = stack_recordings(X_train)
+        self.X_test = stack_recordings(X_test)
 
         self.clf = TimesNet(
             win_size=self.window_size,
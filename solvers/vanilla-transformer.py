@@ -10,7 +10,7 @@ from torch.utils.data import DataLoader
 
 from benchmark_utils.models import TransformerModel
 from benchmark_utils.windowing import make_windowed_dataset
-from benchmark_utils.windowing import reconstruct_from_windows
+from benchmark_utils.overlap import WindowReconstructor
 from benchmark_utils.predictions import cutoff_scores
 
 
@@ -128,24 +128,22 @@ class Solver(BaseSolver):
                     if no_improve == patience:
                         break
 
-        # Test loop
+        # Test loop, each batch of forecasts being added to the
+        # reconstruction as soon as it is computed.
         self.model.eval()
-        all_predictions = []
+        reconstructor = WindowReconstructor(
+            len(self.X_test), self.Xw_test.n_windows, self.horizon,
+            self.X_test.shape[1], stride=self.stride,
+        )
 
         with torch.no_grad():
             for x, in self.test_loader:
                 batch = x[:, :self.window_size].to(self.device)
-                with torch.no_grad():
-                    batch_predictions = self.model(batch)
-                all_predictions.append(batch_predictions.cpu().numpy())
-
-        xw_hat = np.concatenate(all_predictions, axis=0)
+                reconstructor.update(self.model(batch).cpu().numpy())
 
-        # Continue with the rest of your code for reconstructing predictions
         x_hat = np.zeros_like(self.X_test) - 1
-        x_hat[..., self.window_size:] = reconstruct_from_windows(
-            xw_hat, stride=self.stride, batch=len(self.X_test),
-            n_features=self.X_test.shape[1]
+        x_hat[..., self.window_size:] = reconstructor.finalize().transpose(
+            0, 2, 1
         )
 
         reconstruction_err = np.abs(
@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+from sklearn.metrics import average_precision_score, f1_score, roc_auc_score
+
+from benchmark_utils.bootstrap import block_bootstrap, confidence_interval
+from benchmark_utils.metrics import soft_scores
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_resamples_match_weighted_metrics(seed):
+    rng = np.random.default_rng(seed)
+    n, block_length = 60, 7
+    y_true = (rng.random(n) < 0.3).astype(int)
+    scores = np.round(rng.random(n) * 4) + 0.5 * y_true
+    predictions = (rng.random(n) < 0.3).astype(int)
+
+    resamples = block_bootstrap(
+        y_true, scores, predictions, n_resamples=8,
+        block_length=block_length, random_state=seed,
+    )
+
+    n_blocks = -(-n // block_length)
+    counts = np.random.default_rng(seed).multinomial(
+        n_blocks, np.full(n_blocks, 1 / n_blocks), size=8
+    )
+    for i, block_counts in enumerate(counts):
+        weights = block_counts[np.arange(n) // block_length]
+        assert resamples["f1"][i] == pytest.approx(f1_score(
+            y_true, predictions, sample_weight=weights, zero_division=0
+        ))
+        if np.all(weights[y_true == 1] == 0) or np.all(
+                weights[y_true == 0] == 0):
+            assert np.isnan(resamples["auc_roc"][i])
+            continue
+        assert resamples["auc_roc"][i] == pytest.approx(
+            roc_auc_score(y_true, scores, sample_weight=weights))
+        assert resamples["auc_pr"][i] == pytest.approx(
+            average_precision_score(y_true, scores, sample_weight=weights))
+
+
+def test_single_block_resample_is_the_original_series():
+    rng = np.random.default_rng(0)
+    y_true = (rng.random(100) < 0.2).astype(int)
+    predictions = (rng.random(100) < 0.2).astype(int)
+
+    resamples = block_bootstrap(
+        y_true, anomaly_predictions=predictions, n_resamples=3,
+        block_length=100, detection_ranges=(1, 5),
+    )
+
+    _, _, f1 = soft_scores(y_true, predictions, (1, 5))
+    np.testing.assert_allclose(resamples["soft_f1_1"], f1[0])
+    np.testing.assert_allclose(resamples["soft_f1_5"], f1[1])
+
+
+def test_confidence_interval_ignores_undefined_resamples():
+    values = np.r_[np.arange(101) / 100, np.nan]
+    assert confidence_interval(values, 0.9) == pytest.approx((0.05, 0.95))
+    assert np.isnan(confidence_interval([np.nan, np.nan])).all()
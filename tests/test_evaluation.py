@@ -0,0 +1,160 @@
+import tracemalloc
+
+import numpy as np
+import pytest
+
+from benchmark_utils import evaluation
+from benchmark_utils.evaluation import MetricPlan, register_metric
+from benchmark_utils.metrics import LabelIndex
+
+
+def test_plan_computes_shared_artifacts_once(monkeypatch):
+    calls = []
+    artifact = evaluation.ARTIFACTS["score_order"]
+    compute = artifact.compute
+
+    def counting(values, params, options):
+        calls.append(1)
+        return compute(values, params, options)
+
+    monkeypatch.setattr(artifact, "compute", counting)
+    plan = MetricPlan(("auc_pr", "auc_roc", "best_f1", "vus_pr"))
+    labels = LabelIndex(np.array([0, 0, 1, 0, 1, 0]))
+    scores = np.array([0.1, 0.2, 0.9, 0.1, 0.8, 0.2])
+
+    result = plan.evaluate(labels, anomaly_scores=scores)
+
+    assert len(calls) == 1
+    assert plan.artifacts == ["score_order", "roc_pr", "vus"]
+    assert result["auc_pr"] == pytest.approx(1.0)
+    assert result["auc_roc"] == pytest.approx(1.0)
+
+
+def test_plan_resolves_parametric_metrics_at_compile_time():
+    plan = MetricPlan(prediction_metrics=("soft_f1_5", "soft_recall_1"))
+    assert plan.params == {"soft_scores": (1, 5)}
+
+    with pytest.raises(ValueError, match="Unknown prediction metric"):
+        MetricPlan(prediction_metrics=("soft_f2_1",))
+    with pytest.raises(ValueError, match="Invalid detection range"):
+        MetricPlan(prediction_metrics=("soft_f1_x",))
+
+
+def test_registered_metric_is_available_to_plans(monkeypatch):
+    monkeypatch.setattr(evaluation, "PREDICTION_METRICS",
+                        dict(evaluation.PREDICTION_METRICS))
+    register_metric("n_predicted", "prediction", requires=("confusion",))(
+        lambda values, param: values["confusion"][0] + values["confusion"][1]
+    )
+
+    plan = MetricPlan(prediction_metrics=("n_predicted", "precision"))
+    result = plan.evaluate(
+        LabelIndex(np.array([0, 1, 1, 0])),
+        anomaly_predictions=np.array([1, 1, 0, 0]),
+    )
+
+    assert result == {"n_predicted": 2, "precision": 0.5}
+
+
+def test_parallel_evaluation_matches_serial():
+    rng = np.random.default_rng(0)
+    y_true = (rng.random(500) < 0.1).astype(int)
+    scores = rng.random(500) + y_true
+    predictions = (scores > 0.9).astype(int)
+    plan = MetricPlan(
+        ("auc_pr", "auc_roc", "best_f1", "best_f1_t", "vus_roc"),
+        ("precision", "f1_t", "ctt", "ttc", "soft_f1_3", "soft_recall_5"),
+    )
+
+    serial = plan.evaluate(LabelIndex(y_true), scores, predictions)
+    parallel = plan.evaluate(LabelIndex(y_true), scores, predictions,
+                             n_jobs=4)
+
+    assert plan.levels == [
+        ["score_order", "confusion", "true_ranges", "prediction_ranges",
+         "nearest_distances", "soft_scores"],
+        ["roc_pr", "vus"],
+    ]
+    assert parallel == serial
+
+
+def test_batch_evaluation_matches_rows():
+    rng = np.random.default_rng(0)
+    y_true = (rng.random(200) < 0.1).astype(int)
+    scores = rng.random((5, 200)) + y_true
+    plan = MetricPlan(("auc_pr", "auc_roc", "best_f1", "best_f1_t"))
+    labels = LabelIndex(y_true)
+
+    result = plan.evaluate_batch(labels, scores, max_cells=400)
+
+    for i, row in enumerate(scores):
+        for key, value in plan.evaluate(labels, row).items():
+            assert result[key][i] == pytest.approx(value)
+    with pytest.raises(ValueError, match="only support score metrics"):
+        MetricPlan(prediction_metrics=("f1",)).evaluate_batch(labels, scores)
+
+
+def test_pooled_metrics_keep_recordings_apart():
+    rng = np.random.default_rng(0)
+    recordings = []
+    for n in (300, 200, 250):
+        y_true = np.repeat(rng.random(n // 5) < 0.15, 5).astype(int)
+        y_true[[0, -1]] = 1
+        predictions = (rng.random(n) < 0.1).astype(int)
+        predictions[[1, -2]] = 1
+        recordings.append((y_true, predictions))
+    metrics = ("precision", "recall", "f1", "f1_t", "ctt", "ttc",
+               "soft_f1_3", "soft_precision_10", "pa_f1_20", "delay_mean",
+               "detected_within_5")
+    plan = MetricPlan(prediction_metrics=metrics + ("aff_recall",))
+
+    results, pooled = plan.evaluate_recordings(
+        [(LabelIndex(y), None, p) for y, p in recordings], n_jobs=2
+    )
+
+    # Normal gaps longer than any distance separate the recordings without
+    # changing these metrics, so they match the pooled values.
+    gap = np.zeros(1000, dtype=int)
+    y_true = np.concatenate([part for y, _ in recordings for part in (y, gap)])
+    predictions = np.concatenate(
+        [part for _, p in recordings for part in (p, gap)]
+    )
+    separated = MetricPlan(prediction_metrics=metrics).evaluate(
+        LabelIndex(y_true), anomaly_predictions=predictions
+    )
+    for key in metrics:
+        assert pooled[key] == pytest.approx(separated[key])
+    assert len(results) == 3
+    assert results[0] == plan.evaluate(
+        LabelIndex(recordings[0][0]), anomaly_predictions=recordings[0][1]
+    )
+    assert "aff_recall" in pooled
+
+    score_plan = MetricPlan(("auc_roc", "vus_roc"))
+    _, pooled = score_plan.evaluate_recordings(
+        [(LabelIndex(y), rng.random(len(y)), None) for y, _ in recordings]
+    )
+    assert list(pooled) == ["auc_roc"]
+
+
+def test_profiled_times_are_measured_without_tracing(monkeypatch):
+    tracing = []
+    metric = evaluation.SCORE_METRICS["auc_pr"]
+    compute = metric.compute
+
+    def recording(values, param):
+        tracing.append(tracemalloc.is_tracing())
+        return compute(values, param)
+
+    monkeypatch.setattr(metric, "compute", recording)
+    plan = MetricPlan(("auc_pr",))
+    result = plan.evaluate(
+        LabelIndex(np.array([0, 1, 1, 0])), np.array([0.1, 0.8, 0.9, 0.2]),
+        profile=True,
+    )
+
+    # One untraced pass for the times, one traced pass for the memory.
+    assert tracing == [False, True]
+    assert result["auc_pr"] == pytest.approx(1.0)
+    assert result["time_auc_pr"] >= 0 and result["peak_memory_roc_pr"] > 0
+    assert not tracemalloc.is_tracing()
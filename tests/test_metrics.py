@@ -2,10 +2,13 @@ import pytest  # noqa
 
 import numpy as np
 from benchmark_utils.metrics import (
-    soft_precision, soft_recall, soft_f1, ctt, ttc,
+    soft_precision, soft_recall, soft_f1, soft_scores, ctt, ttc,
     extract_anomaly_ranges, existence_reward, cardinality_factor,
     positional_bias, overlap_size, overlap_reward,
-    recall_t, precision_t, f1_t
+    recall_t, precision_t, f1_t, best_f1, range_f1_curve, best_f1_t,
+    range_auc, vus, roc_pr_scores, LabelIndex, pa_k_scores, best_pa_k_f1,
+    affiliation_scores, detection_delays, detection_delay_scores,
+    AnomalyRanges, roc_pr_scores_batch
 )
 
 
@@ -638,3 +641,375 @@ def test_f1_t():
     ) if (recall_score + precision_score) != 0 else 0
     assert f1_t(empty_real_ranges, predicted_ranges,
                 alpha=0.5, bias_type='flat') == expected_f1
+
+
+def _brute_force_overlap_reward(real_range, predicted_ranges, bias_type):
+    covered = set()
+    for pred_start, pred_end in predicted_ranges:
+        covered.update(range(max(real_range[0], pred_start),
+                             min(real_range[1], pred_end) + 1))
+    if not covered:
+        return 0.0
+    length = real_range[1] - real_range[0] + 1
+    return cardinality_factor(real_range, predicted_ranges) * overlap_size(
+        real_range, covered, length, bias_type)
+
+
+def test_range_metrics_match_brute_force():
+    rng = np.random.default_rng(0)
+    for _ in range(50):
+        real_ranges = extract_anomaly_ranges(rng.random(80) < 0.2)
+        # Predicted ranges may overlap each other and are not sorted.
+        starts = rng.integers(0, 80, size=rng.integers(0, 6))
+        predicted_ranges = [
+            (int(s), int(s + rng.integers(0, 10))) for s in starts
+        ]
+        for bias_type in ['flat', 'front', 'back', 'middle']:
+            recall = [
+                0.5 * existence_reward(r, predicted_ranges)
+                + 0.5 * _brute_force_overlap_reward(
+                    r, predicted_ranges, bias_type)
+                for r in real_ranges
+            ]
+            precision = [
+                _brute_force_overlap_reward(p, real_ranges, bias_type)
+                for p in predicted_ranges
+            ]
+            assert recall_t(
+                real_ranges, predicted_ranges, bias_type=bias_type
+            ) == pytest.approx(np.mean(recall) if recall else 0)
+            assert precision_t(
+                real_ranges, predicted_ranges, bias_type=bias_type
+            ) == pytest.approx(np.mean(precision) if precision else 0)
+
+
+def test_ctt_ttc_match_brute_force():
+    rng = np.random.default_rng(0)
+    for _ in range(50):
+        y_true = (rng.random(60) < 0.1).astype(int)
+        y_pred = (rng.random(60) < 0.1).astype(int)
+        if y_true.sum() == 0 or y_pred.sum() == 0:
+            continue
+        true_idx, pred_idx = np.flatnonzero(y_true), np.flatnonzero(y_pred)
+        # np.argmin keeps the first closest index, i.e. the earlier one.
+        ctt_dists = [true_idx[np.argmin(np.abs(true_idx - i))] - i
+                     for i in pred_idx]
+        ttc_dists = [pred_idx[np.argmin(np.abs(pred_idx - i))] - i
+                     for i in true_idx]
+        assert ctt(y_true, y_pred, return_signed=True) == np.mean(ctt_dists)
+        assert ctt(y_true, y_pred) == np.mean(np.abs(ctt_dists))
+        assert ttc(y_true, y_pred, return_signed=True) == np.mean(ttc_dists)
+        assert ttc(y_true, y_pred) == np.mean(np.abs(ttc_dists))
+
+
+def test_ctt_ties_pick_earlier_anomaly():
+    y_true = np.zeros(10)
+    y_true[2] = y_true[6] = 1
+    y_pred = np.zeros(10)
+    y_pred[4] = 1
+    assert ctt(y_true, y_pred, return_signed=True) == -2.0
+    assert ctt(y_true, y_pred) == 2.0
+
+
+def test_soft_scores_match_single_range_functions():
+    rng = np.random.default_rng(0)
+    y_true = (rng.random(200) < 0.1).astype(int)
+    y_pred = (rng.random(200) < 0.1).astype(int)
+    detection_ranges = [0, 1, 3, 5, 10, 20]
+
+    precision, recall, f1 = soft_scores(y_true, y_pred, detection_ranges)
+
+    for i, detection_range in enumerate(detection_ranges):
+        assert precision[i] == soft_precision(
+            y_true, y_pred, detection_range=detection_range)
+        assert recall[i] == soft_recall(
+            y_true, y_pred, detection_range=detection_range)
+        assert f1[i] == soft_f1(
+            y_true, y_pred, detection_range=detection_range)
+
+
+def test_best_f1_matches_threshold_sweep():
+    from sklearn.metrics import f1_score
+
+    rng = np.random.default_rng(0)
+    y_true = (rng.random(200) < 0.1).astype(int)
+    # Rounded scores create ties, which must switch on together.
+    scores = np.round(rng.random(200) + y_true * 0.3, 1)
+
+    f1, threshold, precision, recall = best_f1(y_true, scores)
+
+    expected = max(
+        f1_score(y_true, scores >= t) for t in np.unique(scores)
+    )
+    assert f1 == pytest.approx(expected)
+    assert f1_score(y_true, scores >= threshold) == pytest.approx(f1)
+    assert 2 * precision * recall / (precision + recall) == pytest.approx(f1)
+
+
+def test_best_f1_without_anomalies():
+    assert best_f1(np.zeros(5), np.arange(5))[0] == 0.0
+
+
+def test_range_f1_curve_matches_thresholded_f1_t():
+    rng = np.random.default_rng(0)
+    y_true = (rng.random(60) < 0.3).astype(int)
+    scores = np.round(rng.random(60) + 0.5 * y_true, 1)
+    real_ranges = extract_anomaly_ranges(y_true)
+
+    for bias_type in ['flat', 'front', 'back', 'middle']:
+        thresholds, precision, recall, f1 = range_f1_curve(
+            y_true, scores, alpha=0.3, bias_type=bias_type)
+        assert np.all(np.diff(thresholds) < 0)
+        for k, threshold in enumerate(thresholds):
+            predicted_ranges = extract_anomaly_ranges(scores >= threshold)
+            assert precision[k] == pytest.approx(precision_t(
+                real_ranges, predicted_ranges, bias_type=bias_type))
+            assert recall[k] == pytest.approx(recall_t(
+                real_ranges, predicted_ranges, alpha=0.3,
+                bias_type=bias_type))
+            assert f1[k] == pytest.approx(f1_t(
+                real_ranges, predicted_ranges, alpha=0.3,
+                bias_type=bias_type))
+
+        best, threshold, _, _ = best_f1_t(
+            y_true, scores, alpha=0.3, bias_type=bias_type)
+        assert best == pytest.approx(f1.max())
+        assert best == f1_t(
+            real_ranges, extract_anomaly_ranges(scores >= threshold),
+            alpha=0.3, bias_type=bias_type)
+
+    for values in range_f1_curve(np.zeros(0, dtype=int), np.zeros(0)):
+        assert values.shape == (0,)
+    assert best_f1_t(np.zeros(0, dtype=int), np.zeros(0)) == (
+        0.0, np.inf, 0.0, 0.0)
+
+
+def test_range_f1_curve_on_long_ramps():
+    # Monotone stretches and ties make ranges merge far from where they
+    # started, across many blocks of the vectorized neighbour search.
+    rng = np.random.default_rng(1)
+    y_true = np.zeros(600, dtype=int)
+    for start in (40, 150, 151, 300, 480):
+        y_true[start:start + rng.integers(5, 60)] = 1
+    scores = np.r_[np.linspace(0, 1, 200), np.linspace(1, 0, 200),
+                   np.round(rng.random(200), 1)]
+    real_ranges = extract_anomaly_ranges(y_true)
+
+    for bias_type in ['flat', 'front', 'back', 'middle']:
+        thresholds, precision, recall, _ = range_f1_curve(
+            y_true, scores, alpha=0.2, bias_type=bias_type)
+        for k in np.linspace(0, len(thresholds) - 1, 25).astype(int):
+            predicted_ranges = extract_anomaly_ranges(
+                scores >= thresholds[k])
+            assert precision[k] == pytest.approx(precision_t(
+                real_ranges, predicted_ranges, bias_type=bias_type))
+            assert recall[k] == pytest.approx(recall_t(
+                real_ranges, predicted_ranges, alpha=0.2,
+                bias_type=bias_type))
+
+
+def test_range_auc_without_buffer_is_existence_weighted_auc():
+    y_true = np.zeros(40, dtype=int)
+    y_true[10:13] = y_true[30:32] = 1
+    perfect = y_true + 0.1 * np.arange(40) / 40
+
+    auc_roc, auc_pr = range_auc(y_true, perfect, buffer=0)
+    assert auc_roc == pytest.approx(1.0, abs=0.02)
+    assert auc_pr == pytest.approx(1.0, abs=0.02)
+
+    # Buffers reward scores that fire just before or after an anomaly.
+    shifted = np.roll(y_true, 2) + 0.1 * np.arange(40) / 40
+    assert range_auc(y_true, shifted, buffer=10)[0] > range_auc(
+        y_true, shifted, buffer=0)[0]
+
+
+def test_vus_is_mean_of_range_auc_over_buffers():
+    rng = np.random.default_rng(0)
+    y_true = np.zeros(300, dtype=int)
+    y_true[50:60] = y_true[150:155] = y_true[240:250] = 1
+    scores = rng.random(300) + y_true * rng.random(300)
+
+    curves = np.array([range_auc(y_true, scores, buffer=b)
+                       for b in range(21)])
+    vus_roc, vus_pr = vus(y_true, scores, max_buffer=20)
+
+    assert vus_roc == pytest.approx(curves[:, 0].mean())
+    assert vus_pr == pytest.approx(curves[:, 1].mean())
+    assert np.isnan(vus(np.zeros(10), np.arange(10))[0])
+
+
+def test_roc_pr_scores_match_sklearn():
+    from sklearn.metrics import average_precision_score, roc_auc_score
+
+    rng = np.random.default_rng(0)
+    for decimals in [0, 1, 3]:
+        y_true = (rng.random(300) < 0.2).astype(int)
+        # Rounding creates ties, which scikit-learn groups together.
+        scores = np.round(rng.random(300) + 0.5 * y_true, decimals)
+
+        auc_roc, auc_pr, f1 = roc_pr_scores(y_true, scores)
+
+        assert auc_roc == pytest.approx(roc_auc_score(y_true, scores))
+        assert auc_pr == pytest.approx(
+            average_precision_score(y_true, scores))
+        assert f1 == best_f1(y_true, scores)[0]
+
+    assert np.isnan(roc_pr_scores(np.zeros(5), np.arange(5))[0])
+
+
+def test_label_index_gives_same_results_as_arrays():
+    rng = np.random.default_rng(0)
+    y_true = (rng.random(200) < 0.1).astype(int)
+    y_pred = (rng.random(200) < 0.1).astype(int)
+    scores = rng.random(200) + y_true
+    labels = LabelIndex(y_true)
+
+    assert labels.ranges == extract_anomaly_ranges(y_true)
+    assert ctt(labels, y_pred) == ctt(y_true, y_pred)
+    assert ttc(labels, y_pred) == ttc(y_true, y_pred)
+    np.testing.assert_array_equal(soft_scores(labels, y_pred),
+                                  soft_scores(y_true, y_pred))
+    assert roc_pr_scores(labels, scores) == roc_pr_scores(y_true, scores)
+    assert vus(labels, scores, 10) == vus(y_true, scores, 10)
+
+
+def _point_adjust(y_true, y_pred, k):
+    y_pred = y_pred.copy()
+    for start, end in extract_anomaly_ranges(y_true):
+        if y_pred[start:end + 1].mean() > k / 100:
+            y_pred[start:end + 1] = 1
+    return y_pred
+
+
+def test_pa_k_scores_match_adjusted_predictions():
+    rng = np.random.default_rng(0)
+    y_true = np.repeat(rng.random(100) < 0.15, 4).astype(int)
+    y_pred = (rng.random(400) < 0.3).astype(int)
+
+    precision, recall, f1 = pa_k_scores(y_true, y_pred)
+
+    assert len(f1) == 101
+    for k in (0, 25, 50, 75, 100):
+        adjusted = _point_adjust(y_true, y_pred, k)
+        tp = np.sum(adjusted & y_true)
+        assert precision[k] == pytest.approx(tp / adjusted.sum())
+        assert recall[k] == pytest.approx(tp / y_true.sum())
+        assert f1[k] == pytest.approx(
+            2 * tp / (adjusted.sum() + y_true.sum()))
+    # PA%0 is the point-adjust protocol, PA%100 the point-wise F1.
+    assert np.all(np.diff(f1) <= 1e-12)
+
+
+def test_best_pa_k_f1_matches_threshold_sweep():
+    rng = np.random.default_rng(1)
+    y_true = np.repeat(rng.random(40) < 0.2, 5).astype(int)
+    scores = np.round(rng.random(200) + 0.3 * y_true, 1)
+
+    for k in (0, 30, 100):
+        expected = max(
+            pa_k_scores(y_true, (scores >= t).astype(int), ks=[k])[2][0]
+            for t in np.unique(scores)
+        )
+        assert best_pa_k_f1(y_true, scores, k)[0] == pytest.approx(expected)
+    assert best_pa_k_f1(y_true, scores, 100)[0] == pytest.approx(
+        best_f1(y_true, scores)[0])
+
+
+def test_affiliation_scores():
+    y_true = np.zeros(20, dtype=int)
+    y_true[5:8] = y_true[14:16] = 1
+
+    assert affiliation_scores(y_true, y_true) == (1.0, 1.0)
+    assert np.isnan(affiliation_scores(y_true, np.zeros(20))[0])
+    assert affiliation_scores(y_true, np.zeros(20))[1] == 0
+
+    # A single point predicted at the centre of the first event: the
+    # predicted interval [6, 7) lies inside it, and recall decreases
+    # linearly with the distance to it on the rest of the event.
+    y_pred = np.zeros(20, dtype=int)
+    y_pred[6] = 1
+    precision, recall = affiliation_scores(y_true, y_pred)
+    assert precision == pytest.approx(1.0)
+    # Zone [0, 11): a true point y in [5, 6) is at distance 6 - y of the
+    # prediction, and a uniform point is closer with probability
+    # 2 * (6 - y) / 11, so [5, 6) scores 1 - 1 / 11 on average, as [7, 8).
+    # The second event is missed.
+    assert recall == pytest.approx((2 * (1 - 1 / 11) + 1) / 3 / 2)
+
+    # Moving the prediction away from the event lowers both scores.
+    far = np.zeros(20, dtype=int)
+    far[1] = 1
+    far_precision, far_recall = affiliation_scores(y_true, far)
+    assert far_precision < precision and far_recall < recall
+
+
+def test_detection_delays():
+    y_true = np.array([0, 1, 1, 1, 0, 0, 1, 1, 0, 1, 1, 1, 1, 0])
+    y_pred = np.array([1, 0, 0, 1, 0, 0, 0, 0, 1, 0, 0, 0, 1, 1])
+
+    np.testing.assert_array_equal(
+        detection_delays(y_true, y_pred), [2, np.nan, 3]
+    )
+    mean, percentiles, within = detection_delay_scores(
+        y_true, y_pred, percentiles=(50, 100), horizons=(0, 2, 3)
+    )
+    assert mean == pytest.approx(2.5)
+    np.testing.assert_allclose(percentiles, [2.5, 3])
+    np.testing.assert_allclose(within, [0, 1 / 3, 2 / 3])
+
+    mean, _, within = detection_delay_scores(np.zeros(5), np.ones(5))
+    assert np.isnan(mean) and np.isnan(within).all()
+
+
+def test_anomaly_ranges_round_trip_and_slicing():
+    y = np.array([0, 1, 1, 0, 0, 1, 0, 1, 1, 1])
+    ranges = AnomalyRanges.from_labels(y)
+
+    assert ranges.ranges == extract_anomaly_ranges(y) == [(1, 2), (5, 5),
+                                                          (7, 9)]
+    assert len(ranges) == 10 and ranges.n_anomalies == 6
+    np.testing.assert_array_equal(np.asarray(ranges), y)
+    assert ranges[2:8].ranges == [(0, 0), (3, 3), (5, 5)]
+    np.testing.assert_array_equal(ranges[y == 1], y[y == 1])
+    # Unsorted and touching ranges are normalized.
+    assert AnomalyRanges([5, 0, 2], [6, 1, 3], 8).ranges == [(0, 3), (5, 6)]
+
+
+def test_metrics_on_anomaly_ranges_match_dense_labels():
+    rng = np.random.default_rng(0)
+    for _ in range(20):
+        y_true = np.repeat(rng.random(100) < 0.1, 3)[:100].astype(int)
+        y_pred = (rng.random(100) < 0.1).astype(int)
+        true_ranges = AnomalyRanges.from_labels(y_true)
+        pred_ranges = AnomalyRanges.from_labels(y_pred)
+
+        for labels in (y_true, LabelIndex(true_ranges)):
+            np.testing.assert_array_equal(
+                soft_scores(labels, pred_ranges, (0, 1, 5)),
+                soft_scores(y_true, y_pred, (0, 1, 5)),
+            )
+            np.testing.assert_array_equal(
+                detection_delays(labels, pred_ranges),
+                detection_delays(y_true, y_pred),
+            )
+            assert affiliation_scores(labels, pred_ranges) == \
+                affiliation_scores(y_true, y_pred)
+        assert f1_t(true_ranges.ranges, extract_anomaly_ranges(pred_ranges)) \
+            == f1_t(extract_anomaly_ranges(y_true),
+                    extract_anomaly_ranges(y_pred))
+
+
+def test_roc_pr_scores_batch_matches_rows():
+    rng = np.random.default_rng(0)
+    y_true = (rng.random(300) < 0.1).astype(int)
+    # Rounded scores have ties, within and across classes.
+    scores = np.round(rng.random((6, 300)) + y_true * rng.random((6, 1)), 1)
+    scores[0] = rng.random(300)
+
+    batch = np.column_stack(roc_pr_scores_batch(y_true, scores))
+    for row, values in zip(scores, batch):
+        np.testing.assert_allclose(values, roc_pr_scores(y_true, row))
+
+    auc_roc, auc_pr, f1 = roc_pr_scores_batch(np.zeros(300), scores)
+    assert np.isnan(auc_roc).all() and np.isnan(auc_pr).all()
+    np.testing.assert_array_equal(f1, 0)
@@ -1,6 +1,10 @@
 import numpy as np
 import pytest
 
+from benchmark_utils.bootstrap import block_bootstrap
+from benchmark_utils.metrics import (
+    AnomalyRanges, f1_t, soft_f1, soft_precision, soft_recall,
+)
 from objective import Objective
 
 
@@ -108,3 +112,327 @@ def test_prediction_only_metrics_without_primary_value_fallback_to_zero():
 
     assert result["precision"] == pytest.approx(1.0)
     assert result["value"] == pytest.approx(0.0)
+
+
+def test_soft_metrics_match_single_range_functions():
+    objective = make_objective(
+        score_metrics=None,
+        prediction_metrics=("soft_precision", "soft_recall", "soft_f1"),
+    )
+    predictions = np.array([0, 1, 0, 0, 0, 1])
+
+    result = objective.evaluate_result(anomaly_predictions=predictions)
+
+    for detection_range in objective.detection_ranges:
+        args = (objective.y_test, predictions)
+        assert result[f"soft_precision_{detection_range}"] == pytest.approx(
+            soft_precision(*args, detection_range=detection_range))
+        assert result[f"soft_recall_{detection_range}"] == pytest.approx(
+            soft_recall(*args, detection_range=detection_range))
+        assert result[f"soft_f1_{detection_range}"] == pytest.approx(
+            soft_f1(*args, detection_range=detection_range))
+
+
+def test_best_f1_score_metric():
+    objective = make_objective(score_metrics=("best_f1",))
+    scores = np.array([0.1, 0.9, 0.8, 0.1, 0.3, 0.2])
+
+    result = objective.evaluate_result(anomaly_scores=scores)
+
+    # Best threshold 0.3 flags {1, 2, 4}: precision 2/3, recall 1.
+    assert result["best_f1"] == pytest.approx(0.8)
+
+
+def test_best_f1_t_score_metric():
+    objective = make_objective(score_metrics=("best_f1_t",))
+    scores = np.array([0.1, 0.2, 0.9, 0.1, 0.8, 0.2])
+
+    result = objective.evaluate_result(anomaly_scores=scores)
+
+    assert result["best_f1_t"] == pytest.approx(1.0)
+
+
+def test_all_score_metrics():
+    objective = make_objective(score_metrics="all")
+    scores = np.array([0.1, 0.2, 0.9, 0.1, 0.8, 0.2])
+
+    result = objective.evaluate_result(anomaly_scores=scores)
+
+    for metric in objective.all_score_metrics:
+        assert 0 <= result[metric] <= 1
+
+
+def test_label_index_is_reused_across_evaluations():
+    objective = make_objective()
+    scores = np.array([0.1, 0.2, 0.9, 0.1, 0.8, 0.2])
+    padded = np.array([np.nan, 0.2, 0.9, 0.1, 0.8, 0.2])
+
+    labels, _, _ = objective._align_inputs(scores, None)
+    assert labels is objective._labels
+    assert objective._align_inputs(scores[::-1], None)[0] is labels
+
+    # Masked positions get their own index, kept while the mask is the same.
+    masked, _, _ = objective._align_inputs(padded, None)
+    np.testing.assert_array_equal(masked.y_true, [0, 1, 0, 1, 0])
+    assert objective._align_inputs(padded * 2, None)[0] is masked
+    assert objective._align_inputs(scores[1:], None)[0] is not masked
+
+
+def test_recording_label_index_is_reused_across_evaluations():
+    objective = make_objective(score_metrics=("auc_roc",))
+    objective.per_recording = True
+    objective.set_data(X_train=np.empty((2, 1, 4)),
+                       y_test=np.array([[0, 0, 1, 0], [0, 1, 0, 1]]),
+                       X_test=np.empty((2, 1, 4)))
+    # NaN padding at the start of each recording, as windowed solvers do.
+    scores = np.array([[np.nan, 0.1, 0.9, 0.2], [np.nan, 0.8, 0.1, 0.7]])
+
+    first = objective.evaluate_result(anomaly_scores=scores)
+    cached = [objective._aligned_labels[i][2] for i in range(2)]
+    np.testing.assert_array_equal(cached[1].y_true, [1, 0, 1])
+
+    second = objective.evaluate_result(anomaly_scores=scores * 2)
+    for i in range(2):
+        assert objective._aligned_labels[i][2] is cached[i]
+    assert second["macro_auc_roc"] == first["macro_auc_roc"]
+
+
+def test_profile_metrics_reports_time_and_memory():
+    objective = make_objective(
+        score_metrics=("auc_pr", "auc_roc"), prediction_metrics=("f1",)
+    )
+    objective.profile_metrics = True
+    scores = np.array([0.1, 0.2, 0.9, 0.1, 0.8, 0.2])
+    predictions = np.array([0, 0, 1, 0, 1, 0])
+
+    result = objective.evaluate_result(
+        anomaly_scores=scores, anomaly_predictions=predictions
+    )
+
+    assert result["auc_pr"] == pytest.approx(1.0)
+    assert result["f1"] == pytest.approx(1.0)
+    for name in ("score_order", "roc_pr", "confusion", "auc_pr", "f1"):
+        assert result[f"time_{name}"] >= 0
+        assert result[f"peak_memory_{name}"] >= 0
+
+
+def test_per_recording_evaluation_reports_macro_and_micro():
+    objective = Objective()
+    objective.score_metrics = ("auc_roc",)
+    objective.prediction_metrics = ("f1_t",)
+    objective.per_recording = True
+    y_test = np.array([[0, 0, 0, 1, 1], [1, 1, 0, 0, 0]])
+    objective.set_data(
+        X_train=np.empty((2, 1, 5)), y_test=y_test, X_test=np.empty((2, 1, 5))
+    )
+    scores = np.array([[0.1, 0.2, 0.3, 0.9, 0.8], [0.7, 0.9, 0.1, 0.2, 0.3]])
+    predictions = np.array([[0, 0, 0, 1, 0], [0, 1, 0, 0, 0]])
+
+    result = objective.evaluate_result(
+        anomaly_scores=scores[:, None], anomaly_predictions=predictions
+    )
+
+    single = make_objective(score_metrics=("auc_roc",),
+                            prediction_metrics=("f1_t",))
+    values = []
+    for i in range(2):
+        single.set_data(X_train=None, y_test=y_test[i], X_test=None)
+        values.append(single.evaluate_result(
+            anomaly_scores=scores[i], anomaly_predictions=predictions[i]
+        ))
+    single.set_data(X_train=None, y_test=y_test, X_test=None)
+    pooled = single.evaluate_result(
+        anomaly_scores=scores, anomaly_predictions=predictions
+    )
+
+    for metric in ("auc_roc", "f1_t"):
+        assert result[f"macro_{metric}"] == pytest.approx(
+            np.mean([value[metric] for value in values])
+        )
+    assert result["micro_auc_roc"] == pytest.approx(pooled["auc_roc"])
+    # Ranges are not merged across recordings in the per-recording values.
+    assert result["macro_f1_t"] != pytest.approx(pooled["f1_t"])
+
+
+def test_micro_metrics_do_not_join_recordings():
+    objective = Objective()
+    objective.score_metrics = ("vus_roc",)
+    objective.prediction_metrics = ("f1_t", "ctt")
+    objective.per_recording = True
+    # Anomalies at the end of recording 0 and at the start of recording 1.
+    y_test = np.array([[0, 0, 0, 1, 1], [1, 1, 0, 0, 0], [0, 0, 0, 0, 0]])
+    objective.set_data(
+        X_train=np.empty((3, 1, 5)), y_test=y_test, X_test=np.empty((3, 1, 5))
+    )
+    predictions = np.array([[0, 0, 0, 0, 1], [1, 0, 0, 0, 0],
+                            [1, 0, 0, 0, 0]])
+
+    result = objective.evaluate_result(
+        anomaly_scores=np.random.default_rng(0).random((3, 5)),
+        anomaly_predictions=predictions,
+    )
+
+    assert result["micro_f1_t"] == pytest.approx(
+        f1_t([(3, 4), (5, 6)], [(4, 4), (5, 5), (10, 10)])
+    )
+    assert result["micro_f1_t"] != pytest.approx(
+        f1_t([(3, 6)], [(4, 5), (10, 10)])
+    )
+    # The prediction of the last recording has no anomaly to be close to.
+    assert result["micro_ctt"] == np.inf
+    assert "macro_vus_roc" in result and "micro_vus_roc" not in result
+
+
+def test_memmap_outputs_are_aligned_without_copies(tmp_path):
+    objective = make_objective(prediction_metrics=("f1",))
+    scores = np.memmap(tmp_path / "scores.dat", dtype=float, mode="w+",
+                       shape=(5,))
+    scores[:] = [0.2, 0.9, 0.1, 0.8, 0.2]
+    predictions = np.memmap(tmp_path / "predictions.dat", dtype=int,
+                            mode="w+", shape=(5,))
+    predictions[:] = [0, 1, 0, 1, 0]
+
+    labels, aligned_scores, aligned_predictions = objective._align_inputs(
+        anomaly_scores=scores, anomaly_predictions=predictions
+    )
+    result = objective.evaluate_result(
+        anomaly_scores=scores, anomaly_predictions=predictions
+    )
+
+    assert np.shares_memory(aligned_scores, scores)
+    assert np.shares_memory(aligned_predictions, predictions)
+    np.testing.assert_array_equal(labels.y_true, [0, 1, 0, 1, 0])
+    assert result["auc_pr"] == pytest.approx(1.0)
+    assert result["f1"] == pytest.approx(1.0)
+
+
+def test_bootstrap_confidence_intervals():
+    objective = make_objective(prediction_metrics=("f1", "soft_f1"))
+    objective.n_bootstrap = 200
+    scores = np.array([0.1, 0.2, 0.9, 0.1, 0.8, 0.2])
+    predictions = np.array([0, 1, 1, 0, 1, 0])
+
+    result = objective.evaluate_result(
+        anomaly_scores=scores, anomaly_predictions=predictions
+    )
+
+    for metric in ("auc_pr", "auc_roc", "f1", "soft_f1_3"):
+        low, high = result[f"{metric}_ci_low"], result[f"{metric}_ci_high"]
+        assert low <= high
+    assert result["f1_ci_low"] <= result["f1"] <= result["f1_ci_high"]
+    assert "ctt_ci_low" not in result
+
+
+def test_bootstrap_reuses_the_plan_score_order(monkeypatch):
+    orders = []
+
+    def recording(*args, order=None, **kwargs):
+        orders.append(order)
+        return block_bootstrap(*args, order=order, **kwargs)
+
+    monkeypatch.setattr("objective.block_bootstrap", recording)
+    scores = np.array([0.1, 0.2, 0.9, 0.1, 0.8, 0.2])
+    objective = make_objective()
+    objective.n_bootstrap = 20
+    objective.evaluate_result(anomaly_scores=scores)
+
+    objective = make_objective()
+    objective.n_bootstrap = 20
+    objective.per_recording = True
+    objective.set_data(X_train=np.empty((2, 1, 3)),
+                       y_test=np.array([[0, 0, 1], [0, 1, 0]]),
+                       X_test=np.empty((2, 1, 3)))
+    objective.evaluate_result(anomaly_scores=scores.reshape(2, 3))
+
+    assert len(orders) == 2
+    for order in orders:
+        assert order is not None
+        assert np.all(np.diff(scores[order]) <= 0)
+
+
+def test_pa_metrics_expand_over_default_k_values():
+    objective = make_objective(score_metrics=("best_pa_f1",),
+                               prediction_metrics=("pa_f1",))
+    scores = np.array([0.1, 0.2, 0.9, 0.1, 0.8, 0.2])
+    predictions = np.array([0, 0, 1, 0, 1, 0])
+
+    result = objective.evaluate_result(
+        anomaly_scores=scores, anomaly_predictions=predictions
+    )
+
+    for k in objective.pa_k_values:
+        assert result[f"pa_f1_{k}"] == pytest.approx(1.0)
+        assert result[f"best_pa_f1_{k}"] == pytest.approx(1.0)
+
+
+def test_detection_delay_metrics():
+    objective = make_objective(
+        score_metrics=None,
+        prediction_metrics=("delay_mean", "delay_percentile",
+                            "detected_within_1"),
+    )
+    predictions = np.array([0, 0, 0, 0, 1, 1])
+
+    result = objective.evaluate_result(anomaly_predictions=predictions)
+
+    assert result["delay_mean"] == pytest.approx(0.0)
+    for q in objective.delay_percentiles:
+        assert result[f"delay_percentile_{q}"] == pytest.approx(0.0)
+    # The first event is missed.
+    assert result["detected_within_1"] == pytest.approx(0.5)
+
+
+def test_anomaly_ranges_as_labels_and_predictions():
+    prediction_metrics = ("precision", "f1_t", "soft_f1_1", "aff_recall")
+    dense = make_objective(score_metrics=None,
+                           prediction_metrics=prediction_metrics)
+    objective = make_objective(score_metrics=None,
+                               prediction_metrics=prediction_metrics)
+    objective.set_data(
+        X_train=np.empty((1, 1, 6)),
+        y_test=AnomalyRanges([2, 4], [2, 4], 6),
+        X_test=np.empty((1, 1, 6)),
+    )
+    predictions = np.array([0, 1, 1, 0, 0, 0])
+    expected = dense.evaluate_result(anomaly_predictions=predictions)
+
+    result = objective.evaluate_result(
+        anomaly_predictions=AnomalyRanges.from_labels(predictions)
+    )
+    assert result == expected
+    # Trailing alignment slices the ranges, -1 padding needs dense labels.
+    result = objective.evaluate_result(
+        anomaly_predictions=AnomalyRanges.from_labels(predictions[1:])
+    )
+    assert result == dense.evaluate_result(anomaly_predictions=predictions[1:])
+    padded = np.r_[-1, predictions[1:]]
+    assert objective.evaluate_result(anomaly_predictions=padded) == \
+        dense.evaluate_result(anomaly_predictions=padded)
+
+
+def test_evaluate_score_matrix_matches_evaluate_result():
+    objective = make_objective(score_metrics=("auc_pr", "best_f1"))
+    scores = np.array([
+        [0.1, 0.2, 0.9, 0.1, 0.8, 0.2],
+        [0.9, 0.2, 0.1, 0.1, 0.8, 0.2],
+        [np.nan, 0.2, 0.9, 0.1, 0.3, 0.2],
+    ])
+
+    result = objective.evaluate_score_matrix(scores)
+
+    for i, row in enumerate(scores):
+        expected = objective.evaluate_result(anomaly_scores=row)
+        for key in ("auc_pr", "best_f1"):
+            assert result[key][i] == pytest.approx(expected[key])
+
+
+def test_evaluate_score_matrix_accepts_a_single_score_vector():
+    objective = make_objective(score_metrics=("auc_pr", "best_f1"))
+    scores = np.array([0.1, 0.2, 0.9, 0.1, 0.8, 0.2])
+
+    result = objective.evaluate_score_matrix(scores)
+
+    expected = objective.evaluate_result(anomaly_scores=scores)
+    for key in ("auc_pr", "best_f1"):
+        assert result[key].shape == (1,)
+        assert result[key][0] == pytest.approx(expected[key])
@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+from benchmark_utils.overlap import (
+    WindowReconstructor, overlap_add, overlap_counts, overlap_mean,
+)
+
+
+def _add_at(windows, stride, weights):
+    n_windows, window_size, n_features = windows.shape[-3:]
+    n_times = (n_windows - 1) * stride + window_size
+    out = np.zeros(windows.shape[:-3] + (n_times, n_features))
+    for i in range(n_windows):
+        out[..., i * stride:i * stride + window_size, :] += (
+            windows[..., i, :, :] * weights[:, None]
+        )
+    return out
+
+
+@pytest.mark.parametrize("n_windows, window_size, stride", [
+    (7, 3, 1), (7, 3, 2), (2, 5, 1), (4, 2, 3),
+])
+def test_overlap_add_matches_window_loop(n_windows, window_size, stride):
+    rng = np.random.default_rng(0)
+    windows = rng.standard_normal((2, n_windows, window_size, 3))
+    weights = rng.random(window_size)
+
+    out = overlap_add(windows, stride, weights)
+
+    np.testing.assert_allclose(out, _add_at(windows, stride, weights))
+    np.testing.assert_allclose(
+        overlap_counts(n_windows, window_size, stride, weights),
+        _add_at(np.ones((n_windows, window_size, 1)), stride, weights)[:, 0],
+    )
+
+
+def test_overlap_add_accumulates_in_place():
+    windows = np.ones((4, 3, 2), dtype=np.float32)
+    out = np.ones((6, 2), dtype=np.float32)
+
+    result = overlap_add(windows, out=out)
+
+    assert result is out and out.dtype == np.float32
+    np.testing.assert_array_equal(out[:, 0], [2, 3, 4, 4, 3, 2])
+    with pytest.raises(ValueError, match="cover a signal of shape"):
+        overlap_add(windows, stride=2, out=out)
+
+
+def test_overlap_mean_fills_uncovered_positions():
+    windows = np.arange(4.).reshape(2, 2, 1)
+
+    out = overlap_mean(windows, stride=3, fill_value=np.nan)
+
+    np.testing.assert_array_equal(out[:, 0], [0, 1, np.nan, 2, 3])
+
+
+@pytest.mark.parametrize("stride", [1, 2])
+def test_window_reconstructor_matches_overlap_mean(stride):
+    windows = np.random.default_rng(0).standard_normal((3, 7, 4, 2))
+    reconstructor = WindowReconstructor(3, 7, 4, 2, stride=stride,
+                                        dtype=float)
+
+    # Batches span several signals.
+    for batch in np.array_split(windows.reshape(21, 4, 2), [5, 6, 16]):
+        reconstructor.update(batch)
+
+    np.testing.assert_allclose(reconstructor.finalize(),
+                               overlap_mean(windows, stride))
+    with pytest.raises(ValueError, match="more windows than expected"):
+        reconstructor.update(windows[0])
@@ -0,0 +1,97 @@
+import numpy as np
+import pytest
+
+from benchmark_utils.metrics import (
+    ctt,
+    extract_anomaly_ranges,
+    f1_t,
+    precision_t,
+    recall_t,
+    soft_scores,
+    ttc,
+)
+from benchmark_utils.streaming import (
+    ConfusionAccumulator,
+    DistanceAccumulator,
+    RangeAccumulator,
+    SoftAccumulator,
+)
+
+
+def _stream(accumulator, y_true, y_pred, bounds):
+    for start, stop in zip(bounds[:-1], bounds[1:]):
+        accumulator.update(y_true[start:stop], y_pred[start:stop])
+    return accumulator.finalize()
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_accumulators_match_batch_metrics(seed):
+    rng = np.random.default_rng(seed)
+    n = int(rng.integers(1, 200))
+    y_true = np.repeat(rng.random(n) < 0.1, 3)[:n].astype(int)
+    y_pred = (rng.random(n) < 0.1).astype(int)
+    cuts = np.sort(rng.integers(0, n + 1, size=4))
+    bounds = np.r_[0, cuts, n]
+
+    confusion = _stream(ConfusionAccumulator(), y_true, y_pred, bounds)
+    tp = np.sum((y_true == 1) & (y_pred == 1))
+    assert confusion["zoloss"] == pytest.approx(np.mean(y_true != y_pred))
+    assert confusion["recall"] == pytest.approx(
+        tp / y_true.sum() if y_true.sum() else 0.0)
+
+    soft = _stream(SoftAccumulator((0, 1, 5)), y_true, y_pred, bounds)
+    for value, expected in zip(soft, soft_scores(y_true, y_pred, (0, 1, 5))):
+        np.testing.assert_array_equal(value, expected)
+
+    for signed in (False, True):
+        distances = _stream(DistanceAccumulator(signed), y_true, y_pred,
+                            bounds)
+        assert distances == (ctt(y_true, y_pred, signed),
+                             ttc(y_true, y_pred, signed))
+
+    real = extract_anomaly_ranges(y_true)
+    predicted = extract_anomaly_ranges(y_pred)
+    ranges = _stream(RangeAccumulator(bias_type="front"), y_true, y_pred,
+                     bounds)
+    assert ranges == (
+        precision_t(real, predicted, "front"),
+        recall_t(real, predicted, 0.5, "front"),
+        f1_t(real, predicted, 0.5, "front"),
+    )
+
+
+def test_range_accumulator_joins_segments_across_chunks():
+    accumulator = RangeAccumulator()
+    accumulator.update([0, 1, 1], [1, 0, 0])
+    accumulator.update([1, 0, 1], [0, 1, 1])
+    accumulator.update([1], [1])
+
+    real, predicted = [(1, 3), (5, 6)], [(0, 0), (4, 6)]
+    assert accumulator.finalize() == (
+        precision_t(real, predicted),
+        recall_t(real, predicted),
+        f1_t(real, predicted),
+    )
+
+
+def test_range_accumulator_only_keeps_open_segments():
+    accumulator = RangeAccumulator()
+    chunk = np.array([0, 1, 1, 0, 0, 1, 0, 0])
+    for _ in range(100):
+        accumulator.update(chunk, np.roll(chunk, 1))
+        assert len(accumulator.real_ranges) <= 2
+        assert len(accumulator.predicted_ranges) <= 2
+    # A long prediction keeps the real ranges it overlaps until it closes.
+    for _ in range(5):
+        accumulator.update(chunk, np.ones(8, dtype=int))
+    assert len(accumulator.real_ranges) == 10
+
+    y_true = np.tile(chunk, 105)
+    y_pred = np.r_[np.tile(np.roll(chunk, 1), 100), np.ones(40, dtype=int)]
+    real = extract_anomaly_ranges(y_true)
+    predicted = extract_anomaly_ranges(y_pred)
+    assert accumulator.finalize() == (
+        precision_t(real, predicted),
+        recall_t(real, predicted),
+        f1_t(real, predicted),
+    )
@@ -0,0 +1,164 @@
+import numpy as np
+import pytest
+import torch
+from torch.utils.data import DataLoader
+
+from benchmark_utils import windowing
+from benchmark_utils.windowing import (
+    RecordingWindows, find_period_length, make_windowed_dataset, make_windows,
+    reconstruct_from_windows, stack_recordings,
+)
+
+
+@pytest.mark.parametrize("stride", [1, 3])
+def test_windowed_dataset_matches_make_windows(stride):
+    rng = np.random.default_rng(0)
+    X = rng.standard_normal((2, 3, 20))
+    y = rng.integers(0, 2, size=(2, 20))
+
+    dataset = make_windowed_dataset(X, y, window_size=5, stride=stride)
+    expected = make_windows(X, window_size=5, stride=stride)
+    expected_y = np.lib.stride_tricks.sliding_window_view(
+        y, window_shape=5, axis=-1
+    )[..., ::stride, :].reshape(-1, 5)
+
+    assert len(dataset) == len(expected)
+    x_batch, y_batch = next(iter(DataLoader(dataset, batch_size=len(dataset))))
+    assert x_batch.dtype == torch.float32
+    np.testing.assert_allclose(x_batch.numpy(), expected, rtol=1e-6)
+    np.testing.assert_array_equal(y_batch.numpy(), expected_y)
+
+
+def test_windowed_dataset_shares_float32_data():
+    X = np.arange(40, dtype=np.float32).reshape(1, 2, 20)
+
+    dataset = make_windowed_dataset(X, window_size=8)
+    x, = dataset[3]
+
+    assert np.shares_memory(x.numpy(), X)
+    np.testing.assert_array_equal(x.numpy(), X[0, :, 3:11].T)
+
+
+@pytest.mark.parametrize("stride", [1, 2])
+def test_reconstruct_from_windows_inverts_make_windows(stride):
+    X = np.random.default_rng(0).standard_normal((2, 3, 21))
+
+    windows = make_windows(X, window_size=5, stride=stride)
+    signal = reconstruct_from_windows(windows, stride, batch=2, n_features=3)
+
+    np.testing.assert_allclose(signal, X[..., :signal.shape[-1]])
+
+
+def test_find_period_length_univariate_and_multivariate():
+    rng = np.random.default_rng(0)
+    t = np.arange(3000)
+    x = np.sin(2 * np.pi * t / 50) + 0.3 * rng.standard_normal(3000)
+    assert find_period_length(x) == 50
+    assert find_period_length(x[:5]) == 0
+    assert find_period_length(np.ones(100), default=7) == 7
+
+    # Channels with phase shifts and one constant channel, in two
+    # recordings of shape (n_recordings, n_features, n_samples).
+    X = np.stack([np.sin(2 * np.pi * t / 40 + k) for k in range(3)])
+    X = np.stack([X, X[::-1]]) + 0.2 * rng.standard_normal((2, 3, 3000))
+    X[:, 2] = 1
+    assert find_period_length(X) == 40
+
+
+def test_find_period_length_is_cached(monkeypatch):
+    calls = []
+    compute = windowing._find_period_length
+
+    def counting(series, default):
+        calls.append(1)
+        return compute(series, default)
+
+    monkeypatch.setattr(windowing, "_find_period_length", counting)
+    monkeypatch.setattr(windowing, "_PERIOD_CACHE", {})
+    x = np.sin(np.arange(500) / 3)
+
+    assert find_period_length(x) == find_period_length(x.copy())
+    assert len(calls) == 1
+    find_period_length(x + 1e-3)
+    assert len(calls) == 2
+
+
+@pytest.mark.parametrize("stride", [1, 3])
+def test_recording_windows_stay_within_recordings(stride):
+    rng = np.random.default_rng(0)
+    recordings = [rng.standard_normal((2, n)) for n in (12, 3, 7)]
+    windows = RecordingWindows(recordings, window_size=4, stride=stride)
+
+    assert len(windows) == len(windows.index)
+    for i, (recording, start) in enumerate(windows.index):
+        np.testing.assert_array_equal(
+            windows[i], recordings[recording][:, start:start + 4].T
+        )
+        assert np.shares_memory(windows[i], recordings[recording])
+    for recording, view in windows:
+        assert len(view) == 0 or np.shares_memory(view, recordings[recording])
+    assert list(np.unique(windows.index[:, 0])) == [0, 2]
+
+    # Batches pack consecutive windows across recordings.
+    batches = list(windows.batches(3))
+    np.testing.assert_array_equal(
+        np.concatenate([batch for batch, _ in batches]),
+        np.stack([windows[i] for i in range(len(windows))]),
+    )
+    np.testing.assert_array_equal(
+        np.concatenate([index for _, index in batches]), windows.index
+    )
+
+
+def test_recording_windows_of_3d_array():
+    X = np.arange(2 * 3 * 10, dtype=float).reshape(2, 3, 10)
+    windows = RecordingWindows(X, window_size=4, stride=2)
+
+    np.testing.assert_array_equal(
+        windows[:], make_windows(X, window_size=4, stride=2)
+    )
+    np.testing.assert_array_equal(windows.offsets, [0, 4, 8])
+    np.testing.assert_array_equal(windows.index[3:6], [[0, 6], [1, 0], [1, 2]])
+    assert windows[8:].shape == (0, 4, 3)
+
+
+def test_recording_windows_negative_and_out_of_range_keys():
+    X = np.arange(2 * 20, dtype=float).reshape(2, 1, 20)
+    windows = RecordingWindows(X, window_size=4)
+
+    np.testing.assert_array_equal(windows[-1], X[1, :, 16:].T)
+    np.testing.assert_array_equal(windows[-17], X[1, :, :4].T)
+    np.testing.assert_array_equal(windows[-18], X[0, :, 16:].T)
+    for key in (len(windows), -len(windows) - 1):
+        with pytest.raises(IndexError):
+            windows[key]
+
+
+def test_recording_windows_take_gathers_shuffled_windows():
+    rng = np.random.default_rng(0)
+    recordings = [rng.standard_normal((2, n)) for n in (9, 6, 12)]
+    windows = RecordingWindows(recordings, window_size=3, stride=2)
+    indices = rng.permutation(len(windows))[:7]
+    indices[0] -= len(windows)
+
+    taken = windows.take(indices)
+
+    np.testing.assert_array_equal(
+        taken, np.stack([windows[int(i)] for i in indices])
+    )
+    np.testing.assert_array_equal(windows[list(indices)], taken)
+    with pytest.raises(IndexError):
+        windows.take([len(windows)])
+
+    # Batches of shuffled indices feed a DataLoader without copying X.
+    loader = DataLoader(windows, sampler=indices.reshape(-1, 7),
+                        batch_size=None)
+    np.testing.assert_array_equal(next(iter(loader)).numpy(), taken)
+
+
+def test_stack_recordings_follows_flattened_labels():
+    X = np.arange(2 * 3 * 5).reshape(2, 3, 5)
+    stacked = stack_recordings(X)
+
+    assert stacked.shape == (10, 3)
+    np.testing.assert_array_equal(stacked[7], X[1, :, 2])